@@ -1,5 +1,5 @@
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker, declarative_base, Session
 
 
@@ -64,6 +64,16 @@ Base = declarative_base()
 def get_session() -> Session:
     return SessionLocal()
 
+def begin_transaction(db: Session) -> None:
+    """
+    Открывает явную транзакцию для группы записей, которые должны пройти целиком.
+    SQLite работает в режиме автокоммита (isolation_level=None), поэтому без BEGIN
+    каждый оператор фиксировался бы отдельно; commit()/rollback() сессии её закрывают.
+    """
+    if db.get_bind().dialect.name == "sqlite":
+        db.execute(text("BEGIN IMMEDIATE"))
+
+
 def get_db():
     db = SessionLocal()
     try:
@@ -71,3 +81,11 @@ def get_db():
     finally:
         db.close()
 
+
+
+def fetch_dicts(db: Session, stmt) -> list[dict]:
+    """
+    Выполняет select(...) только по нужным колонкам и возвращает строки как dict
+    (ключ — имя колонки) — без загрузки ORM-объектов и построения Pydantic-моделей на строку.
+    """
+    return [dict(row) for row in db.execute(stmt).mappings()]
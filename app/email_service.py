@@ -1,12 +1,30 @@
-import smtplib
 import os
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from typing import List, Dict, Any
 import logging
 
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+from app.services.email_dispatcher import EmailDispatcher
+
 logger = logging.getLogger(__name__)
 
+TEMPLATES_DIR = os.path.join(os.path.dirname(__file__), "templates", "email")
+TEMPLATE_NAMES = ("order.html", "order.txt", "digest.html", "digest.txt")
+
+
+def create_template_env() -> Environment:
+    """Шаблоны писем; в .html всё экранируется (названия блюд, адреса и т.п. приходят от пользователей)"""
+    return Environment(
+        loader=FileSystemLoader(TEMPLATES_DIR),
+        autoescape=select_autoescape(["html"]),
+        trim_blocks=True,
+        lstrip_blocks=True,
+        auto_reload=False,
+    )
+
+
 class EmailService:
     def __init__(self):
         self.smtp_server = os.getenv("SMTP_SERVER", "smtp.gmail.com")
@@ -15,130 +33,89 @@ class EmailService:
         self.smtp_password = os.getenv("SMTP_PASSWORD", "")
         self.from_email = os.getenv("FROM_EMAIL", "")
         self.webapp_url = os.getenv("WEBAPP_URL", "")
-        
-    def send_order_notification(self, restaurant_email: str, restaurant_name: str, order_data: Dict[str, Any]) -> bool:
+        # Шаблоны компилируются один раз при создании сервиса
+        template_env = create_template_env()
+        self.templates = {name: template_env.get_template(name) for name in TEMPLATE_NAMES}
+        # SMTP_STARTTLS=0 / SMTP_AUTH=0 — для локального SMTP без TLS и авторизации
+        self.smtp_starttls = os.getenv("SMTP_STARTTLS", "1") != "0"
+        self.smtp_auth = os.getenv("SMTP_AUTH", "1") != "0"
+        self.dispatcher = EmailDispatcher(
+            self.smtp_server,
+            self.smtp_port,
+            self.smtp_username if self.smtp_auth else "",
+            self.smtp_password,
+            starttls=self.smtp_starttls,
+        )
+
+    @property
+    def configured(self) -> bool:
+        return not self.smtp_auth or bool(self.smtp_username and self.smtp_password)
+
+    def queue_order_notification(self, restaurant_email: str, restaurant_name: str, order_data: Dict[str, Any]) -> bool:
         """
-        Отправляет уведомление о новом заказе на email ресторана
+        Ставит уведомление о новом заказе в очередь отправки (вызывать из event loop).
+        False — письмо не будет отправлено (нет адреса/настроек SMTP или очередь переполнена)
         """
-        if not restaurant_email or not self.smtp_username or not self.smtp_password:
+        if not restaurant_email or not self.configured:
             logger.warning("Email notification skipped: missing email or SMTP credentials")
             return False
-            
         try:
-            # Формируем содержимое заказа
-            order_items = []
-            total = 0
-            
-            for item in order_data.get('items', []):
-                item_total = item['price'] * item['qty']
-                total += item_total
-                order_items.append(f"• {item['name']} × {item['qty']} - {item_total} ₽")
-            
-            # Формируем email
-            subject = f"Новый заказ #{order_data['id']} - {restaurant_name}"
-            
-            # Создаем HTML версию письма
-            html_content = f"""
-            <!DOCTYPE html>
-            <html>
-            <head>
-                <meta charset="utf-8">
-                <style>
-                    body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-                    .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-                    .header {{ background: #3b82f6; color: white; padding: 20px; text-align: center; border-radius: 8px 8px 0 0; }}
-                    .content {{ background: #f8fafc; padding: 20px; border-radius: 0 0 8px 8px; }}
-                    .order-info {{ background: white; padding: 15px; margin: 15px 0; border-radius: 6px; border-left: 4px solid #3b82f6; }}
-                    .order-items {{ background: white; padding: 15px; margin: 15px 0; border-radius: 6px; }}
-                    .total {{ font-weight: bold; font-size: 18px; color: #1f2937; }}
-                    .button {{ display: inline-block; background: #10b981; color: white; padding: 12px 24px; text-decoration: none; border-radius: 6px; margin-top: 15px; }}
-                    .button:hover {{ background: #059669; }}
-                    .footer {{ text-align: center; margin-top: 20px; color: #6b7280; font-size: 14px; }}
-                </style>
-            </head>
-            <body>
-                <div class="container">
-                    <div class="header">
-                        <h1>Новый заказ #{order_data['id']}</h1>
-                        <p>Ресторан: {restaurant_name}</p>
-                    </div>
-                    
-                    <div class="content">
-                        <div class="order-info">
-                            <h3>Информация о заказе</h3>
-                            <p><strong>Статус:</strong> Обрабатывается оператором</p>
-                            <p><strong>Дата:</strong> {order_data.get('created_at', 'Не указана')}</p>
-                            <p><strong>Адрес доставки:</strong> {order_data.get('delivery_address', 'Не указан')}</p>
-                            <p><strong>Способ оплаты:</strong> {order_data.get('payment_method', 'Не указан')}</p>
-                        </div>
-                        
-                        <div class="order-items">
-                            <h3>Состав заказа</h3>
-                            {''.join(order_items)}
-                            <hr style="margin: 15px 0;">
-                            <p class="total">Итого: {total} ₽</p>
-                        </div>
-                        
-                        <div style="text-align: center;">
-                            <a href="{self.webapp_url}/static/ra.html?order_id={order_data['id']}&uid={order_data.get('user_id', '')}" class="button">
-                                Открыть заказ в боте
-                            </a>
-                        </div>
-                        
-                        <div class="footer">
-                            <p>Это автоматическое уведомление. Не отвечайте на это письмо.</p>
-                        </div>
-                    </div>
-                </div>
-            </body>
-            </html>
-            """
-            
-            # Создаем текстовую версию письма
-            text_content = f"""
-Новый заказ #{order_data['id']} - {restaurant_name}
-
-Статус: Обрабатывается оператором
-Дата: {order_data.get('created_at', 'Не указана')}
-Адрес доставки: {order_data.get('delivery_address', 'Не указан')}
-Способ оплаты: {order_data.get('payment_method', 'Не указан')}
+            msg = self.build_order_notification(restaurant_email, restaurant_name, order_data)
+        except Exception as e:
+            logger.error(f"Failed to build order notification email: {e}")
+            return False
+        return self.dispatcher.enqueue(msg)
 
-Состав заказа:
-{chr(10).join(order_items)}
+    def build_order_notification(self, restaurant_email: str, restaurant_name: str, order_data: Dict[str, Any]) -> MIMEMultipart:
+        """
+        Письмо ресторану о новом заказе (текст и HTML)
+        """
+        order = self._order_context(order_data)
+        return self._render_message(
+            restaurant_email,
+            f"Новый заказ #{order['id']} - {restaurant_name}",
+            "order",
+            restaurant_name=restaurant_name,
+            order=order,
+        )
 
-Итого: {total} ₽
+    def build_digest(self, restaurant_email: str, restaurant_name: str, orders_data: List[Dict[str, Any]]) -> MIMEMultipart:
+        """
+        Сводное письмо ресторану: несколько заказов за период (в порядке поступления)
+        """
+        orders = [self._order_context(order_data) for order_data in orders_data]
+        return self._render_message(
+            restaurant_email,
+            f"Новые заказы ({len(orders)} шт.) - {restaurant_name}",
+            "digest",
+            restaurant_name=restaurant_name,
+            period_start=orders[0].get("created_at", ""),
+            period_end=orders[-1].get("created_at", ""),
+            orders=orders,
+            orders_total=sum(order["total"] for order in orders),
+            ra_url=f"{self.webapp_url}/static/ra.html",
+        )
 
-Для обработки заказа перейдите по ссылке:
-{self.webapp_url}/static/ra.html?order_id={order_data['id']}&uid={order_data.get('user_id', '')}
+    def _order_context(self, order_data: Dict[str, Any]) -> Dict[str, Any]:
+        lines = [
+            {"name": item["name"], "qty": item["qty"], "total": item["price"] * item["qty"]}
+            for item in order_data.get("items", [])
+        ]
+        return dict(
+            order_data,
+            lines=lines,
+            total=sum(line["total"] for line in lines),
+            url=f"{self.webapp_url}/static/ra.html?order_id={order_data['id']}&uid={order_data.get('user_id', '')}",
+        )
 
-Это автоматическое уведомление. Не отвечайте на это письмо.
-            """
-            
-            # Создаем сообщение
-            msg = MIMEMultipart('alternative')
-            msg['Subject'] = subject
-            msg['From'] = self.from_email
-            msg['To'] = restaurant_email
-            
-            # Добавляем части сообщения
-            text_part = MIMEText(text_content, 'plain', 'utf-8')
-            html_part = MIMEText(html_content, 'html', 'utf-8')
-            
-            msg.attach(text_part)
-            msg.attach(html_part)
-            
-            # Отправляем email
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.smtp_username, self.smtp_password)
-                server.send_message(msg)
-            
-            logger.info(f"Order notification email sent to {restaurant_email} for order #{order_data['id']}")
-            return True
-            
-        except Exception as e:
-            logger.error(f"Failed to send order notification email: {e}")
-            return False
+    def _render_message(self, to_email: str, subject: str, template: str, **context: Any) -> MIMEMultipart:
+        msg = MIMEMultipart('alternative')
+        msg['Subject'] = subject
+        msg['From'] = self.from_email
+        msg['To'] = to_email
+        msg.attach(MIMEText(self.templates[f"{template}.txt"].render(**context), 'plain', 'utf-8'))
+        msg.attach(MIMEText(self.templates[f"{template}.html"].render(**context), 'html', 'utf-8'))
+        return msg
 
 # Создаем глобальный экземпляр сервиса
-email_service = EmailService() 
\ No newline at end of file
+email_service = EmailService() 
\ No newline at end of file
@@ -1,11 +1,9 @@
-from fastapi import FastAPI, Request, BackgroundTasks
+from fastapi import FastAPI, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.middleware.gzip import GZipMiddleware
 from starlette.staticfiles import StaticFiles
 from starlette.responses import HTMLResponse
-from starlette.middleware.base import BaseHTTPMiddleware
 import json
-import asyncio
+import os
 
 from app.routers import restaurants, menu, cart, orders
 from app.routers import config as config_router
@@ -19,46 +17,29 @@ from app.routers import auth as auth_router
 from app.routers import selections as selections_router
 from app.routers import collections as collections_router
 from app.routers import public as public_router
+from app.routers import uploads as uploads_router
 from app.db_init import init_db_and_seed
 from app.email_service import email_service
+from app.services.email_digest import digest_scheduler
+from app.services.telegram import close_telegram_http
+from app.services.image_pool import shutdown_image_pool
+from app.services.upload_spool import BROADCAST_MEDIA_MAX_BYTES, MAX_IMAGE_UPLOAD_BYTES
+from app.middleware import CompressionMiddleware, UploadLimitMiddleware, MB
+from app.static_assets import PrecompressedStaticFiles, resolve_static_dir
 
 setup_logging()
 logger = get_logger("main")
 app = FastAPI(title="Yandex Eda TG MiniApp API", version="0.1.0")
 
-# Функция для асинхронной отправки email
-async def send_email_background(restaurant_email: str, restaurant_name: str, order_data: dict):
-    """Отправляет email в фоновом режиме"""
-    try:
-        # Запускаем в отдельном потоке, чтобы не блокировать event loop
-        loop = asyncio.get_event_loop()
-        await loop.run_in_executor(
-            None, 
-            email_service.send_order_notification,
-            restaurant_email,
-            restaurant_name,
-            order_data
-        )
-        logger.info(f"Email успешно отправлен в фоне для заказа #{order_data['id']}")
-    except Exception as e:
-        logger.error(f"Ошибка при отправке email в фоне: {e}")
-
-# Делаем функцию доступной для роутеров
-app.send_email_background = send_email_background
-
-# Middleware для увеличения лимита размера файлов
-class LargeFileMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        # Увеличиваем лимит до 50MB для загрузки файлов
-        if request.url.path.startswith("/api/admin/broadcast-with-media"):
-            # Устанавливаем максимальный размер тела запроса
-            request._body = await request.body()
-        return await call_next(request)
+# Сжатие ответов больше 1000 байт (br/gzip); картинки из uploads уже сжаты
+app.add_middleware(CompressionMiddleware, minimum_size=1000, exclude_paths=("/uploads/",))
 
-# Добавляем gzip сжатие для всех ответов больше 1000 байт
-app.add_middleware(GZipMiddleware, minimum_size=1000)
-
-app.add_middleware(LargeFileMiddleware)
+# Ограничение размера загрузок: тело не буферизуется, лимит проверяется по мере чтения
+app.add_middleware(
+    UploadLimitMiddleware,
+    max_bytes=MAX_IMAGE_UPLOAD_BYTES + MB,  # запас на заголовки multipart и текстовые поля
+    path_limits={"/api/admin/broadcast-with-media": BROADCAST_MEDIA_MAX_BYTES + MB},
+)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # Разрешаем все источники для локальных туннелей
@@ -89,12 +70,20 @@ app.include_router(auth_router.router, prefix="/api", tags=["auth"])
 app.include_router(collections_router.router, prefix="/api/collections", tags=["collections"])
 app.include_router(public_router.router, prefix="/api/public", tags=["public"])
 
-# static for mini app prototype (built later)
-app.mount("/static", StaticFiles(directory="webapp/static"), name="static")
+# Собранная статика (python -m app.static_assets): предсжатые .br/.gz и имена с отпечатками
+STATIC_DIR = resolve_static_dir()
+logger.info(f"static files from {STATIC_DIR}")
+app.mount("/static", PrecompressedStaticFiles(directory=STATIC_DIR), name="static")
 
-# static for uploaded images
+# uploaded images: варианты размеров создаются при первом запросе, остальное — как статика
+app.include_router(uploads_router.router, tags=["uploads"])
 app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
 
+# Webhook бота в процессе API (вместо отдельного процесса бота)
+if os.getenv("BOT_WEBHOOK_MOUNT", "").strip() == "1":
+    from bot.webhook import setup_webhook
+    setup_webhook(app)
+
 @app.on_event("startup")
 async def _startup():
     # init DB and seed defaults (idempotent)
@@ -102,3 +91,16 @@ async def _startup():
         init_db_and_seed()
     except Exception as exc:
         logger.exception("db init failed: %s", repr(exc))
+    # сводные письма ресторанам в режиме digest
+    digest_scheduler.start()
+
+
+@app.on_event("shutdown")
+async def _shutdown():
+    # дожидаемся обработки уже принятых изображений и останавливаем процессы пула
+    shutdown_image_pool()
+    # несобранные сводки остаются в БД до следующего запуска
+    await digest_scheduler.stop()
+    # отправляем письма, оставшиеся в очереди, и закрываем SMTP-соединения
+    await email_service.dispatcher.drain()
+    await close_telegram_http()
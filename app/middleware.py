@@ -0,0 +1,241 @@
+import gzip
+import zlib
+
+from fastapi import HTTPException
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # brotli необязателен: без него сжимаем только gzip
+    brotli = None
+
+
+MB = 1024 * 1024
+
+# Уже сжатые форматы: повторное сжатие только тратит CPU
+_COMPRESSED_TYPE_PREFIXES = ("image/", "video/", "audio/", "font/woff")
+_COMPRESSED_TYPES = {
+    "application/zip", "application/gzip", "application/x-gzip", "application/x-bzip2",
+    "application/x-7z-compressed", "application/pdf", "application/octet-stream",
+}
+
+
+def accepted_encodings(accept_encoding: str) -> set[str]:
+    """Кодировки из заголовка Accept-Encoding (без явно запрещённых q=0)"""
+    result = set()
+    for part in accept_encoding.split(","):
+        name, _, params = part.partition(";")
+        name = name.strip().lower()
+        if name and params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            result.add(name)
+    return result
+
+
+class UploadLimitMiddleware:
+    """
+    Ограничивает размер multipart-запросов, не читая тело целиком: лимит проверяется
+    по Content-Length и по мере поступления данных. Сами файлы Starlette складывает
+    во временные файлы, так что память на загрузку ограничена независимо от размера.
+    """
+
+    def __init__(self, app: ASGIApp, max_bytes: int, path_limits: dict[str, int] | None = None) -> None:
+        self.app = app
+        self.max_bytes = max_bytes
+        # префикс пути -> лимит; самый длинный подходящий префикс побеждает
+        self.path_limits = sorted((path_limits or {}).items(), key=lambda kv: len(kv[0]), reverse=True)
+
+    def _limit_for(self, path: str) -> int:
+        for prefix, limit in self.path_limits:
+            if path.startswith(prefix):
+                return limit
+        return self.max_bytes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] not in ("POST", "PUT", "PATCH"):
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        if not headers.get("content-type", "").startswith("multipart/form-data"):
+            await self.app(scope, receive, send)
+            return
+
+        limit = self._limit_for(scope["path"])
+        too_large = HTTPException(status_code=413, detail=f"Файл слишком большой. Максимальный размер: {limit // MB}MB")
+        content_length = headers.get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > limit:
+            await self._reject(scope, receive, send, too_large)
+            return
+
+        received = 0
+        response_started = False
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # FastAPI пробрасывает HTTPException из разбора тела как есть -> ответ 413
+                    raise too_large
+            return message
+
+        async def tracking_send(message: Message) -> None:
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracking_send)
+        except HTTPException as exc:
+            if exc is not too_large or response_started:
+                raise
+            await self._reject(scope, receive, send, too_large)
+
+    @staticmethod
+    async def _reject(scope: Scope, receive: Receive, send: Send, exc: HTTPException) -> None:
+        response = JSONResponse({"detail": exc.detail}, status_code=exc.status_code, headers={"Connection": "close"})
+        await response(scope, receive, send)
+
+
+class CompressionMiddleware:
+    """
+    Сжатие ответов (br, если установлен brotli, иначе gzip) на чистом ASGI.
+
+    Не трогает ответы, у которых уже есть Content-Encoding (предсжатая статика) или
+    сжатый тип содержимого (картинки, видео, архивы); пути из exclude_paths пропускаются
+    целиком. Большие ответы (список меню, выгрузки) сжимаются дешёвым уровнем: для
+    динамического JSON время сжатия важнее последних процентов размера.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1000,
+        large_size: int = 256 * 1024,
+        gzip_level: int = 6,
+        large_gzip_level: int = 1,
+        brotli_quality: int = 4,
+        large_brotli_quality: int = 1,
+        exclude_paths: tuple[str, ...] = (),
+    ) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.large_size = large_size
+        self.gzip_level = gzip_level
+        self.large_gzip_level = large_gzip_level
+        self.brotli_quality = brotli_quality
+        self.large_brotli_quality = large_brotli_quality
+        self.exclude_paths = tuple(exclude_paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or (self.exclude_paths and scope["path"].startswith(self.exclude_paths)):
+            await self.app(scope, receive, send)
+            return
+        accepted = accepted_encodings(Headers(scope=scope).get("accept-encoding", ""))
+        if brotli is not None and "br" in accepted:
+            encoding = "br"
+        elif "gzip" in accepted:
+            encoding = "gzip"
+        else:
+            await self.app(scope, receive, send)
+            return
+        await self.app(scope, receive, _CompressionResponder(self, encoding, send).send)
+
+    def compress(self, encoding: str, body: bytes) -> bytes:
+        large = len(body) >= self.large_size
+        if encoding == "br":
+            return brotli.compress(body, quality=self.large_brotli_quality if large else self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.large_gzip_level if large else self.gzip_level, mtime=0)
+
+    def stream_compressor(self, encoding: str) -> "_StreamCompressor":
+        return _StreamCompressor(encoding, self.brotli_quality if encoding == "br" else self.gzip_level)
+
+
+class _StreamCompressor:
+    """Потоковое сжатие с досылкой каждого куска (SSE и стриминг не должны залипать в буфере)"""
+
+    def __init__(self, encoding: str, level: int) -> None:
+        if encoding == "br":
+            self._br = brotli.Compressor(quality=level)
+            self._zlib = None
+        else:
+            self._br = None
+            self._zlib = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def chunk(self, data: bytes) -> bytes:
+        if self._br is not None:
+            return self._br.process(data) + self._br.flush()
+        return self._zlib.compress(data) + self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self._br is not None:
+            return self._br.finish()
+        return self._zlib.flush(zlib.Z_FINISH)
+
+
+class _CompressionResponder:
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, send: Send) -> None:
+        self.middleware = middleware
+        self.encoding = encoding
+        self._send = send
+        self.start_message: Message | None = None
+        self.passthrough = False
+        self.compressor: _StreamCompressor | None = None
+
+    async def send(self, message: Message) -> None:
+        message_type = message["type"]
+        if message_type == "http.response.start":
+            headers = Headers(raw=message["headers"])
+            content_type = headers.get("content-type", "").split(";", 1)[0].strip().lower()
+            if (
+                "content-encoding" in headers
+                or content_type.startswith(_COMPRESSED_TYPE_PREFIXES)
+                or content_type in _COMPRESSED_TYPES
+            ):
+                self.passthrough = True
+                await self._send(message)
+            else:
+                # Заголовки отправим, когда станет понятно, сжимаем ли тело
+                self.start_message = message
+            return
+        if message_type != "http.response.body" or self.passthrough:
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.start_message is not None:
+            start, self.start_message = self.start_message, None
+            if not more_body:
+                if len(body) < self.middleware.minimum_size:
+                    self.passthrough = True
+                    await self._send(start)
+                    await self._send(message)
+                    return
+                body = self.middleware.compress(self.encoding, body)
+                headers = MutableHeaders(raw=start["headers"])
+                headers["Content-Encoding"] = self.encoding
+                headers["Content-Length"] = str(len(body))
+                headers.add_vary_header("Accept-Encoding")
+                await self._send(start)
+                await self._send({"type": "http.response.body", "body": body})
+                return
+            # Потоковый ответ: длина заранее неизвестна
+            headers = MutableHeaders(raw=start["headers"])
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            del headers["Content-Length"]
+            self.compressor = self.middleware.stream_compressor(self.encoding)
+            await self._send(start)
+
+        if self.compressor is None:
+            await self._send(message)
+            return
+        data = self.compressor.chunk(body) if body else b""
+        if not more_body:
+            data += self.compressor.finish()
+        await self._send({"type": "http.response.body", "body": data, "more_body": more_body})
@@ -1,10 +1,15 @@
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import Integer, String, Boolean, Text, ForeignKey, Float, Index, UniqueConstraint
+from sqlalchemy import Integer, String, Boolean, Text, ForeignKey, Float, Index, UniqueConstraint, JSON
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.types import DateTime
 from datetime import datetime
 from app.db import Base
 
 
+# Список id выбранных опций: JSONB в Postgres, JSON (текст) в SQLite
+OptionIdList = JSON().with_variant(JSONB(), "postgresql")
+
+
 class User(Base):
     __tablename__ = "users"
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
@@ -36,6 +41,8 @@ class Restaurant(Base):
     image: Mapped[str] = mapped_column(Text, default="")
     work_open_min: Mapped[int] = mapped_column(Integer, default=0)
     work_close_min: Mapped[int] = mapped_column(Integer, default=1440)
+    # письма о заказах: 0 — на каждый заказ, N > 0 — одна сводка за N минут
+    email_digest_minutes: Mapped[int] = mapped_column(Integer, default=0)
 
 
 class RestaurantAdmin(Base):
@@ -165,7 +172,19 @@ class OrderItem(Base):
     name: Mapped[str] = mapped_column(String(300))
     price: Mapped[int] = mapped_column(Integer)
     qty: Mapped[int] = mapped_column(Integer)
-    chosen_options: Mapped[str] = mapped_column(Text, default="[]")  # JSON строка
+    chosen_options: Mapped[list[int]] = mapped_column(OptionIdList, default=list)  # id выбранных опций
+
+
+class OrderItemOption(Base):
+    """Выбранные опции позиции заказа построчно — для отчётов по популярности опций"""
+    __tablename__ = "order_item_options"
+    __table_args__ = (
+        Index("ix_order_item_options_option_id", "option_id"),
+    )
+    order_item_id: Mapped[int] = mapped_column(Integer, ForeignKey("order_items.id", ondelete="CASCADE"), primary_key=True)
+    option_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    name: Mapped[str] = mapped_column(String(200), default="")  # название опции на момент заказа
+    price_delta: Mapped[int] = mapped_column(Integer, default=0)
 
 
 class Cart(Base):
@@ -190,7 +209,7 @@ class CartItem(Base):
     restaurant_id: Mapped[int] = mapped_column(Integer, ForeignKey("restaurants.id"))
     dish_id: Mapped[int] = mapped_column(Integer)
     qty: Mapped[int] = mapped_column(Integer)
-    chosen_options: Mapped[str] = mapped_column(Text, default="[]")  # JSON строка
+    chosen_options: Mapped[list[int]] = mapped_column(OptionIdList, default=list)  # id выбранных опций
 
 
 class Collection(Base):
@@ -218,3 +237,40 @@ class CollectionItem(Base):
     sort_order: Mapped[int] = mapped_column(Integer, default=0)
     is_enabled: Mapped[bool] = mapped_column(Boolean, default=True)
 
+
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (
+        Index("ix_idempotency_keys_created", "created_at"),
+    )
+    scope: Mapped[str] = mapped_column(String(128), primary_key=True)  # операция + владелец, например "orders:123"
+    key: Mapped[str] = mapped_column(String(128), primary_key=True)  # значение заголовка Idempotency-Key
+    request_hash: Mapped[str] = mapped_column(String(64))
+    status: Mapped[str] = mapped_column(String(16), default="pending")  # "pending" или "done"
+    response: Mapped[str | None] = mapped_column(Text, nullable=True)  # JSON ответа
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class BotFSMState(Base):
+    __tablename__ = "bot_fsm_states"
+    __table_args__ = (
+        Index("ix_bot_fsm_states_updated", "updated_at"),
+    )
+    key: Mapped[str] = mapped_column(String(255), primary_key=True)  # bot:chat:user[:thread]:destiny
+    state: Mapped[str | None] = mapped_column(String(255), nullable=True)  # например "AddRestaurant:name"
+    data: Mapped[str | None] = mapped_column(Text, nullable=True)  # JSON
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class EmailDigestItem(Base):
+    """Заказ, ожидающий отправки в сводном письме ресторану"""
+    __tablename__ = "email_digest_items"
+    __table_args__ = (
+        Index("ix_email_digest_items_restaurant", "restaurant_id", "created_at"),
+    )
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    restaurant_id: Mapped[int] = mapped_column(Integer, ForeignKey("restaurants.id"))
+    order_id: Mapped[int] = mapped_column(Integer)
+    order_data: Mapped[str] = mapped_column(Text)  # JSON, как для письма о заказе
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,29 @@
+import json
+from datetime import date, datetime
+from typing import Any
+
+from starlette.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # orjson необязателен: без него сериализуем стандартным json
+    orjson = None
+
+
+def _json_default(value: Any):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    Быстрый JSON-ответ для больших списков: содержимое уже собрано из dict/list/примитивов
+    (см. app.db.fetch_dicts), поэтому FastAPI не валидирует и не перекодирует его повторно,
+    а сериализация идёт через orjson. datetime отдаётся в ISO-формате, как у Pydantic.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+        return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=_json_default).encode("utf-8")
@@ -4,19 +4,26 @@ from typing import List
 from app.deps.auth import require_super_admin
 from app.routers.restaurants import Restaurant
 from app.services.telegram import send_admin_message, bot
-from app.services.image_processor import ImageProcessor
+from app.services.image_pool import process_upload_async
+from app.services.upload_spool import BROADCAST_MEDIA_MAX_BYTES, spooled_upload
+from app.services.uploads_gc import collect_garbage, DEFAULT_MIN_AGE_HOURS
+from app.services.image_refs import release_images
+from app.services.pricing import bump_menu_version
+from app.services.roles import roles_changed
 from app.store import ensure_user, bind_restaurant_admin, unbind_restaurant_admin
 from app.models import Review as DBReview
 from sqlalchemy.orm import Session
 from app.db import get_db
-from datetime import datetime
+from datetime import datetime, timedelta
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
 from fastapi import Depends
-from app.db import get_db
-from app.models import Restaurant as ORestaurant, User as DBUser, RestaurantAdmin as DBRestaurantAdmin, Order as DBOrder, Category as DBCategory, Dish as DBDish, OptionGroup as DBOptionGroup, Option as DBOption, CartItem
+from app.db import get_db, fetch_dicts
+from app.responses import FastJSONResponse
+from app.models import Restaurant as ORestaurant, User as DBUser, RestaurantAdmin as DBRestaurantAdmin, Order as DBOrder, Category as DBCategory, Dish as DBDish, OptionGroup as DBOptionGroup, Option as DBOption, CartItem, OrderItem as DBOrderItem, OrderItemOption as DBOrderItemOption
+import asyncio
 import os
-import uuid
-import shutil
+from contextlib import AsyncExitStack
 
 
 router = APIRouter(dependencies=[Depends(require_super_admin)])
@@ -111,6 +118,7 @@ async def update_restaurant(restaurant_id: int, payload: RestaurantUpdate, db: S
         if hasattr(r, k):
             setattr(r, k, v)
     db.commit()
+    bump_menu_version(restaurant_id)
     try:
         await send_admin_message(f"[admin] Обновлён ресторан id={restaurant_id}")
     except Exception:
@@ -129,11 +137,12 @@ async def admin_upload_restaurant_image(restaurant_id: int, image: UploadFile =
     r = db.query(ORestaurant).filter(ORestaurant.id == restaurant_id).first()
     if not r:
         raise HTTPException(status_code=404, detail="restaurant_not_found")
-    data = await image.read()
-    processed = ImageProcessor.process_image(data, image.filename, base_dir="uploads")
+    processed = await process_upload_async(image, base_dir="uploads")
+    old_image = r.image
     # сохраняем баннер как restaurant_banner вариант
     r.image = processed["urls"].get("restaurant_banner") or processed["urls"].get("original")
     db.commit()
+    release_images([old_image], db)
     return {"status": "ok", "image": r.image, "urls": processed["urls"]}
 
 
@@ -156,8 +165,13 @@ async def delete_restaurant(restaurant_id: int, db: Session = Depends(get_db)) -
     r = db.query(ORestaurant).filter(ORestaurant.id == restaurant_id).first()
     if not r:
         return {"status": "not_found"}
+    admin_ids = db.execute(select(DBRestaurantAdmin.user_id).where(DBRestaurantAdmin.restaurant_id == restaurant_id)).scalars().all()
+    old_images = [r.image, *db.execute(select(DBDish.image).where(DBDish.restaurant_id == restaurant_id)).scalars()]
     db.delete(r)
     db.commit()
+    release_images(old_images, db)
+    bump_menu_version(restaurant_id)
+    roles_changed(admin_ids)
     try:
         await send_admin_message(f"[admin] Удалён ресторан id={restaurant_id}")
     except Exception:
@@ -295,8 +309,8 @@ async def broadcast_with_media(
 ) -> dict:
     """Отправляет рассылку с медиа файлом через веб-интерфейс"""
     try:
-        # Импортируем BufferedInputFile в начале функции
-        from aiogram.types import BufferedInputFile
+        # Импортируем FSInputFile в начале функции
+        from aiogram.types import FSInputFile
         # Получаем список получателей
         target_user_ids = get_target_users(recipients, db)
         
@@ -318,72 +332,80 @@ async def broadcast_with_media(
         if not bot:
             return {"status": "error", "message": "Bot not initialized"}
         
-        # Читаем медиа файл ОДИН раз до цикла
-        media_content = None
-        media_type = None
-        if media and media.content_type:
-            print(f"Processing media file: {media.filename}, content_type: {media.content_type}")
-            media_content = await media.read()
-            print(f"Media file size: {len(media_content)} bytes")
+        # Медиа копируем во временный файл на диске (не в память) и загружаем в Telegram
+        # только первому получателю; остальным отправляем по полученному file_id
+        async with AsyncExitStack() as stack:
+            media_path = None
+            media_type = None
+            if media and media.content_type:
+                print(f"Processing media file: {media.filename}, content_type: {media.content_type}")
+                try:
+                    media_path, media_size = await stack.enter_async_context(
+                        spooled_upload(media, max_bytes=BROADCAST_MEDIA_MAX_BYTES)
+                    )
+                except HTTPException as e:
+                    return {"status": "error", "message": e.detail}
+                print(f"Media file size: {media_size} bytes")
+                
+                if media_size == 0:
+                    return {"status": "error", "message": "Медиа файл пустой или поврежден"}
+                
+                # Определяем тип медиа
+                if media.content_type.startswith('image/'):
+                    media_type = 'photo'
+                elif media.content_type.startswith('video/'):
+                    media_type = 'video'
+                else:
+                    media_type = 'unsupported'
+                    print(f"Unsupported media type: {media.content_type}")
             
-            if len(media_content) == 0:
-                return {"status": "error", "message": "Медиа файл пустой или поврежден"}
-            if len(media_content) > 20 * 1024 * 1024:  # 20MB
-                return {"status": "error", "message": "Файл слишком большой. Максимальный размер: 20MB"}
+            media_file_id = None
             
-            # Определяем тип медиа
-            if media.content_type.startswith('image/'):
-                media_type = 'photo'
-            elif media.content_type.startswith('video/'):
-                media_type = 'video'
-            else:
-                media_type = 'unsupported'
-                print(f"Unsupported media type: {media.content_type}")
-        
-        # Отправляем сообщения
-        for user_id in target_user_ids:
-            try:
-                if media_content and media_type:
-                    if media_type == 'photo':
-                        # Отправляем как фото
-                        photo_file = BufferedInputFile(media_content, filename=media.filename)
-                        await bot.send_photo(
-                            chat_id=user_id,
-                            photo=photo_file,
-                            caption=text
-                        )
-                    elif media_type == 'video':
-                        # Отправляем как видео
-                        video_file = BufferedInputFile(media_content, filename=media.filename)
-                        await bot.send_video(
-                            chat_id=user_id,
-                            video=video_file,
-                            caption=text
-                        )
+            # Отправляем сообщения
+            for user_id in target_user_ids:
+                try:
+                    if media_path and media_type:
+                        if media_type == 'photo':
+                            # Отправляем как фото
+                            message = await bot.send_photo(
+                                chat_id=user_id,
+                                photo=media_file_id or FSInputFile(media_path, filename=media.filename),
+                                caption=text
+                            )
+                            if not media_file_id and message.photo:
+                                media_file_id = message.photo[-1].file_id
+                        elif media_type == 'video':
+                            # Отправляем как видео
+                            message = await bot.send_video(
+                                chat_id=user_id,
+                                video=media_file_id or FSInputFile(media_path, filename=media.filename),
+                                caption=text
+                            )
+                            if not media_file_id and message.video:
+                                media_file_id = message.video.file_id
+                        else:
+                            # Неподдерживаемый тип файла
+                            await bot.send_message(
+                                chat_id=user_id,
+                                text=f"{text}\n\n📎 Прикреплен файл: {media.filename}"
+                            )
                     else:
-                        # Неподдерживаемый тип файла
+                        # Только текст
                         await bot.send_message(
                             chat_id=user_id,
-                            text=f"{text}\n\n📎 Прикреплен файл: {media.filename}"
+                            text=text
                         )
-                else:
-                    # Только текст
-                    await bot.send_message(
-                        chat_id=user_id,
-                        text=text
-                    )
-                sent_count += 1
-                
-                # Небольшая задержка между сообщениями
-                import asyncio
-                await asyncio.sleep(0.05)
-                
-            except Exception as e:
-                failed_count += 1
-                # Более подробное логирование ошибок
-                error_msg = f"Failed to send to user {user_id}: {type(e).__name__}: {str(e)}"
-                print(error_msg)
-                continue
+                    sent_count += 1
+                    
+                    # Небольшая задержка между сообщениями
+                    await asyncio.sleep(0.05)
+                    
+                except Exception as e:
+                    failed_count += 1
+                    # Более подробное логирование ошибок
+                    error_msg = f"Failed to send to user {user_id}: {type(e).__name__}: {str(e)}"
+                    print(error_msg)
+                    continue
         
         # Отправляем отчет админу
         await send_admin_message(
@@ -409,25 +431,16 @@ async def broadcast_with_media(
 
 
 # users management
-@router.get("/users")
+@router.get("/users", response_class=FastJSONResponse)
 async def list_users(db: Session = Depends(get_db)) -> List[dict]:
-    users = db.query(DBUser).all()
-    admin_rows = db.query(DBRestaurantAdmin).all()
-    admin_map = {r.user_id: r.restaurant_id for r in admin_rows}
-    out: List[dict] = []
+    users = fetch_dicts(db, select(
+        DBUser.id, DBUser.username, DBUser.is_blocked, DBUser.phone, DBUser.name,
+        DBUser.address, DBUser.birth_date, DBUser.created_at,
+    ))
+    admin_map = dict(db.execute(select(DBRestaurantAdmin.user_id, DBRestaurantAdmin.restaurant_id)).all())
     for u in users:
-        out.append({
-            "id": u.id,
-            "username": u.username,
-            "is_blocked": u.is_blocked,
-            "phone": u.phone,
-            "name": u.name,
-            "address": u.address,
-            "birth_date": u.birth_date,
-            "created_at": u.created_at,
-            "restaurant_admin_of": admin_map.get(u.id),
-        })
-    return out
+        u["restaurant_admin_of"] = admin_map.get(u["id"])
+    return FastJSONResponse(users)
 
 
 @router.post("/users/block")
@@ -440,6 +453,7 @@ async def block_user(user_id: int, block: bool = True, db: Session = Depends(get
     if u:
         u.is_blocked = block
         db.commit()
+        roles_changed([user_id])
     try:
         await send_admin_message(f"[admin] Пользователь {user_id} {'заблокирован' if block else 'разблокирован'}")
     except Exception:
@@ -462,12 +476,14 @@ async def resolve_username_endpoint(username: str) -> dict:
 @router.post("/users/bind-admin")
 async def make_restaurant_admin(user_id: int, restaurant_id: int, db: Session = Depends(get_db)) -> dict:
     bind_restaurant_admin(user_id, restaurant_id)
+    roles_changed([user_id])
     return {"status": "ok"}
 
 
 @router.post("/users/unbind-admin")
 async def revoke_restaurant_admin(user_id: int) -> dict:
     unbind_restaurant_admin(user_id)
+    roles_changed([user_id])
     return {"status": "ok"}
 
 
@@ -562,6 +578,30 @@ async def stats_users(db: Session = Depends(get_db)) -> dict:
     }
 
 
+@router.get("/stats/options")
+async def stats_options(restaurant_id: int | None = None, days: int | None = None, limit: int = 20, db: Session = Depends(get_db)) -> dict:
+    """Популярность опций по заказам (без отменённых): сколько раз выбрана и сколько порций"""
+    times = func.count(DBOrderItemOption.order_item_id)
+    portions = func.coalesce(func.sum(DBOrderItem.qty), 0)
+    q = (
+        db.query(DBOrderItemOption.option_id, func.max(DBOrderItemOption.name), times, portions)
+        .join(DBOrderItem, DBOrderItem.id == DBOrderItemOption.order_item_id)
+        .join(DBOrder, DBOrder.id == DBOrderItem.order_id)
+        .filter(DBOrder.status != "cancelled")
+    )
+    if restaurant_id is not None:
+        q = q.filter(DBOrder.restaurant_id == restaurant_id)
+    if days:
+        q = q.filter(DBOrder.created_at >= datetime.utcnow() - timedelta(days=days))
+    rows = q.group_by(DBOrderItemOption.option_id).order_by(portions.desc(), times.desc()).limit(max(1, min(limit, 200))).all()
+    return {
+        "options": [
+            {"option_id": oid, "name": name, "times": int(cnt), "portions": int(qty)}
+            for (oid, name, cnt, qty) in rows
+        ]
+    }
+
+
 @router.get("/stats/restaurants")
 async def stats_restaurants(db: Session = Depends(get_db)) -> dict:
     restaurants = db.query(ORestaurant).all()
@@ -577,6 +617,15 @@ async def stats_restaurants(db: Session = Depends(get_db)) -> dict:
     }
 
 
+@router.post("/uploads/gc")
+async def uploads_gc(dry_run: bool = True, min_age_hours: float = DEFAULT_MIN_AGE_HOURS, db: Session = Depends(get_db)) -> dict:
+    """Поиск и удаление файлов изображений без ссылок из БД; по умолчанию только отчёт"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        None, lambda: collect_garbage(db, "uploads", dry_run=dry_run, min_age_hours=min_age_hours)
+    )
+
+
 # reviews (простая модерация)
 from dataclasses import dataclass, field
 
@@ -696,12 +745,15 @@ async def delete_category(category_id: int, db: Session = Depends(get_db)):
     if not category:
         raise HTTPException(status_code=404, detail="Category not found")
     
+    old_images = db.execute(select(DBDish.image).where(DBDish.category_id == category_id)).scalars().all()
     # Удаляем все блюда в категории
     db.query(DBDish).filter(DBDish.category_id == category_id).delete()
     
     # Удаляем категорию
     db.delete(category)
     db.commit()
+    release_images(old_images, db)
+    bump_menu_version(category.restaurant_id)
     
     return {"message": "Category and all dishes deleted successfully"}
 
@@ -709,25 +761,20 @@ async def delete_category(category_id: int, db: Session = Depends(get_db)):
 
 @router.post("/upload-dish-image")
 async def upload_dish_image(file: UploadFile = File(...)):
-    """Загрузка изображения блюда"""
+    """Загрузка изображения блюда (с обработкой и дедупликацией, как в кабинете ресторана)"""
     if not file.content_type.startswith('image/'):
         raise HTTPException(status_code=400, detail="File must be an image")
     
-    # Создаем уникальное имя файла
-    file_extension = file.filename.split('.')[-1] if '.' in file.filename else 'jpg'
-    unique_filename = f"{uuid.uuid4()}.{file_extension}"
-    
-    # Путь для сохранения
-    upload_dir = "uploads/dish_card"
-    os.makedirs(upload_dir, exist_ok=True)
-    file_path = os.path.join(upload_dir, unique_filename)
-    
-    # Сохраняем файл
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    try:
+        result = await process_upload_async(file)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка при обработке изображения: {str(e)}")
     
     # Возвращаем относительный путь
-    return {"filename": unique_filename, "path": f"/uploads/dish_card/{unique_filename}"}
+    path = result["urls"]["dish_card"]
+    return {"filename": os.path.basename(path), "path": path, "urls": result["urls"]}
 
 @router.post("/dishes")
 async def create_dish(payload: dict, db: Session = Depends(get_db)):
@@ -777,6 +824,7 @@ async def create_dish(payload: dict, db: Session = Depends(get_db)):
     # Обновляем флаг has_options для блюда
     dish.has_options = len(option_groups) > 0
     db.commit()
+    bump_menu_version(dish.restaurant_id)
     
     return {"message": "Dish created successfully", "dish": {
         "id": dish.id,
@@ -801,6 +849,7 @@ async def update_dish(dish_id: int, payload: dict, db: Session = Depends(get_db)
         dish.description = payload["description"]
     if "price" in payload:
         dish.price = payload["price"]
+    old_image = dish.image
     if "image" in payload:
         dish.image = payload["image"]
     
@@ -842,6 +891,9 @@ async def update_dish(dish_id: int, payload: dict, db: Session = Depends(get_db)
         dish.has_options = len(option_groups) > 0
     
     db.commit()
+    bump_menu_version(dish.restaurant_id)
+    if dish.image != old_image:
+        release_images([old_image], db)
     
     return {"message": "Dish updated successfully", "dish": {
         "id": dish.id,
@@ -879,8 +931,11 @@ async def delete_dish(dish_id: int, db: Session = Depends(get_db)):
     db.query(DBOrderItem).filter(DBOrderItem.dish_id == dish_id).delete(synchronize_session=False)
     
     # 4. Теперь можно безопасно удалить само блюдо
+    old_image = dish.image
     db.delete(dish)
     db.commit()
+    bump_menu_version(dish.restaurant_id)
+    release_images([old_image], db)
     
     return {"message": "Dish and all related data deleted successfully"}
 
@@ -6,7 +6,7 @@ from app.deps.auth import require_user_id
 from sqlalchemy.orm import Session
 from app.db import get_db
 from app.models import Cart as DBCart, CartItem as DBCartItem, Dish as ODish, Option as OOption, OptionGroup as OGroup, User as DBUser
-import json
+from app.services.pricing import get_price_tables, parse_option_ids
 
 
 router = APIRouter()
@@ -18,6 +18,7 @@ class CartItem(BaseModel):
     dish_id: int
     qty: int
     chosen_options: Optional[List[int]] = None
+    price: Optional[int] = None  # цена порции с опциями (заполняется сервером)
     
     class Config:
         # Разрешаем дополнительные поля для совместимости
@@ -27,6 +28,7 @@ class CartItem(BaseModel):
 class Cart(BaseModel):
     items: List[CartItem]
     cutlery_count: int = 0
+    total_price: int = 0  # сумма доступных позиций без доставки
 
 
 # Константы для корзины
@@ -52,18 +54,29 @@ async def get_cart(user_id: int = Depends(require_user_id), db: Session = Depend
     c = _get_cart_db(user_id, db)
     # Оптимизированный запрос - получаем все элементы корзины одним запросом
     items = db.query(DBCartItem).filter(DBCartItem.cart_id == c.id).all()
+    # Цены считаем по кэшированным прайсам ресторанов, без запросов к блюдам и опциям
+    tables = get_price_tables((it.restaurant_id for it in items), db)
+    out: List[CartItem] = []
+    total = 0
+    for it in items:
+        option_ids = parse_option_ids(it.chosen_options)
+        table = tables.get(it.restaurant_id)
+        dish = table.dishes.get(it.dish_id) if table else None
+        price = table.unit_price(it.dish_id, option_ids) if table else None
+        if price is not None and dish.is_available:
+            total += price * (it.qty or 0)
+        out.append(CartItem(
+            id=it.id, 
+            restaurant_id=it.restaurant_id, 
+            dish_id=it.dish_id, 
+            qty=it.qty, 
+            chosen_options=option_ids,
+            price=price,
+        ))
     return Cart(
-        items=[
-            CartItem(
-                id=it.id, 
-                restaurant_id=it.restaurant_id, 
-                dish_id=it.dish_id, 
-                qty=it.qty, 
-                chosen_options=json.loads(it.chosen_options or "[]")
-            )
-            for it in items
-        ],
+        items=out,
         cutlery_count=c.cutlery_count or 0,
+        total_price=total,
     )
 
 
@@ -72,6 +85,8 @@ async def add_item(item: CartItem, force: bool = False, user_id: int = Depends(r
     # Убеждаемся, что chosen_options не None
     if item.chosen_options is None:
         item.chosen_options = []
+    # Повторы одной опции схлопываем: опция выбирается один раз
+    item.chosen_options = list(dict.fromkeys(item.chosen_options))
     print(f"DEBUG: Force flag: {force}")
     print(f"DEBUG: User ID: {user_id}")
     print(f"DEBUG: restaurant_id type: {type(item.restaurant_id)}, value: {item.restaurant_id}")
@@ -147,15 +162,16 @@ async def add_item(item: CartItem, force: bool = False, user_id: int = Depends(r
                 raise HTTPException(status_code=400, detail={"status": "options_exceeded", "group_id": g.id, "max": g.max_select})
     
     # Нормализуем выбранные опции для корректного сравнения и хранения
-    normalized_options = json.dumps(sorted(item.chosen_options or []))
+    normalized_options = sorted(item.chosen_options or [])
 
     # Пытаемся найти уже существующую позицию с тем же блюдом и теми же опциями
-    existing_item = db.query(DBCartItem).filter(
+    # (опции сравниваем как списки: JSON-колонки не сравниваются одинаково во всех СУБД)
+    same_dish = db.query(DBCartItem).filter(
         DBCartItem.cart_id == c.id,
         DBCartItem.restaurant_id == item.restaurant_id,
         DBCartItem.dish_id == item.dish_id,
-        DBCartItem.chosen_options == normalized_options,
-    ).first()
+    ).all()
+    existing_item = next((x for x in same_dish if sorted(parse_option_ids(x.chosen_options)) == normalized_options), None)
 
     if existing_item:
         print(f"DEBUG: Found existing cart item {existing_item.id}, merging qty {existing_item.qty} + {item.qty}")
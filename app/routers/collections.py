@@ -5,7 +5,8 @@ from sqlalchemy.orm import Session
 from app.db import get_db
 from app.deps.auth import require_super_admin
 from app.models import Collection as DBCollection, CollectionItem as DBCollectionItem, Restaurant as DBRestaurant, Dish as DBDish
-from app.services.image_processor import ImageProcessor
+from app.services.image_pool import process_upload_async
+from app.services.image_refs import release_images
 from datetime import datetime
 
 router = APIRouter()
@@ -200,11 +201,14 @@ async def update_collection(collection_id: int, payload: CollectionUpdate, db: S
     if not collection:
         raise HTTPException(status_code=404, detail="Collection not found")
     
+    old_image = collection.image
     update_data = payload.model_dump(exclude_unset=True, exclude_none=True)
     for key, value in update_data.items():
         setattr(collection, key, value)
     
     db.commit()
+    if collection.image != old_image:
+        release_images([old_image], db)
     return {"status": "updated"}
 
 
@@ -214,12 +218,16 @@ async def delete_collection(collection_id: int, db: Session = Depends(get_db)) -
     if not collection:
         raise HTTPException(status_code=404, detail="Collection not found")
     
+    old_images = [collection.image] + [
+        image for (image,) in db.query(DBCollectionItem.image).filter(DBCollectionItem.collection_id == collection_id)
+    ]
     # Удаляем все элементы подборки
     db.query(DBCollectionItem).filter(DBCollectionItem.collection_id == collection_id).delete()
     
     # Удаляем подборку
     db.delete(collection)
     db.commit()
+    release_images(old_images, db)
     
     return {"status": "deleted"}
 
@@ -312,11 +320,14 @@ async def update_collection_item(collection_id: int, item_id: int, payload: Coll
     if not item:
         raise HTTPException(status_code=404, detail="Collection item not found")
     
+    old_image = item.image
     update_data = payload.model_dump(exclude_unset=True, exclude_none=True)
     for key, value in update_data.items():
         setattr(item, key, value)
     
     db.commit()
+    if item.image != old_image:
+        release_images([old_image], db)
     return {"status": "updated"}
 
 
@@ -330,8 +341,10 @@ async def delete_collection_item(collection_id: int, item_id: int, db: Session =
     if not item:
         raise HTTPException(status_code=404, detail="Collection item not found")
     
+    old_image = item.image
     db.delete(item)
     db.commit()
+    release_images([old_image], db)
     
     return {"status": "deleted"}
 
@@ -345,11 +358,8 @@ async def upload_collection_image(image: UploadFile = File(...)) -> dict:
         raise HTTPException(status_code=400, detail="Файл должен быть изображением")
     
     try:
-        # Читаем содержимое файла
-        content = await image.read()
-        
-        # Обрабатываем изображение
-        result = ImageProcessor.process_image(content, image.filename)
+        # Обрабатываем изображение (файл читается с диска, не из памяти)
+        result = await process_upload_async(image)
         
         # Возвращаем результат с URL'ами для разных размеров
         return {
@@ -360,6 +370,8 @@ async def upload_collection_image(image: UploadFile = File(...)) -> dict:
             "processed_sizes": result["processed_sizes"]
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ошибка при обработке изображения: {str(e)}")
 
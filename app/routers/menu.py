@@ -1,8 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from typing import List, Dict, Optional
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from app.db import get_db
+from app.db import get_db, fetch_dicts
+from app.responses import FastJSONResponse
 from app.models import Category as OCategory, Dish as ODish, Option as OOption, OptionGroup as OGroup
 
 
@@ -50,31 +52,28 @@ _GROUPS: List[DishOptionGroup] = []
 _OPTIONS: List[DishOption] = []
 
 
-@router.get("/restaurants/{restaurant_id}/menu")
-async def get_menu(restaurant_id: int, db: Session = Depends(get_db)) -> Dict[str, List[dict]]:
-    cats = db.query(OCategory).filter(OCategory.restaurant_id == restaurant_id).order_by(OCategory.sort.asc()).all()
-    dishes = db.query(ODish).filter(ODish.restaurant_id == restaurant_id).all()
+# Колонки для списков меню: ровно поля моделей Category и Dish
+CATEGORY_COLUMNS = (OCategory.id, OCategory.restaurant_id, OCategory.name, OCategory.sort)
+DISH_COLUMNS = (
+    ODish.id, ODish.restaurant_id, ODish.category_id, ODish.name, ODish.description,
+    ODish.price, ODish.image, ODish.is_available, ODish.has_options,
+)
+
+
+def menu_payload(db: Session, restaurant_id: int) -> Dict[str, List[dict]]:
+    """Категории и блюда ресторана одним ответом (меню бывает на сотни блюд)"""
     return {
-        "categories": [
-            {"id": c.id, "restaurant_id": c.restaurant_id, "name": c.name, "sort": c.sort}
-            for c in cats
-        ],
-        "dishes": [
-            {
-                "id": d.id,
-                "restaurant_id": d.restaurant_id,
-                "category_id": d.category_id,
-                "name": d.name,
-                "description": d.description,
-                "price": d.price,
-                "image": d.image,
-                "is_available": d.is_available,
-                "has_options": d.has_options,
-            }
-            for d in dishes
-        ],
+        "categories": fetch_dicts(
+            db, select(*CATEGORY_COLUMNS).where(OCategory.restaurant_id == restaurant_id).order_by(OCategory.sort.asc())
+        ),
+        "dishes": fetch_dicts(db, select(*DISH_COLUMNS).where(ODish.restaurant_id == restaurant_id)),
     }
 
+
+@router.get("/restaurants/{restaurant_id}/menu", response_class=FastJSONResponse)
+async def get_menu(restaurant_id: int, db: Session = Depends(get_db)) -> Dict[str, List[dict]]:
+    return FastJSONResponse(menu_payload(db, restaurant_id))
+
 @router.get("/categories")
 async def get_categories(restaurant_id: int, db: Session = Depends(get_db)) -> List[Category]:
     """Получить категории для конкретного ресторана"""
@@ -101,26 +100,18 @@ async def get_dish(dish_id: int, db: Session = Depends(get_db)) -> Dish:
     )
 
 
-@router.get("/dishes")
+@router.get("/dishes", response_class=FastJSONResponse)
 async def get_dishes_bulk(ids: str = None, restaurant_id: int = None, db: Session = Depends(get_db)) -> List[Dish]:
     if restaurant_id:
         # Получаем блюда по ресторану
-        rows = db.query(ODish).filter(ODish.restaurant_id == restaurant_id).all()
-        return [Dish(
-            id=d.id, restaurant_id=d.restaurant_id, category_id=d.category_id, name=d.name,
-            description=d.description, price=d.price, image=d.image, is_available=d.is_available, has_options=d.has_options
-        ) for d in rows]
+        return FastJSONResponse(fetch_dicts(db, select(*DISH_COLUMNS).where(ODish.restaurant_id == restaurant_id)))
     elif ids:
         # Получаем блюда по списку ID (для совместимости)
         try:
             id_list = [int(x) for x in ids.split(",") if x.strip()]
         except Exception as exc:
             raise RuntimeError("Bad ids") from exc
-        rows = db.query(ODish).filter(ODish.id.in_(id_list)).all()
-        return [Dish(
-            id=d.id, restaurant_id=d.restaurant_id, category_id=d.category_id, name=d.name,
-            description=d.description, price=d.price, image=d.image, is_available=d.is_available, has_options=d.has_options
-        ) for d in rows]
+        return FastJSONResponse(fetch_dicts(db, select(*DISH_COLUMNS).where(ODish.id.in_(id_list))))
     else:
         raise HTTPException(status_code=400, detail="Either ids or restaurant_id must be provided")
 
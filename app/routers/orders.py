@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Header
 from pydantic import BaseModel
 from typing import List, Literal
 from datetime import datetime, timezone, timedelta
@@ -10,12 +10,18 @@ def moscow_now():
 from app.services.telegram import send_admin_message, send_user_message, WEBAPP_URL, notify_user_order_delivered, notify_restaurant_admins, notify_restaurant_comment
 from app.deps.auth import require_user_id
 from app.logging_config import get_logger
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from app.db import get_db
-from app.models import Option as OOption, Restaurant as ORestaurant, Order as DBOrder, OrderItem as DBOrderItem
+from app.db import get_db, begin_transaction, fetch_dicts
+from app.responses import FastJSONResponse
+from app.models import Restaurant as ORestaurant, Order as DBOrder, OrderItem as DBOrderItem, OrderItemOption as DBOrderItemOption, Cart as DBCart, CartItem as DBCartItem
+from app.services.pricing import PriceTable, get_price_table, parse_option_ids
+from app.services.idempotency import run_idempotent
+from app.services.order_state import TransitionError, transition
 from app.store import ensure_user
 from app.email_service import email_service
-import json
+from app.services.email_digest import queue_digest_order
+import asyncio
 
 def safe_dish_name(name: str | None) -> str:
     """Безопасное получение названия блюда с проверкой на undefined и пустые значения"""
@@ -73,115 +79,68 @@ class OrderCreate(BaseModel):
     items: List[OrderItem]
 
 
-@router.post("")
-async def create_order(payload: OrderCreate, db: Session = Depends(get_db)) -> dict:
-    # check user blocked
-    user = ensure_user(payload.user_id)
-    if user.is_blocked:
-        raise HTTPException(status_code=403, detail="user_blocked")
-    # server-side validation: minimal sum for delivery
-    if payload.delivery_type == "delivery":
-        r = db.query(ORestaurant).filter(ORestaurant.id == payload.restaurant_id).first()
-        if not r:
-            raise HTTPException(status_code=404, detail="Restaurant not found")
-        if payload.total_price < r.delivery_min_sum:
-            diff = r.delivery_min_sum - payload.total_price
-            raise HTTPException(status_code=400, detail=f"Добавьте ещё на {diff} р")
-    # snapshot items with option names and compute total server-side
-    # options lookup from DB
-    chosen_ids: set[int] = set()
-    for it in payload.items:
-        if it.chosen_options:
-            chosen_ids.update(int(x) for x in it.chosen_options)
-    opt_map: dict[int, OOption] = {}
-    if chosen_ids:
-        rows = db.query(OOption).filter(OOption.id.in_(list(chosen_ids))).all()
-        opt_map = {o.id: o for o in rows}
+def price_order_items(items: List[OrderItem], table: PriceTable) -> tuple[List[OrderItem], int]:
+    """Снимок позиций заказа по прайсу ресторана: названия с опциями, цены блюд и сумма без доставки"""
     snapped_items: List[OrderItem] = []
-    computed_total = 0
-    for it in payload.items:
-        opts = []
-        delta = 0
-        if it.chosen_options:
-            for oid in it.chosen_options:
-                op = opt_map.get(int(oid))
-                if op:
-                    delta += op.price_delta or 0
-                    opts.append(op.name + (f"+{op.price_delta}" if op.price_delta else ""))
+    subtotal = 0
+    for it in items:
+        if it.qty <= 0:
+            raise HTTPException(status_code=400, detail="Некорректное количество")
+        dish = table.dishes.get(it.dish_id)
+        if not dish:
+            raise HTTPException(status_code=400, detail=f"Блюдо {it.dish_id} не найдено в меню ресторана")
+        if not dish.is_available:
+            raise HTTPException(status_code=400, detail=f"Блюдо «{safe_dish_name(dish.name)}» сейчас недоступно")
+        option_ids = parse_option_ids(it.chosen_options)
+        opts = table.options_for(dish.id, option_ids)
+        delta = sum(op.price_delta for op in opts)
         # Защита от пустых названий блюд
-        dish_name = safe_dish_name(it.name)
-        name_with_opts = dish_name + (f" ({', '.join(opts)})" if opts else "")
+        dish_name = safe_dish_name(dish.name)
+        opt_names = [op.name + (f"+{op.price_delta}" if op.price_delta else "") for op in opts]
+        name_with_opts = dish_name + (f" ({', '.join(opt_names)})" if opt_names else "")
         snapped_items.append(
             OrderItem(
-                dish_id=it.dish_id,
+                dish_id=dish.id,
                 name=name_with_opts,
-                price=it.price,
+                price=dish.price,
                 qty=it.qty,
-                chosen_options=it.chosen_options or [],
+                chosen_options=option_ids,
             )
         )
-        computed_total += (it.price + delta) * it.qty
+        subtotal += (dish.price + delta) * it.qty
+    return snapped_items, subtotal
 
-    # add delivery fee if delivery type
-    delivery_fee = 0
-    r = db.query(ORestaurant).filter(ORestaurant.id == payload.restaurant_id).first()
-    if payload.delivery_type == "delivery" and r:
-        delivery_fee = r.delivery_fee
-    computed_total += delivery_fee
-
-    # Persist order and items in DB
-    db_order = DBOrder(
-        user_id=payload.user_id,
-        restaurant_id=payload.restaurant_id,
-        status="sent",
-        total_price=computed_total,
-        delivery_type=payload.delivery_type,
-        address=payload.address,
-        phone=payload.phone,
-        payment_method=payload.payment_method,
-        client_comment=payload.client_comment,
-        cutlery_count=payload.cutlery_count,
-        created_at=moscow_now(),
-    )
-    db.add(db_order)
-    db.commit()
-    db.refresh(db_order)
-    for it in snapped_items:
-        db.add(DBOrderItem(
-            order_id=db_order.id,
+
+def _add_order_items(db: Session, order_id: int, snapped_items: List[OrderItem], table: PriceTable) -> None:
+    """Записывает позиции заказа и построчно их опции (order_item_options) для аналитики"""
+    db_items = [
+        DBOrderItem(
+            order_id=order_id,
             dish_id=it.dish_id,
             name=it.name,
             price=it.price,
             qty=it.qty,
-            chosen_options=json.dumps(it.chosen_options or []),
-        ))
-    db.commit()
-    # journal notification (админ‑канал)
-    try:
-        def fmt_item(it: OrderItem) -> str:
-            return f"{safe_dish_name(it.name)}×{it.qty}"
-
-        items_txt = ", ".join(fmt_item(it) for it in snapped_items)
-        msg = (
-            f"Новый заказ №{db_order.id} в ресторане {db_order.restaurant_id} на сумму {db_order.total_price} р\n"
-            f"Тип: {db_order.delivery_type}, Оплата: {db_order.payment_method}\n"
-            f"Адрес: {db_order.address or '-'}\n"
-            f"Состав: {items_txt}"
+            chosen_options=it.chosen_options or [],
         )
-        await send_admin_message(msg)
-    except Exception:
-        pass
-
-    # Уведомление админам ресторана
+        for it in snapped_items
+    ]
+    db.add_all(db_items)
+    db.flush()
+    db.add_all([
+        DBOrderItemOption(order_item_id=db_item.id, option_id=op.id, name=op.name, price_delta=op.price_delta)
+        for db_item in db_items
+        for op in table.options_for(db_item.dish_id, db_item.chosen_options)
+    ])
+
+
+async def _notify_restaurant_new_order(db_order: DBOrder, snapped_items: List[OrderItem]) -> None:
+    """Уведомление админам ресторана о новом заказе"""
     try:
         if WEBAPP_URL:
             # URL для открытия страницы обработки заказа
             admin_url = f"{WEBAPP_URL}/static/ra.html?order_id={db_order.id}"
             
-            def fmt_item(it: OrderItem) -> str:
-                return f"{safe_dish_name(it.name)}×{it.qty}"
-            
-            items_txt = ", ".join(fmt_item(it) for it in snapped_items)
+            items_txt = ", ".join(f"{safe_dish_name(it.name)}×{it.qty}" for it in snapped_items)
             admin_msg = (
                 f"🆕 НОВЫЙ ЗАКАЗ №{db_order.id}\n\n"
                 f"💰 Сумма: {db_order.total_price} ₽\n"
@@ -202,9 +161,10 @@ async def create_order(payload: OrderCreate, db: Session = Depends(get_db)) -> d
     except Exception as exc:
         logger.exception("Failed to send notification to restaurant admins: %s", repr(exc))
 
-    # Email уведомление ресторану о новом заказе (асинхронно)
+
+def _schedule_order_email(db: Session, db_order: DBOrder, snapped_items: List[OrderItem], r: ORestaurant | None) -> None:
+    """Email уведомление ресторану о новом заказе (асинхронно) или заказ в его сводку"""
     try:
-        r = db.query(ORestaurant).filter(ORestaurant.id == db_order.restaurant_id).first()
         if r and r.email:
             # Подготавливаем данные для email
             order_data = {
@@ -225,19 +185,94 @@ async def create_order(payload: OrderCreate, db: Session = Depends(get_db)) -> d
                     } for item in snapped_items
                 ]
             }
-            
-            # Отправляем email в фоновом режиме
-            import asyncio
-            from app.main import send_email_background
-            asyncio.create_task(send_email_background(
-                restaurant_email=r.email,
-                restaurant_name=r.name,
-                order_data=order_data
-            ))
-            logger.info(f"Email отправка запланирована в фоне для заказа #{db_order.id}")
+
+            if r.email_digest_minutes and email_service.configured:
+                # ресторан получает одно письмо за окно — заказ ждёт сводки (app/services/email_digest.py)
+                queue_digest_order(db, r.id, order_data)
+                return
+            # Письмо уходит из очереди через пул SMTP-соединений
+            if email_service.queue_order_notification(r.email, r.name, order_data):
+                logger.info(f"Email поставлен в очередь для заказа #{db_order.id}")
     except Exception as exc:
         logger.exception("Failed to schedule email notification: %s", repr(exc))
 
+
+@router.post("")
+async def create_order(
+    payload: OrderCreate,
+    idempotency_key: str | None = Header(default=None, alias="Idempotency-Key"),
+    db: Session = Depends(get_db),
+) -> dict:
+    # повтор запроса с тем же Idempotency-Key получает ответ первого без нового заказа и уведомлений
+    return await run_idempotent(
+        db, idempotency_key, f"orders:{payload.user_id}", payload.model_dump(),
+        lambda: _create_order(payload, db),
+    )
+
+
+async def _create_order(payload: OrderCreate, db: Session) -> dict:
+    # check user blocked
+    user = ensure_user(payload.user_id)
+    if user.is_blocked:
+        raise HTTPException(status_code=403, detail="user_blocked")
+    # цены берём только с сервера: прайс ресторана из кэша, клиентские price/total игнорируются
+    table = get_price_table(payload.restaurant_id, db)
+    if not table:
+        raise HTTPException(status_code=404, detail="Restaurant not found")
+    snapped_items, subtotal = price_order_items(payload.items, table)
+
+    # server-side validation: minimal sum for delivery
+    if payload.delivery_type == "delivery" and subtotal < table.delivery_min_sum:
+        diff = table.delivery_min_sum - subtotal
+        raise HTTPException(status_code=400, detail=f"Добавьте ещё на {diff} р")
+
+    # add delivery fee if delivery type
+    delivery_fee = table.delivery_fee if payload.delivery_type == "delivery" else 0
+    computed_total = subtotal + delivery_fee
+
+    # Заказ, позиции и их опции — одной транзакцией: при ошибке не остаётся заказа без позиций
+    begin_transaction(db)
+    try:
+        db_order = DBOrder(
+            user_id=payload.user_id,
+            restaurant_id=payload.restaurant_id,
+            status="sent",
+            total_price=computed_total,
+            delivery_type=payload.delivery_type,
+            address=payload.address,
+            phone=payload.phone,
+            payment_method=payload.payment_method,
+            client_comment=payload.client_comment,
+            cutlery_count=payload.cutlery_count,
+            created_at=moscow_now(),
+        )
+        db.add(db_order)
+        db.flush()
+        _add_order_items(db, db_order.id, snapped_items, table)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    # journal notification (админ‑канал)
+    try:
+        def fmt_item(it: OrderItem) -> str:
+            return f"{safe_dish_name(it.name)}×{it.qty}"
+
+        items_txt = ", ".join(fmt_item(it) for it in snapped_items)
+        msg = (
+            f"Новый заказ №{db_order.id} в ресторане {db_order.restaurant_id} на сумму {db_order.total_price} р\n"
+            f"Тип: {db_order.delivery_type}, Оплата: {db_order.payment_method}\n"
+            f"Адрес: {db_order.address or '-'}\n"
+            f"Состав: {items_txt}"
+        )
+        await send_admin_message(msg)
+    except Exception:
+        pass
+
+    r = db.query(ORestaurant).filter(ORestaurant.id == db_order.restaurant_id).first()
+    await _notify_restaurant_new_order(db_order, snapped_items)
+    _schedule_order_email(db, db_order, snapped_items, r)
+
     # notify user with deep‑link to current order (mini app web_app)
     try:
         if WEBAPP_URL:
@@ -245,7 +280,6 @@ async def create_order(payload: OrderCreate, db: Session = Depends(get_db)) -> d
             
             # Получаем название ресторана
             restaurant_name = "ресторана"
-            r = db.query(ORestaurant).filter(ORestaurant.id == db_order.restaurant_id).first()
             if r and r.name:
                 restaurant_name = f"ресторана \"{r.name}\""
             
@@ -278,6 +312,137 @@ async def create_order(payload: OrderCreate, db: Session = Depends(get_db)) -> d
     return {"id": db_order.id}
 
 
+class CheckoutRequest(BaseModel):
+    delivery_type: Literal["delivery", "pickup"]
+    address: str | None = None
+    phone: str
+    payment_method: Literal["cash", "card_to_courier", "transfer"]
+    client_comment: str | None = None
+    cutlery_count: int = 0
+    restaurant_ids: List[int] | None = None  # оформить только эти рестораны из корзины; по умолчанию все
+
+
+@router.post("/checkout")
+async def checkout_cart(
+    payload: CheckoutRequest,
+    idempotency_key: str | None = Header(default=None, alias="Idempotency-Key"),
+    uid: int = Depends(require_user_id),
+    db: Session = Depends(get_db),
+) -> dict:
+    """Оформление корзины с несколькими ресторанами одним запросом: по заказу на ресторан"""
+    return await run_idempotent(
+        db, idempotency_key, f"checkout:{uid}", payload.model_dump(),
+        lambda: _checkout_cart(payload, uid, db),
+    )
+
+
+async def _checkout_cart(payload: CheckoutRequest, uid: int, db: Session) -> dict:
+    user = ensure_user(uid)
+    if user.is_blocked:
+        raise HTTPException(status_code=403, detail="user_blocked")
+    cart = db.query(DBCart).filter(DBCart.user_id == uid).first()
+    lines = db.query(DBCartItem).filter(DBCartItem.cart_id == cart.id).order_by(DBCartItem.id.asc()).all() if cart else []
+    if payload.restaurant_ids is not None:
+        wanted = set(payload.restaurant_ids)
+        lines = [ln for ln in lines if ln.restaurant_id in wanted]
+    if not lines:
+        raise HTTPException(status_code=400, detail="Корзина пуста")
+
+    by_restaurant: dict[int, list[DBCartItem]] = {}
+    for ln in lines:
+        by_restaurant.setdefault(ln.restaurant_id, []).append(ln)
+
+    # Сначала проверяем и считаем все заказы, чтобы ошибка в одном ресторане не оставила половину оформленной
+    restaurants = {r.id: r for r in db.query(ORestaurant).filter(ORestaurant.id.in_(by_restaurant.keys())).all()}
+    priced: list[tuple[int, List[OrderItem], int, PriceTable]] = []
+    for rid, rlines in by_restaurant.items():
+        table = get_price_table(rid, db)
+        if not table or rid not in restaurants:
+            raise HTTPException(status_code=404, detail="Restaurant not found")
+        items = [
+            OrderItem(dish_id=ln.dish_id, name="", price=0, qty=ln.qty or 0, chosen_options=parse_option_ids(ln.chosen_options))
+            for ln in rlines
+        ]
+        snapped_items, subtotal = price_order_items(items, table)
+        if payload.delivery_type == "delivery" and subtotal < table.delivery_min_sum:
+            diff = table.delivery_min_sum - subtotal
+            raise HTTPException(status_code=400, detail=f"{restaurants[rid].name}: добавьте ещё на {diff} р")
+        delivery_fee = table.delivery_fee if payload.delivery_type == "delivery" else 0
+        priced.append((rid, snapped_items, subtotal + delivery_fee, table))
+
+    # Все заказы, их позиции и удаление строк корзины — одной транзакцией
+    created_at = moscow_now()
+    begin_transaction(db)
+    try:
+        db_orders: list[DBOrder] = []
+        for rid, _, total, _ in priced:
+            db_orders.append(DBOrder(
+                user_id=uid,
+                restaurant_id=rid,
+                status="sent",
+                total_price=total,
+                delivery_type=payload.delivery_type,
+                address=payload.address,
+                phone=payload.phone,
+                payment_method=payload.payment_method,
+                client_comment=payload.client_comment,
+                # каждый ресторан привозит приборы сам
+                cutlery_count=payload.cutlery_count,
+                created_at=created_at,
+            ))
+        db.add_all(db_orders)
+        db.flush()
+        for db_order, (_, snapped_items, _, table) in zip(db_orders, priced):
+            _add_order_items(db, db_order.id, snapped_items, table)
+        db.query(DBCartItem).filter(DBCartItem.id.in_([ln.id for ln in lines])).delete(synchronize_session=False)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    # Уведомления отправляем пачкой: журнал и клиенту — одним сообщением, ресторанам — параллельно
+    try:
+        journal = [f"Новые заказы пользователя {uid} ({len(db_orders)} шт.):"]
+        for db_order, (_, snapped_items, _, _) in zip(db_orders, priced):
+            items_txt = ", ".join(f"{safe_dish_name(it.name)}×{it.qty}" for it in snapped_items)
+            journal.append(f"№{db_order.id} в ресторане {db_order.restaurant_id} на сумму {db_order.total_price} р — {items_txt}")
+        journal.append(f"Тип: {payload.delivery_type}, Оплата: {payload.payment_method}, Адрес: {payload.address or '-'}")
+        await send_admin_message("\n".join(journal))
+    except Exception:
+        pass
+
+    for db_order, (rid, snapped_items, _, _) in zip(db_orders, priced):
+        _schedule_order_email(db, db_order, snapped_items, restaurants.get(rid))
+    await asyncio.gather(*(
+        _notify_restaurant_new_order(db_order, snapped_items)
+        for db_order, (_, snapped_items, _, _) in zip(db_orders, priced)
+    ))
+
+    try:
+        if WEBAPP_URL:
+            lines_txt = [f"Заказы отправлены в рестораны ({len(db_orders)}). Ждите подтверждения.", ""]
+            for db_order, (rid, snapped_items, _, _) in zip(db_orders, priced):
+                lines_txt.append(f"№{db_order.id} — {restaurants[rid].name}")
+                for it in snapped_items:
+                    lines_txt.append(f"  {safe_dish_name(it.name)} × {it.qty} — {it.price} р")
+                lines_txt.append(f"  Итого: {db_order.total_price} р")
+            lines_txt.append("------------------------------")
+            lines_txt.append(f"ИТОГО: {sum(o.total_price for o in db_orders)} р")
+            await send_user_message(
+                chat_id=uid,
+                text="\n".join(lines_txt),
+                button_text="Открыть заказы",
+                button_url=f"{WEBAPP_URL}/static/order.html?id={db_orders[0].id}",
+            )
+    except Exception as exc:
+        logger.exception("user_message failed: %s", repr(exc))
+
+    return {
+        "orders": [{"id": o.id, "restaurant_id": o.restaurant_id, "total_price": o.total_price} for o in db_orders],
+        "total_price": sum(o.total_price for o in db_orders),
+    }
+
+
 @router.get("/{order_id}")
 async def get_order(order_id: int, db: Session = Depends(get_db)) -> Order:
     o = db.query(DBOrder).filter(DBOrder.id == order_id).first()
@@ -300,78 +465,62 @@ async def get_order(order_id: int, db: Session = Depends(get_db)) -> Order:
         eta_minutes=o.eta_minutes,
         cutlery_count=o.cutlery_count or 0,
         created_at=o.created_at,
-        items=[OrderItem(dish_id=it.dish_id, name=safe_dish_name(it.name), price=it.price, qty=it.qty, chosen_options=json.loads(it.chosen_options or "[]")) for it in items]
+        items=[OrderItem(dish_id=it.dish_id, name=safe_dish_name(it.name), price=it.price, qty=it.qty, chosen_options=it.chosen_options or []) for it in items]
     )
 
 
-@router.get("")
+# Колонки для списков заказов: поля модели Order (кроме items)
+_ORDER_LIST_COLUMNS = (
+    DBOrder.id, DBOrder.user_id, DBOrder.restaurant_id, DBOrder.status, DBOrder.total_price,
+    DBOrder.delivery_type, DBOrder.address, DBOrder.phone, DBOrder.payment_method,
+    DBOrder.client_comment, DBOrder.staff_comment, DBOrder.accepted_at, DBOrder.eta_minutes,
+    DBOrder.cutlery_count, DBOrder.created_at,
+)
+_ORDER_ITEM_COLUMNS = (DBOrderItem.order_id, DBOrderItem.dish_id, DBOrderItem.name, DBOrderItem.price, DBOrderItem.qty, DBOrderItem.chosen_options)
+
+
+def _orders_payload(db: Session, *where) -> List[dict]:
+    """Заказы с позициями двумя запросами (вместо запроса позиций на каждый заказ)"""
+    orders = fetch_dicts(db, select(*_ORDER_LIST_COLUMNS).where(*where))
+    by_id: dict[int, dict] = {}
+    for o in orders:
+        o["cutlery_count"] = o["cutlery_count"] or 0
+        o["items"] = []
+        by_id[o["id"]] = o
+    if by_id:
+        items = db.execute(select(*_ORDER_ITEM_COLUMNS).where(DBOrderItem.order_id.in_(list(by_id)))).mappings()
+        for it in items:
+            by_id[it["order_id"]]["items"].append({
+                "dish_id": it["dish_id"],
+                "name": safe_dish_name(it["name"]),
+                "price": it["price"],
+                "qty": it["qty"],
+                "chosen_options": it["chosen_options"] or [],
+            })
+    return orders
+
+
+@router.get("", response_class=FastJSONResponse)
 async def list_orders(user_id: int, db: Session = Depends(get_db)) -> List[Order]:
-    rows = db.query(DBOrder).filter(DBOrder.user_id == user_id).all()
-    result: List[Order] = []
-    for o in rows:
-        items = db.query(DBOrderItem).filter(DBOrderItem.order_id == o.id).all()
-        result.append(Order(
-            id=o.id,
-            user_id=o.user_id,
-            restaurant_id=o.restaurant_id,
-            status=o.status,
-            total_price=o.total_price,
-            delivery_type=o.delivery_type,
-            address=o.address,
-            phone=o.phone,
-            payment_method=o.payment_method,
-            client_comment=o.client_comment,
-            staff_comment=o.staff_comment,
-            accepted_at=o.accepted_at,
-            eta_minutes=o.eta_minutes,
-            cutlery_count=o.cutlery_count or 0,
-            created_at=o.created_at,
-            items=[OrderItem(dish_id=it.dish_id, name=safe_dish_name(it.name), price=it.price, qty=it.qty, chosen_options=json.loads(it.chosen_options or "[]")) for it in items]
-        ))
-    return result
-
-
-@router.get("/by-restaurant/{restaurant_id}")
+    return FastJSONResponse(_orders_payload(db, DBOrder.user_id == user_id))
+
+
+@router.get("/by-restaurant/{restaurant_id}", response_class=FastJSONResponse)
 async def list_orders_by_restaurant(restaurant_id: int, db: Session = Depends(get_db)) -> List[Order]:
-    rows = db.query(DBOrder).filter(DBOrder.restaurant_id == restaurant_id).all()
-    result: List[Order] = []
-    for o in rows:
-        items = db.query(DBOrderItem).filter(DBOrderItem.order_id == o.id).all()
-        result.append(Order(
-            id=o.id,
-            user_id=o.user_id,
-            restaurant_id=o.restaurant_id,
-            status=o.status,
-            total_price=o.total_price,
-            delivery_type=o.delivery_type,
-            address=o.address,
-            phone=o.phone,
-            payment_method=o.payment_method,
-            client_comment=o.client_comment,
-            staff_comment=o.staff_comment,
-            accepted_at=o.accepted_at,
-            eta_minutes=o.eta_minutes,
-            cutlery_count=o.cutlery_count or 0,
-            created_at=o.created_at,
-            items=[OrderItem(dish_id=it.dish_id, name=safe_dish_name(it.name), price=it.price, qty=it.qty, chosen_options=json.loads(it.chosen_options or "[]")) for it in items]
-        ))
-    return result
+    return FastJSONResponse(_orders_payload(db, DBOrder.restaurant_id == restaurant_id))
 
 
 @router.post("/{order_id}/accept")
 async def accept_order(order_id: int, eta_minutes: int = 60, uid: int = Depends(require_user_id), db: Session = Depends(get_db)) -> dict:
-    o = db.query(DBOrder).filter(DBOrder.id == order_id).first()
-    if not o:
-        return {"status": "not_found"}
-    
-    # Проверяем, что заказ еще не принят
-    if o.status == "accepted":
-        return {"status": "already_accepted"}
-    
-    o.status = "accepted"
-    o.accepted_at = moscow_now()
-    o.eta_minutes = eta_minutes
-    db.commit()
+    try:
+        o = transition(db, order_id, "accept", accepted_at=moscow_now(), eta_minutes=eta_minutes)
+    except TransitionError as exc:
+        if exc.reason == "not_found":
+            return {"status": "not_found"}
+        # Заказ уже принят (например, повторное нажатие кнопки)
+        if exc.current == "accepted":
+            return {"status": "already_accepted"}
+        return {"status": "invalid_status", "current": exc.current}
     
     try:
         await send_admin_message(
@@ -413,11 +562,12 @@ async def accept_order(order_id: int, eta_minutes: int = 60, uid: int = Depends(
 
 @router.post("/{order_id}/delivered")
 async def delivered_order(order_id: int, db: Session = Depends(get_db)) -> dict:
-    o = db.query(DBOrder).filter(DBOrder.id == order_id).first()
-    if not o:
-        return {"status": "not_found"}
-    o.status = "delivered"
-    db.commit()
+    try:
+        o = transition(db, order_id, "deliver")
+    except TransitionError as exc:
+        if exc.reason == "not_found":
+            return {"status": "not_found"}
+        return {"status": "invalid_status", "current": exc.current}
     
     try:
         await send_admin_message(
@@ -1,13 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Header
 from typing import List, Optional
 from app.deps.auth import require_user_id
 from app.store import get_restaurant_for_admin
 from app.services.telegram import send_admin_message, notify_user_order_modified, notify_user_order_accepted, notify_user_order_delivered, notify_user_order_cancelled, WEBAPP_URL
-from app.services.image_processor import ImageProcessor
+from app.services.image_pool import process_upload_async
+from app.services.image_refs import release_images
+from app.services.pricing import PriceTable, get_price_table, parse_option_ids, bump_menu_version
+from app.services.idempotency import run_idempotent
+from app.services.order_state import TransitionError, transition
+from app.services.email_digest import EMAIL_DIGEST_MAX_MINUTES
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
-from app.db import get_db, get_session
-from app.models import Restaurant as ORestaurant, Option as OOption, Order as DBOrder, OrderItem as DBOrderItem, RestaurantAdmin as DBRestaurantAdmin
+from app.db import get_db, get_session, begin_transaction
+from app.models import Restaurant as ORestaurant, Order as DBOrder, OrderItem as DBOrderItem, RestaurantAdmin as DBRestaurantAdmin
 import os
 import uuid
 from datetime import datetime, timezone, timedelta
@@ -42,6 +47,15 @@ def require_restaurant_id(user_id: int = Depends(require_user_id)) -> int:
     return rid
 
 
+def _transition_or_raise(db: Session, order_id: int, action: str, rid: int, commit: bool = True, **values):
+    try:
+        return transition(db, order_id, action, restaurant_id=rid, commit=commit, **values)
+    except TransitionError as exc:
+        if exc.reason == "not_found":
+            raise HTTPException(status_code=404, detail="not_found")
+        raise HTTPException(status_code=409, detail=f"invalid_status_transition:{exc.current}")
+
+
 @router.get("/ra/me")
 async def ra_me(rid: int = Depends(require_restaurant_id), db: Session = Depends(get_db)) -> dict:
     """Проверка прав администратора ресторана"""
@@ -119,14 +133,20 @@ async def ra_get_order(order_id: int, rid: int = Depends(require_restaurant_id),
 
 
 @router.post("/ra/orders/{order_id}/accept")
-async def ra_accept(order_id: int, eta_minutes: int = 60, rid: int = Depends(require_restaurant_id), db: Session = Depends(get_db)) -> dict:
-    o = db.query(DBOrder).filter(DBOrder.id == order_id, DBOrder.restaurant_id == rid).first()
-    if not o:
-        raise HTTPException(status_code=404, detail="not_found")
-    o.status = "accepted"
-    o.accepted_at = moscow_now()
-    o.eta_minutes = eta_minutes
-    db.commit()
+async def ra_accept(
+    order_id: int, eta_minutes: int = 60,
+    idempotency_key: str | None = Header(default=None, alias="Idempotency-Key"),
+    rid: int = Depends(require_restaurant_id),
+    db: Session = Depends(get_db),
+) -> dict:
+    return await run_idempotent(
+        db, idempotency_key, f"ra:{rid}:accept:{order_id}", {"eta_minutes": eta_minutes},
+        lambda: _ra_accept(order_id, eta_minutes, rid, db),
+    )
+
+
+async def _ra_accept(order_id: int, eta_minutes: int, rid: int, db: Session) -> dict:
+    o = _transition_or_raise(db, order_id, "accept", rid, accepted_at=moscow_now(), eta_minutes=eta_minutes)
     try:
         await send_admin_message(f"[ra] Заказ №{o.id} принят рестораном {rid} (~{eta_minutes} мин)")
         if WEBAPP_URL:
@@ -141,13 +161,20 @@ async def ra_accept(order_id: int, eta_minutes: int = 60, rid: int = Depends(req
 
 
 @router.post("/ra/orders/{order_id}/cancel")
-async def ra_cancel(order_id: int, reason: str = "", rid: int = Depends(require_restaurant_id), db: Session = Depends(get_db)) -> dict:
-    o = db.query(DBOrder).filter(DBOrder.id == order_id, DBOrder.restaurant_id == rid).first()
-    if not o:
-        raise HTTPException(status_code=404, detail="not_found")
-    o.status = "cancelled"
-    o.staff_comment = reason
-    db.commit()
+async def ra_cancel(
+    order_id: int, reason: str = "",
+    idempotency_key: str | None = Header(default=None, alias="Idempotency-Key"),
+    rid: int = Depends(require_restaurant_id),
+    db: Session = Depends(get_db),
+) -> dict:
+    return await run_idempotent(
+        db, idempotency_key, f"ra:{rid}:cancel:{order_id}", {"reason": reason},
+        lambda: _ra_cancel(order_id, reason, rid, db),
+    )
+
+
+async def _ra_cancel(order_id: int, reason: str, rid: int, db: Session) -> dict:
+    o = _transition_or_raise(db, order_id, "cancel", rid, staff_comment=reason)
     try:
         await send_admin_message(f"[ra] Заказ №{o.id} отменён рестораном {rid}. Причина: {reason}")
         
@@ -161,12 +188,20 @@ async def ra_cancel(order_id: int, reason: str = "", rid: int = Depends(require_
 
 
 @router.post("/ra/orders/{order_id}/delivered")
-async def ra_delivered(order_id: int, rid: int = Depends(require_restaurant_id), db: Session = Depends(get_db)) -> dict:
-    o = db.query(DBOrder).filter(DBOrder.id == order_id, DBOrder.restaurant_id == rid).first()
-    if not o:
-        raise HTTPException(status_code=404, detail="not_found")
-    o.status = "delivered"
-    db.commit()
+async def ra_delivered(
+    order_id: int,
+    idempotency_key: str | None = Header(default=None, alias="Idempotency-Key"),
+    rid: int = Depends(require_restaurant_id),
+    db: Session = Depends(get_db),
+) -> dict:
+    return await run_idempotent(
+        db, idempotency_key, f"ra:{rid}:delivered:{order_id}", {},
+        lambda: _ra_delivered(order_id, rid, db),
+    )
+
+
+async def _ra_delivered(order_id: int, rid: int, db: Session) -> dict:
+    o = _transition_or_raise(db, order_id, "deliver", rid)
     try:
         await send_admin_message(f"[ra] Заказ №{o.id} доставлен рестораном {rid}")
         
@@ -180,13 +215,20 @@ async def ra_delivered(order_id: int, rid: int = Depends(require_restaurant_id),
 
 
 @router.post("/ra/orders/{order_id}/modify")
-async def ra_modify(order_id: int, comment: str, rid: int = Depends(require_restaurant_id), db: Session = Depends(get_db)) -> dict:
-    o = db.query(DBOrder).filter(DBOrder.id == order_id, DBOrder.restaurant_id == rid).first()
-    if not o:
-        raise HTTPException(status_code=404, detail="not_found")
-    o.status = "modified"
-    o.staff_comment = comment
-    db.commit()
+async def ra_modify(
+    order_id: int, comment: str,
+    idempotency_key: str | None = Header(default=None, alias="Idempotency-Key"),
+    rid: int = Depends(require_restaurant_id),
+    db: Session = Depends(get_db),
+) -> dict:
+    return await run_idempotent(
+        db, idempotency_key, f"ra:{rid}:modify:{order_id}", {"comment": comment},
+        lambda: _ra_modify(order_id, comment, rid, db),
+    )
+
+
+async def _ra_modify(order_id: int, comment: str, rid: int, db: Session) -> dict:
+    o = _transition_or_raise(db, order_id, "modify", rid, staff_comment=comment)
     try:
         await send_admin_message(f"[ra] Заказ №{o.id} изменён рестораном {rid}. Комментарий: {comment}")
         if WEBAPP_URL:
@@ -210,55 +252,11 @@ class ModifyItemPayload(BaseModel):
     qty: int
 
 
-def _recalc_total_with_options(items, db: Session) -> int:
-    # собрать все option_ids из заказа и вытянуть одним запросом
-    option_ids: set[int] = set()
-    for it in items:
-        chosen = getattr(it, 'chosen_options', None)
-        if chosen:
-            if isinstance(chosen, str):
-                try:
-                    import json
-                    chosen_list = json.loads(chosen or '[]')
-                    if isinstance(chosen_list, list):
-                        for x in chosen_list:
-                            try:
-                                option_ids.add(int(x))
-                            except (ValueError, TypeError):
-                                continue
-                except Exception:
-                    continue
-            else:
-                try:
-                    for x in chosen:
-                        option_ids.add(int(x))
-                except (ValueError, TypeError):
-                    continue
-    
-    by_opt: dict[int, int] = {}
-    if option_ids:
-        rows = db.query(OOption).filter(OOption.id.in_(list(option_ids))).all()
-        by_opt = {o.id: (o.price_delta or 0) for o in rows}
-    
+def _recalc_total_with_options(items, table: PriceTable | None) -> int:
+    # базовая цена — снимок из заказа, надбавки опций — из кэшированного прайса ресторана
     subtotal = 0
     for it in items:
-        delta = 0
-        chosen = getattr(it, 'chosen_options', None)
-        if isinstance(chosen, str):
-            try:
-                import json
-                chosen_list = json.loads(chosen or '[]')
-            except Exception:
-                chosen_list = []
-        else:
-            chosen_list = chosen or []
-        
-        if chosen_list:
-            for oid in chosen_list:
-                try:
-                    delta += by_opt.get(int(oid), 0)
-                except (ValueError, TypeError):
-                    continue
+        delta = table.options_delta(it.dish_id, parse_option_ids(it.chosen_options)) if table else 0
         subtotal += (it.price + delta) * it.qty
     return int(subtotal)
 
@@ -269,34 +267,49 @@ class ModifyItemsRequest(BaseModel):
 
 
 @router.post("/ra/orders/{order_id}/modify-items")
-async def ra_modify_items(order_id: int, payload: ModifyItemsRequest, rid: int = Depends(require_restaurant_id), db: Session = Depends(get_db)) -> dict:
-    o = db.query(DBOrder).filter(DBOrder.id == order_id, DBOrder.restaurant_id == rid).first()
-    if not o:
-        raise HTTPException(status_code=404, detail="not_found")
-    # load items in stable order
-    items = db.query(DBOrderItem).filter(DBOrderItem.order_id == o.id).order_by(DBOrderItem.id.asc()).all()
-    # apply quantities by index
-    for patch in payload.items:
-        idx = int(patch.index)
-        qty = int(patch.qty)
-        if 0 <= idx < len(items):
-            items[idx].qty = max(0, qty)
-    # delete zero-qty
-    for it in list(items):
-        if it.qty <= 0:
-            db.delete(it)
-    db.commit()
-    # reload items for totals
-    items2 = db.query(DBOrderItem).filter(DBOrderItem.order_id == o.id).all()
-    subtotal = _recalc_total_with_options(items2, db)
-    delivery_fee = 0
-    r = db.query(ORestaurant).filter(ORestaurant.id == o.restaurant_id).first()
-    if o.delivery_type == 'delivery' and r:
-        delivery_fee = r.delivery_fee
-    o.total_price = subtotal + delivery_fee
-    o.status = 'modified'
-    o.staff_comment = payload.comment
-    db.commit()
+async def ra_modify_items(
+    order_id: int, payload: ModifyItemsRequest,
+    idempotency_key: str | None = Header(default=None, alias="Idempotency-Key"),
+    rid: int = Depends(require_restaurant_id),
+    db: Session = Depends(get_db),
+) -> dict:
+    return await run_idempotent(
+        db, idempotency_key, f"ra:{rid}:modify-items:{order_id}", payload.model_dump(),
+        lambda: _ra_modify_items(order_id, payload, rid, db),
+    )
+
+
+async def _ra_modify_items(order_id: int, payload: ModifyItemsRequest, rid: int, db: Session) -> dict:
+    # прайс — до транзакции, чтобы не держать блокировку заказа на его построение
+    table = get_price_table(rid, db)
+    # статус, состав и сумма — одной транзакцией: переход блокирует строку заказа, и параллельные
+    # deliver/cancel ждут commit, а не вклиниваются между сменой статуса и правкой позиций
+    begin_transaction(db)
+    o = _transition_or_raise(db, order_id, "modify", rid, commit=False, staff_comment=payload.comment)
+    try:
+        # load items in stable order
+        items = db.query(DBOrderItem).filter(DBOrderItem.order_id == o.id).order_by(DBOrderItem.id.asc()).all()
+        # apply quantities by index
+        for patch in payload.items:
+            idx = int(patch.index)
+            qty = int(patch.qty)
+            if 0 <= idx < len(items):
+                items[idx].qty = max(0, qty)
+        # delete zero-qty
+        for it in list(items):
+            if it.qty <= 0:
+                db.delete(it)
+        items2 = [it for it in items if it.qty > 0]
+        subtotal = _recalc_total_with_options(items2, table)
+        delivery_fee = 0
+        if o.delivery_type == 'delivery' and table:
+            delivery_fee = table.delivery_fee
+        total_price = subtotal + delivery_fee
+        db.query(DBOrder).filter(DBOrder.id == o.id).update({"total_price": total_price}, synchronize_session=False)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
     try:
         await send_admin_message(f"[ra] Заказ №{o.id} изменён по составу рестораном {rid}. Комментарий: {payload.comment}")
         if WEBAPP_URL:
@@ -312,7 +325,7 @@ async def ra_modify_items(order_id: int, payload: ModifyItemsRequest, rid: int =
             await notify_user_order_modified(o.user_id, f"{WEBAPP_URL}/static/cart.html?order_id={o.id}", text=text)
     except Exception:
         pass
-    return {"status": "ok", "total": o.total_price}
+    return {"status": "ok", "total": total_price}
 
 
 # --- Дополнительные RA-эндпоинты: профиль ресторана и переключение статуса ---
@@ -334,6 +347,8 @@ async def ra_restaurant(rid: int = Depends(require_restaurant_id), db: Session =
         "delivery_time_minutes": r.delivery_time_minutes,
         "address": r.address,
         "phone": r.phone,
+        "email": r.email,
+        "email_digest_minutes": r.email_digest_minutes,
         "description": r.description,
         "image": r.image,
         "work_open_min": r.work_open_min,
@@ -360,6 +375,7 @@ class RestaurantPatch(BaseModel):
     address: Optional[str] = None
     phone: Optional[str] = None
     email: Optional[str] = None
+    email_digest_minutes: Optional[int] = None
     work_open_min: Optional[int] = None
     work_close_min: Optional[int] = None
     delivery_min_sum: Optional[int] = None
@@ -380,10 +396,13 @@ async def ra_update_restaurant(payload: RestaurantPatch, rid: int = Depends(requ
                 patch[num_key] = int(patch[num_key])
             except ValueError:
                 patch.pop(num_key, None)
+    if "email_digest_minutes" in patch and not 0 <= patch["email_digest_minutes"] <= EMAIL_DIGEST_MAX_MINUTES:
+        raise HTTPException(status_code=400, detail=f"Интервал сводки: от 0 до {EMAIL_DIGEST_MAX_MINUTES} минут")
     for k, v in patch.items():
         if hasattr(r, k):
             setattr(r, k, v)
     db.commit()
+    bump_menu_version(rid)
     try:
         await send_admin_message(f"[ra] Обновлены данные ресторана id={rid}")
     except Exception:
@@ -398,6 +417,8 @@ async def ra_update_restaurant(payload: RestaurantPatch, rid: int = Depends(requ
         "delivery_time_minutes": r.delivery_time_minutes,
         "address": r.address,
         "phone": r.phone,
+        "email": r.email,
+        "email_digest_minutes": r.email_digest_minutes,
         "description": r.description,
         "image": r.image,
         "work_open_min": r.work_open_min,
@@ -415,11 +436,8 @@ async def ra_upload_image(image: UploadFile = File(...), rid: int = Depends(requ
         raise HTTPException(status_code=400, detail="Файл должен быть изображением")
     
     try:
-        # Читаем содержимое файла
-        content = await image.read()
-        
-        # Обрабатываем изображение
-        result = ImageProcessor.process_image(content, image.filename)
+        # Обрабатываем изображение (файл читается с диска, не из памяти)
+        result = await process_upload_async(image)
         
         # Возвращаем результат с URL'ами для разных размеров
         return {
@@ -430,6 +448,8 @@ async def ra_upload_image(image: UploadFile = File(...), rid: int = Depends(requ
             "processed_sizes": result["processed_sizes"]
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ошибка при обработке изображения: {str(e)}")
 
@@ -443,17 +463,16 @@ async def ra_upload_restaurant_image(image: UploadFile = File(...), rid: int = D
         raise HTTPException(status_code=400, detail="Файл должен быть изображением")
     
     try:
-        # Читаем содержимое файла
-        content = await image.read()
-        
-        # Обрабатываем изображение
-        result = ImageProcessor.process_image(content, image.filename)
+        # Обрабатываем изображение (файл читается с диска, не из памяти)
+        result = await process_upload_async(image)
         
         # Обновляем изображение ресторана в БД
         restaurant = db.query(ORestaurant).filter(ORestaurant.id == rid).first()
         if restaurant:
+            old_image = restaurant.image
             restaurant.image = result["urls"]["restaurant_banner"]  # Используем баннер для ресторана
             db.commit()
+            release_images([old_image], db)
         
         # Возвращаем результат с URL'ами для разных размеров
         return {
@@ -464,5 +483,7 @@ async def ra_upload_restaurant_image(image: UploadFile = File(...), rid: int = D
             "processed_sizes": result["processed_sizes"]
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ошибка при обработке изображения: {str(e)}")
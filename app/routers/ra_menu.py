@@ -3,10 +3,13 @@ from pydantic import BaseModel
 from typing import List, Optional
 from app.routers.ra import require_restaurant_id
 from app.routers.menu import Category, Dish
-from app.routers.menu import DishOptionGroup, DishOption
+from app.routers.menu import DishOptionGroup, DishOption, menu_payload
 from sqlalchemy.orm import Session
 from app.db import get_db
+from app.responses import FastJSONResponse
 from app.models import Category as OCategory, Dish as ODish, OptionGroup as OGroup, Option as OOption
+from app.services.pricing import bump_menu_version
+from app.services.image_refs import release_images
 
 
 router = APIRouter()
@@ -77,30 +80,9 @@ class OptionUpdate(BaseModel):
     price_delta: Optional[int] = None
 
 
-@router.get("/ra/menu")
+@router.get("/ra/menu", response_class=FastJSONResponse)
 async def ra_menu(rid: int = Depends(require_restaurant_id), db: Session = Depends(get_db)) -> dict:
-    cats = db.query(OCategory).filter(OCategory.restaurant_id == rid).order_by(OCategory.sort.asc()).all()
-    dishes = db.query(ODish).filter(ODish.restaurant_id == rid).all()
-    return {
-        "categories": [
-            {"id": c.id, "restaurant_id": c.restaurant_id, "name": c.name, "sort": c.sort}
-            for c in cats
-        ],
-        "dishes": [
-            {
-                "id": d.id,
-                "restaurant_id": d.restaurant_id,
-                "category_id": d.category_id,
-                "name": d.name,
-                "description": d.description,
-                "price": d.price,
-                "image": d.image,
-                "is_available": d.is_available,
-                "has_options": d.has_options,
-            }
-            for d in dishes
-        ],
-    }
+    return FastJSONResponse(menu_payload(db, rid))
 
 
 @router.post("/ra/categories")
@@ -132,10 +114,13 @@ async def ra_delete_category(category_id: int, rid: int = Depends(require_restau
     c = db.query(OCategory).filter(OCategory.id == category_id, OCategory.restaurant_id == rid).first()
     if not c:
         raise HTTPException(status_code=404, detail="not_found")
+    old_images = [image for (image,) in db.query(ODish.image).filter(ODish.category_id == category_id)]
     # delete dishes in category
     db.query(ODish).filter(ODish.category_id == category_id).delete()
     db.delete(c)
     db.commit()
+    bump_menu_version(rid)
+    release_images(old_images, db)
     return {"status": "ok"}
 
 
@@ -159,6 +144,7 @@ async def ra_create_dish(payload: DishCreate, rid: int = Depends(require_restaur
     )
     db.add(dish)
     db.commit()
+    bump_menu_version(rid)
     return {"id": new_id}
 
 
@@ -175,10 +161,14 @@ async def ra_update_dish(dish_id: int, payload: DishUpdate, rid: int = Depends(r
             raise HTTPException(status_code=400, detail="bad_category")
         d.category_id = v
         data.pop("category_id", None)
+    old_image = d.image
     for k, v in data.items():
         if hasattr(d, k):
             setattr(d, k, v)
     db.commit()
+    bump_menu_version(rid)
+    if d.image != old_image:
+        release_images([old_image], db)
     return {"status": "ok"}
 
 
@@ -193,8 +183,11 @@ async def ra_delete_dish(dish_id: int, rid: int = Depends(require_restaurant_id)
     if g_ids:
         db.query(OOption).filter(OOption.group_id.in_(g_ids)).delete(synchronize_session=False)
         db.query(OGroup).filter(OGroup.id.in_(g_ids)).delete(synchronize_session=False)
+    old_image = d.image
     db.delete(d)
     db.commit()
+    bump_menu_version(rid)
+    release_images([old_image], db)
     return {"status": "ok"}
 
 
@@ -246,6 +239,7 @@ async def ra_update_group(group_id: int, payload: GroupUpdate, rid: int = Depend
         if hasattr(g, k):
             setattr(g, k, v)
     db.commit()
+    bump_menu_version(rid)
     return {"status": "ok"}
 
 
@@ -260,6 +254,7 @@ async def ra_delete_group(group_id: int, rid: int = Depends(require_restaurant_i
     db.query(OOption).filter(OOption.group_id == group_id).delete(synchronize_session=False)
     db.delete(g)
     db.commit()
+    bump_menu_version(rid)
     
     # Обновляем флаг has_options для блюда
     update_dish_has_options(g.dish_id, db)
@@ -280,6 +275,7 @@ async def ra_create_option(payload: OptionCreate, rid: int = Depends(require_res
     o = OOption(id=new_id, group_id=payload.group_id, name=payload.name, price_delta=payload.price_delta)
     db.add(o)
     db.commit()
+    bump_menu_version(rid)
     return {"id": new_id}
 
 
@@ -297,6 +293,7 @@ async def ra_update_option(option_id: int, payload: OptionUpdate, rid: int = Dep
         if hasattr(o, k):
             setattr(o, k, v)
     db.commit()
+    bump_menu_version(rid)
     return {"status": "ok"}
 
 
@@ -311,5 +308,6 @@ async def ra_delete_option(option_id: int, rid: int = Depends(require_restaurant
         raise HTTPException(status_code=403, detail="forbidden")
     db.delete(o)
     db.commit()
+    bump_menu_version(rid)
     return {"status": "ok"}
 
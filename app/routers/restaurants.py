@@ -1,8 +1,10 @@
 from fastapi import APIRouter, Query, Depends, HTTPException
 from pydantic import BaseModel
 from typing import List, Optional
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from app.db import get_db
+from app.db import get_db, fetch_dicts
+from app.responses import FastJSONResponse
 from app.models import Restaurant as ORestaurant
 
 
@@ -29,42 +31,45 @@ class Restaurant(BaseModel):
 _RESTAURANTS: List[Restaurant] = []  # legacy in-memory, оставлено для совместимости импорта
 
 
-def _compute_is_open(r: Restaurant) -> bool:
+def _is_open_at(work_open_min: int, work_close_min: int, minutes: int) -> bool:
+    if work_open_min <= work_close_min:
+        return work_open_min <= minutes < work_close_min
+    # overnight schedule
+    return minutes >= work_open_min or minutes < work_close_min
+
+
+def _now_minutes() -> int:
     from datetime import datetime
     now = datetime.now().time()
-    minutes = now.hour * 60 + now.minute
-    if r.work_open_min <= r.work_close_min:
-        return r.work_open_min <= minutes < r.work_close_min
-    # overnight schedule
-    return minutes >= r.work_open_min or minutes < r.work_close_min
+    return now.hour * 60 + now.minute
+
+
+def _compute_is_open(r: Restaurant) -> bool:
+    return _is_open_at(r.work_open_min, r.work_close_min, _now_minutes())
+
+
+# Колонки для списка ресторанов (поля модели Restaurant, кроме вычисляемого is_open_now)
+_LIST_COLUMNS = (
+    ORestaurant.id, ORestaurant.name, ORestaurant.is_enabled, ORestaurant.rating_agg,
+    ORestaurant.delivery_min_sum, ORestaurant.delivery_fee, ORestaurant.delivery_time_minutes,
+    ORestaurant.address, ORestaurant.phone, ORestaurant.description, ORestaurant.image,
+    ORestaurant.work_open_min, ORestaurant.work_close_min,
+)
 
 
-@router.get("")
+@router.get("", response_class=FastJSONResponse)
 async def list_restaurants(is_enabled: Optional[bool] = True, db: Session = Depends(get_db)) -> List[Restaurant]:
-    q = db.query(ORestaurant)
+    stmt = select(*_LIST_COLUMNS)
     if is_enabled is not None:
-        q = q.filter(ORestaurant.is_enabled == bool(is_enabled))
-    rows = q.all()
-    items: List[Restaurant] = []
-    for r in rows:
-        item = Restaurant(
-            id=r.id,
-            name=r.name,
-            is_enabled=r.is_enabled,
-            rating_agg=r.rating_agg,
-            delivery_min_sum=r.delivery_min_sum,
-            delivery_fee=r.delivery_fee,
-            delivery_time_minutes=r.delivery_time_minutes,
-            address=r.address,
-            phone=r.phone,
-            description=r.description,
-            image=r.image,
-            work_open_min=r.work_open_min,
-            work_close_min=r.work_close_min,
-            is_open_now=_compute_is_open(r),
-        )
-        items.append(item)
-    return items
+        stmt = stmt.where(ORestaurant.is_enabled == bool(is_enabled))
+    items = fetch_dicts(db, stmt)
+    minutes = _now_minutes()
+    for item in items:
+        item["rating_agg"] = float(item["rating_agg"] or 0)
+        item["description"] = item["description"] or ""
+        item["image"] = item["image"] or ""
+        item["is_open_now"] = _is_open_at(item["work_open_min"], item["work_close_min"], minutes)
+    return FastJSONResponse(items)
 
 
 @router.get("/_bulk")
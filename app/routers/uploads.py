@@ -0,0 +1,104 @@
+import asyncio
+import os
+import re
+
+from fastapi import APIRouter, HTTPException, Request
+from starlette.responses import FileResponse
+
+from app.logging_config import get_logger
+from app.services.image_pool import run_in_image_pool
+from app.services.image_processor import ImageProcessor
+
+
+UPLOADS_DIR = "uploads"
+# Имена файлов — хэш содержимого, поэтому содержимое по URL никогда не меняется
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+_SAFE_NAME = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]*$")
+
+logger = get_logger("uploads")
+router = APIRouter()
+
+# Генерация одного и того же варианта параллельными запросами выполняется один раз
+_inflight: dict[tuple[str, str, str | None], asyncio.Future] = {}
+
+
+async def _ensure_variant(size: str, name: str, image_format: str | None = None) -> str | None:
+    key = (size, name, image_format)
+    fut = _inflight.get(key)
+    if fut is None:
+        fut = asyncio.ensure_future(
+            run_in_image_pool(ImageProcessor.render_variant, size, name, UPLOADS_DIR, image_format)
+        )
+        _inflight[key] = fut
+        fut.add_done_callback(lambda _: _inflight.pop(key, None))
+    return await asyncio.shield(fut)
+
+
+def _accepted_types(accept: str) -> set[str]:
+    """MIME-типы из заголовка Accept с ненулевым q (маски вида image/* не учитываются)"""
+    result = set()
+    for part in accept.split(","):
+        media_type, _, params = part.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            result.add(media_type.strip().lower())
+    return result
+
+
+async def _negotiated_variant(size: str, name: str, accept: str) -> tuple[str, str] | None:
+    """Лучший из MODERN_FORMATS, который принимает клиент: (путь, MIME) или None"""
+    accepted = _accepted_types(accept)
+    for pil_format, extension, media_type, _ in ImageProcessor.MODERN_FORMATS:
+        if media_type not in accepted:
+            continue
+        path = os.path.join(UPLOADS_DIR, size, name + extension)
+        if not os.path.isfile(path):
+            try:
+                path = await _ensure_variant(size, name, pil_format)
+            except HTTPException:
+                raise
+            except Exception as exc:
+                # не получилось перекодировать — пробуем следующий формат, в крайнем случае отдадим исходный
+                logger.warning("variant %s/%s as %s failed: %s", size, name, pil_format, repr(exc))
+                continue
+        if path:
+            return path, media_type
+    return None
+
+
+@router.api_route("/uploads/{size}/{name}", methods=["GET", "HEAD"])
+async def get_upload(size: str, name: str, request: Request) -> FileResponse:
+    """
+    Файлы из uploads; варианты из ImageProcessor.SIZES создаются из оригинала при первом запросе
+    и отдаются в AVIF/WebP, если клиент их принимает (Vary: Accept)
+    """
+    if not _SAFE_NAME.match(size) or not _SAFE_NAME.match(name):
+        raise HTTPException(status_code=404, detail="Not Found")
+    headers = {"Cache-Control": IMMUTABLE_CACHE}
+    if size in ImageProcessor.SIZES:
+        headers["Vary"] = "Accept"
+        negotiated = await _negotiated_variant(size, name, request.headers.get("accept", ""))
+        if negotiated:
+            path, media_type = negotiated
+            return FileResponse(path, media_type=media_type, headers=headers)
+    path = os.path.join(UPLOADS_DIR, size, name)
+    if not os.path.isfile(path):
+        if size not in ImageProcessor.SIZES:
+            raise HTTPException(status_code=404, detail="Not Found")
+        try:
+            path = await _ensure_variant(size, name)
+        except HTTPException:
+            raise
+        except Exception as exc:
+            logger.exception("variant %s/%s failed: %s", size, name, repr(exc))
+            raise HTTPException(status_code=500, detail="Ошибка при обработке изображения")
+        if not path:
+            raise HTTPException(status_code=404, detail="Not Found")
+    return FileResponse(path, headers=headers)
@@ -1,9 +1,10 @@
-from fastapi import APIRouter, Depends, Body
-from app.deps.auth import require_user_id
+from fastapi import APIRouter, Depends, Body, HTTPException
+from app.deps.auth import require_user_id, SUPER_ADMINS
 from app.store import ensure_user
 from app.models import User as DBUser
 from sqlalchemy.orm import Session
 from app.db import get_db
+from app.services.roles import get_user_roles
 from pydantic import BaseModel
 from typing import Optional
 
@@ -23,6 +24,14 @@ async def activate_user(request: ActivateUserRequest = None, user_id: int = Depe
     u = ensure_user(user_id, request.username)
     return {"status": "ok", "user": {"id": u.id, "is_blocked": u.is_blocked}}
 
+@router.get("/users/{user_id}/roles")
+async def user_roles(user_id: int, actor_id: int = Depends(require_user_id), db: Session = Depends(get_db)) -> dict:
+    """Роли пользователя (только чтение, без записи last_activity) — для проверок доступа в боте"""
+    if actor_id != user_id and actor_id not in SUPER_ADMINS:
+        raise HTTPException(status_code=403, detail="forbidden")
+    return get_user_roles(db, user_id)
+
+
 class ProfileUpdate(BaseModel):
     phone: Optional[str] = None
     name: Optional[str] = None
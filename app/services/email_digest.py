@@ -0,0 +1,152 @@
+"""
+Сводные письма ресторанам о заказах (Restaurant.email_digest_minutes = N > 0).
+
+Такой ресторан получает не письмо на каждый заказ, а одно письмо за окно: заказ записывается
+в email_digest_items, окно открывается первым заказом и закрывается через N минут — тогда
+планировщик отправляет сводку через общую очередь писем (пул SMTP-соединений) и удаляет
+отправленные строки.
+
+- очередь в БД: накопленное не теряется при перезапуске, сводки может рассылать любой процесс API;
+  строки забираются удалением в транзакции, поэтому одну сводку дважды не отправят;
+- если очередь писем переполнена, заказы возвращаются и уйдут на следующем проходе;
+- ресторан переключили на письма по каждому заказу — накопленное уходит на ближайшем проходе.
+"""
+
+import asyncio
+import json
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session
+
+from app.db import begin_transaction, get_session
+from app.email_service import email_service
+from app.logging_config import get_logger
+from app.models import EmailDigestItem, Restaurant
+
+
+EMAIL_DIGEST_TICK_SECONDS = float(os.getenv("EMAIL_DIGEST_TICK_SECONDS", "30"))
+EMAIL_DIGEST_MAX_MINUTES = 24 * 60
+
+logger = get_logger("email_digest")
+
+
+def queue_digest_order(db: Session, restaurant_id: int, order_data: dict) -> None:
+    """Откладывает заказ до сводки ресторана"""
+    db.add(EmailDigestItem(
+        restaurant_id=restaurant_id,
+        order_id=order_data["id"],
+        order_data=json.dumps(order_data, ensure_ascii=False),
+    ))
+    db.commit()
+
+
+def _due_restaurants(db: Session, now: datetime) -> list[int]:
+    """Рестораны, у которых закрылось окно сводки (окно открывает самый старый заказ в очереди)"""
+    rows = db.execute(
+        select(EmailDigestItem.restaurant_id, func.min(EmailDigestItem.created_at), Restaurant.email_digest_minutes)
+        .join(Restaurant, Restaurant.id == EmailDigestItem.restaurant_id)
+        .group_by(EmailDigestItem.restaurant_id, Restaurant.email_digest_minutes)
+    ).all()
+    return [
+        rid for rid, oldest, minutes in rows
+        if not minutes or oldest <= now - timedelta(minutes=minutes)
+    ]
+
+
+def _claim(db: Session, restaurant_id: int) -> tuple[Restaurant | None, list[EmailDigestItem]]:
+    """Забирает заказы ресторана из очереди; пусто — их уже забрал другой процесс"""
+    begin_transaction(db)
+    try:
+        items = db.execute(
+            select(EmailDigestItem)
+            .where(EmailDigestItem.restaurant_id == restaurant_id)
+            .order_by(EmailDigestItem.id)
+        ).scalars().all()
+        deleted = db.execute(
+            delete(EmailDigestItem).where(EmailDigestItem.id.in_([it.id for it in items]))
+        ).rowcount if items else 0
+        if deleted != len(items):
+            db.rollback()
+            return None, []
+        restaurant = db.get(Restaurant, restaurant_id)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return restaurant, items
+
+
+def _claim_due() -> list[tuple[Restaurant | None, list[EmailDigestItem]]]:
+    with get_session() as db:
+        return [
+            claimed
+            for rid in _due_restaurants(db, datetime.utcnow())
+            if (claimed := _claim(db, rid))[1]
+        ]
+
+
+def _requeue(items: list[EmailDigestItem]) -> None:
+    with get_session() as db:
+        db.add_all(
+            EmailDigestItem(restaurant_id=it.restaurant_id, order_id=it.order_id,
+                            order_data=it.order_data, created_at=it.created_at)
+            for it in items
+        )
+        db.commit()
+
+
+async def send_due_digests() -> int:
+    """Отправляет сводки с закрывшимся окном; возвращает число писем, поставленных в очередь"""
+    sent = 0
+    for restaurant, items in await asyncio.to_thread(_claim_due):
+        order_ids = [it.order_id for it in items]
+        if restaurant is None or not restaurant.email or not email_service.configured:
+            logger.warning("digest dropped (no email or SMTP settings): restaurant=%s orders=%s",
+                           items[0].restaurant_id, order_ids)
+            continue
+        try:
+            msg = email_service.build_digest(
+                restaurant.email, restaurant.name, [json.loads(it.order_data) for it in items]
+            )
+        except Exception as exc:
+            logger.error("digest for restaurant %s not built: %s", restaurant.id, repr(exc))
+            continue
+        if not email_service.dispatcher.enqueue(msg):
+            await asyncio.to_thread(_requeue, items)
+            continue
+        sent += 1
+        logger.info("digest queued: restaurant=%s orders=%s", restaurant.id, order_ids)
+    return sent
+
+
+class DigestScheduler:
+    """Фоновая задача процесса API: раз в EMAIL_DIGEST_TICK_SECONDS отправляет готовые сводки"""
+
+    def __init__(self, tick_seconds: float = EMAIL_DIGEST_TICK_SECONDS) -> None:
+        self.tick_seconds = tick_seconds
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self._task is None and self.tick_seconds > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.tick_seconds)
+            try:
+                await send_due_digests()
+            except Exception as exc:
+                logger.error("digest pass failed: %s", repr(exc))
+
+    async def stop(self) -> None:
+        """Останавливает планировщик; неотправленные сводки остаются в БД до следующего запуска"""
+        task, self._task = self._task, None
+        if task is None:
+            return
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+
+digest_scheduler = DigestScheduler()
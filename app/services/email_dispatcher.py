@@ -0,0 +1,200 @@
+"""
+Очередь отправки писем с пулом постоянных SMTP-соединений.
+
+- письма ставятся в ограниченную очередь (EMAIL_QUEUE_SIZE); при переполнении новое письмо
+  отбрасывается с предупреждением в логе — запрос пользователя не ждёт SMTP;
+- EMAIL_SMTP_CONNECTIONS обработчиков, у каждого своё соединение: подключение, STARTTLS и LOGIN
+  выполняются один раз, дальше письма идут по тому же соединению; простаивающее дольше
+  EMAIL_SMTP_IDLE_SECONDS соединение закрывается;
+- разрыв соединения — переподключение; временная ошибка — повтор с экспоненциальной задержкой
+  (EMAIL_MAX_ATTEMPTS попыток); постоянная (5xx, отказ получателя) — без повторов;
+- drain() при остановке дожидается отправки очереди (с таймаутом) и закрывает соединения.
+
+smtplib блокирующий, поэтому сами SMTP-команды выполняются в потоках; одно соединение
+в каждый момент использует только один обработчик.
+"""
+
+import asyncio
+import os
+import random
+import smtplib
+import time
+from email.message import Message
+
+from app.logging_config import get_logger
+
+
+EMAIL_QUEUE_SIZE = int(os.getenv("EMAIL_QUEUE_SIZE", "1000"))
+EMAIL_SMTP_CONNECTIONS = int(os.getenv("EMAIL_SMTP_CONNECTIONS", "2"))
+EMAIL_SMTP_IDLE_SECONDS = float(os.getenv("EMAIL_SMTP_IDLE_SECONDS", "60"))
+EMAIL_SMTP_TIMEOUT = float(os.getenv("EMAIL_SMTP_TIMEOUT", "20"))
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "4"))
+EMAIL_RETRY_BASE_SECONDS = float(os.getenv("EMAIL_RETRY_BASE_SECONDS", "1"))
+EMAIL_DRAIN_TIMEOUT = float(os.getenv("EMAIL_DRAIN_TIMEOUT", "30"))
+
+logger = get_logger("email_dispatcher")
+
+
+class PermanentEmailError(Exception):
+    """Повтор не поможет (письмо отклонено сервером)"""
+
+
+class SMTPConnection:
+    """Одно постоянное SMTP-соединение; методы блокирующие"""
+
+    def __init__(self, host: str, port: int, username: str, password: str, starttls: bool = True,
+                 timeout: float = EMAIL_SMTP_TIMEOUT) -> None:
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+        self._smtp: smtplib.SMTP | None = None
+        self.connects = 0
+
+    def _connect(self) -> smtplib.SMTP:
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.starttls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password)
+        except Exception:
+            smtp.close()
+            raise
+        self.connects += 1
+        return smtp
+
+    def send(self, msg: Message) -> None:
+        """Отправляет письмо; при разрыве уже открытого соединения переподключается один раз"""
+        reused = self._smtp is not None
+        if self._smtp is None:
+            self._smtp = self._connect()
+        try:
+            self._send(msg)
+        except (smtplib.SMTPServerDisconnected, ConnectionError) as exc:
+            self.close()
+            if not reused:
+                raise
+            logger.info("smtp connection lost (%s), reconnecting", repr(exc))
+            self._smtp = self._connect()
+            self._send(msg)
+
+    def _send(self, msg: Message) -> None:
+        try:
+            self._smtp.send_message(msg)
+        except smtplib.SMTPRecipientsRefused as exc:
+            raise PermanentEmailError(repr(exc)) from exc
+        except smtplib.SMTPResponseException as exc:
+            if 500 <= exc.smtp_code < 600:
+                # после отказа сервер ждёт новую транзакцию, соединение остаётся рабочим
+                self._reset()
+                raise PermanentEmailError(f"{exc.smtp_code} {exc.smtp_error!r}") from exc
+            self.close()
+            raise
+
+    def _reset(self) -> None:
+        try:
+            self._smtp.rset()
+        except Exception:
+            self.close()
+
+    def close(self) -> None:
+        smtp, self._smtp = self._smtp, None
+        if smtp is None:
+            return
+        try:
+            smtp.quit()
+        except Exception:
+            smtp.close()
+
+
+class EmailDispatcher:
+    def __init__(self, host: str, port: int, username: str, password: str, starttls: bool = True,
+                 connections: int = EMAIL_SMTP_CONNECTIONS, queue_size: int = EMAIL_QUEUE_SIZE,
+                 max_attempts: int = EMAIL_MAX_ATTEMPTS, retry_base: float = EMAIL_RETRY_BASE_SECONDS,
+                 idle_seconds: float = EMAIL_SMTP_IDLE_SECONDS) -> None:
+        self.connections = [SMTPConnection(host, port, username, password, starttls) for _ in range(max(1, connections))]
+        self.queue_size = queue_size
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.idle_seconds = idle_seconds
+        self.stats = {"queued": 0, "sent": 0, "failed": 0, "dropped": 0, "retries": 0}
+        self._queue: asyncio.Queue | None = None
+        self._workers: list[asyncio.Task] = []
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def _start(self) -> None:
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._workers = [asyncio.create_task(self._worker(conn)) for conn in self.connections]
+        logger.info("email dispatcher started: connections=%s queue=%s", len(self.connections), self.queue_size)
+
+    def enqueue(self, msg: Message) -> bool:
+        """Ставит письмо в очередь (из event loop); False — очередь переполнена, письмо отброшено"""
+        if self._queue is None:
+            self._start()
+        try:
+            self._queue.put_nowait((msg, time.monotonic()))
+        except asyncio.QueueFull:
+            self.stats["dropped"] += 1
+            logger.warning("email queue full (%s), dropped: %s", self.queue_size, msg.get("Subject"))
+            return False
+        self.stats["queued"] += 1
+        return True
+
+    async def _worker(self, conn: SMTPConnection) -> None:
+        while True:
+            try:
+                msg, queued_at = await asyncio.wait_for(self._queue.get(), timeout=self.idle_seconds)
+            except asyncio.TimeoutError:
+                await asyncio.to_thread(conn.close)
+                continue
+            try:
+                await self._deliver(conn, msg)
+                logger.info("email sent to %s in %.0f ms: %s", msg.get("To"),
+                            (time.monotonic() - queued_at) * 1000, msg.get("Subject"))
+            except Exception as exc:
+                self.stats["failed"] += 1
+                logger.error("email to %s failed: %s", msg.get("To"), repr(exc))
+            finally:
+                self._queue.task_done()
+
+    async def _deliver(self, conn: SMTPConnection, msg: Message) -> None:
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                await asyncio.to_thread(conn.send, msg)
+                self.stats["sent"] += 1
+                return
+            except PermanentEmailError:
+                raise
+            except Exception as exc:
+                await asyncio.to_thread(conn.close)
+                if attempt == self.max_attempts:
+                    raise
+                delay = self.retry_base * 2 ** (attempt - 1) * (0.5 + random.random())
+                self.stats["retries"] += 1
+                logger.warning("email attempt %s failed (%s), retry in %.1fs", attempt, repr(exc), delay)
+                await asyncio.sleep(delay)
+
+    async def drain(self, timeout: float = EMAIL_DRAIN_TIMEOUT) -> None:
+        """Дожидается отправки очереди (не дольше timeout), останавливает обработчики и закрывает соединения"""
+        if self._queue is None:
+            return
+        if self._queue.qsize():
+            logger.info("draining email queue: %s pending", self._queue.qsize())
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning("email drain timed out, %s emails not sent", self._queue.qsize())
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        for conn in self.connections:
+            await asyncio.to_thread(conn.close)
+        self._queue = None
+        self._workers = []
+        logger.info("email dispatcher stopped: %s", self.stats)
@@ -0,0 +1,122 @@
+import hashlib
+import json
+import time
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable
+
+from fastapi import HTTPException
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.logging_config import get_logger
+from app.models import IdempotencyKey as DBIdempotencyKey
+
+
+# Сколько храним ответы для повторов запросов с тем же ключом
+RETENTION = timedelta(hours=24)
+_MAX_KEY_LENGTH = 128
+_PURGE_INTERVAL_SECONDS = 600
+
+logger = get_logger("idempotency")
+_last_purge = 0.0
+
+
+def request_hash(data: Any) -> str:
+    raw = json.dumps(data, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _purge_expired(db: Session) -> None:
+    global _last_purge
+    now = time.monotonic()
+    if now - _last_purge < _PURGE_INTERVAL_SECONDS:
+        return
+    _last_purge = now
+    try:
+        db.query(DBIdempotencyKey).filter(DBIdempotencyKey.created_at < datetime.utcnow() - RETENTION).delete(synchronize_session=False)
+        db.commit()
+    except Exception as exc:
+        db.rollback()
+        logger.warning("purge of expired idempotency keys failed: %s", repr(exc))
+
+
+def _claim(db: Session, scope: str, key: str, req_hash: str) -> DBIdempotencyKey | None:
+    """Занимает ключ. Возвращает уже существующую запись, если ключ занят."""
+    row = db.query(DBIdempotencyKey).filter(DBIdempotencyKey.scope == scope, DBIdempotencyKey.key == key).first()
+    if row and row.created_at < datetime.utcnow() - RETENTION:
+        db.delete(row)
+        db.commit()
+        row = None
+    if row:
+        return row
+    db.add(DBIdempotencyKey(scope=scope, key=key, request_hash=req_hash, status="pending", created_at=datetime.utcnow()))
+    try:
+        db.commit()
+    except IntegrityError:
+        # параллельный запрос с тем же ключом успел занять его первым
+        db.rollback()
+        return db.query(DBIdempotencyKey).filter(DBIdempotencyKey.scope == scope, DBIdempotencyKey.key == key).first()
+    return None
+
+
+def _release(db: Session, scope: str, key: str) -> None:
+    try:
+        db.rollback()
+        db.query(DBIdempotencyKey).filter(
+            DBIdempotencyKey.scope == scope,
+            DBIdempotencyKey.key == key,
+            DBIdempotencyKey.status == "pending",
+        ).delete(synchronize_session=False)
+        db.commit()
+    except Exception as exc:
+        db.rollback()
+        logger.warning("failed to release idempotency key %s/%s: %s", scope, key, repr(exc))
+
+
+async def run_idempotent(
+    db: Session,
+    key: str | None,
+    scope: str,
+    request_data: Any,
+    handler: Callable[[], Awaitable[dict]],
+) -> dict:
+    """
+    Выполняет handler не более одного раза для пары (scope, Idempotency-Key).
+
+    Повтор с тем же ключом и телом получает сохранённый ответ без повторной записи в БД
+    и уведомлений; тот же ключ с другим телом — 422; запрос, пока первый ещё выполняется, — 409.
+    Без ключа handler просто вызывается. Ошибки не сохраняются: ключ освобождается для повтора.
+    """
+    if not key:
+        return await handler()
+    key = key.strip()
+    if not key or len(key) > _MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail="invalid_idempotency_key")
+
+    _purge_expired(db)
+    req_hash = request_hash(request_data)
+    existing = _claim(db, scope, key, req_hash)
+    if existing is not None:
+        if existing.request_hash != req_hash:
+            raise HTTPException(status_code=422, detail="idempotency_key_reused")
+        if existing.status != "done" or existing.response is None:
+            raise HTTPException(status_code=409, detail="request_in_progress")
+        logger.info("idempotent replay scope=%s key=%s", scope, key)
+        return json.loads(existing.response)
+
+    try:
+        result = await handler()
+    except BaseException:
+        _release(db, scope, key)
+        raise
+
+    try:
+        db.query(DBIdempotencyKey).filter(DBIdempotencyKey.scope == scope, DBIdempotencyKey.key == key).update(
+            {"status": "done", "response": json.dumps(result, ensure_ascii=False, default=str)},
+            synchronize_session=False,
+        )
+        db.commit()
+    except Exception as exc:
+        db.rollback()
+        logger.exception("failed to store idempotent response scope=%s key=%s: %s", scope, key, repr(exc))
+    return result
@@ -0,0 +1,96 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from fastapi import HTTPException, UploadFile
+
+from app.logging_config import get_logger
+from app.services.image_processor import ImageProcessor
+from app.services.upload_spool import spooled_upload
+
+
+# Обработка изображений (декодирование, ресайз, кодирование) — чистый CPU, поэтому выполняется
+# в отдельных процессах, а не в event loop и не в потоках (GIL)
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", str(max(1, min(4, (os.cpu_count() or 2) - 1)))))
+# Сколько загрузок может ждать своей очереди сверх работающих; дальше отвечаем 503
+IMAGE_QUEUE_LIMIT = int(os.getenv("IMAGE_QUEUE_LIMIT", "64"))
+# Максимальное время ожидания + обработки одной загрузки, секунд
+IMAGE_TIMEOUT_SECONDS = float(os.getenv("IMAGE_TIMEOUT_SECONDS", "60"))
+
+logger = get_logger("image_pool")
+
+_executor: ProcessPoolExecutor | None = None
+_slots: asyncio.Semaphore | None = None
+_waiting = 0
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # spawn: fork процесса с работающим event loop и потоками небезопасен
+        _executor = ProcessPoolExecutor(max_workers=IMAGE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        logger.info("image pool started: workers=%s queue=%s", IMAGE_WORKERS, IMAGE_QUEUE_LIMIT)
+    return _executor
+
+
+def _get_slots() -> asyncio.Semaphore:
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(IMAGE_WORKERS)
+    return _slots
+
+
+async def run_in_image_pool(func, *args):
+    """
+    Выполняет func(*args) в пуле процессов обработки изображений.
+
+    Одновременно в работе не больше IMAGE_WORKERS задач, в очереди — не больше IMAGE_QUEUE_LIMIT
+    (иначе 503), на всё вместе — IMAGE_TIMEOUT_SECONDS (иначе 504). Запущенную в процессе задачу
+    отменить нельзя, поэтому после таймаута она занимает слот, пока действительно не завершится.
+    """
+    global _waiting
+    if _waiting >= IMAGE_QUEUE_LIMIT + IMAGE_WORKERS:
+        raise HTTPException(status_code=503, detail="Сервер обрабатывает много изображений, повторите позже")
+    _waiting += 1
+    try:
+        return await _run(func, *args)
+    except asyncio.TimeoutError:
+        logger.warning("image task timed out after %ss: %s", IMAGE_TIMEOUT_SECONDS, getattr(func, "__name__", func))
+        raise HTTPException(status_code=504, detail="Обработка изображения заняла слишком много времени")
+    finally:
+        _waiting -= 1
+
+
+async def _run(func, *args):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + IMAGE_TIMEOUT_SECONDS
+    slots = _get_slots()
+    await asyncio.wait_for(slots.acquire(), timeout=IMAGE_TIMEOUT_SECONDS)
+    try:
+        fut = loop.run_in_executor(_get_executor(), func, *args)
+    except BaseException:
+        slots.release()
+        raise
+    # слот привязан к задаче в пуле, а не к ожидающему запросу: освобождается по её завершении
+    fut.add_done_callback(lambda _: slots.release())
+    return await asyncio.wait_for(asyncio.shield(fut), timeout=max(0.0, deadline - loop.time()))
+
+
+async def process_upload_async(upload: UploadFile, base_dir: str = "uploads") -> dict:
+    """
+    Обработка загруженного изображения в пуле процессов: файл копируется во временный
+    файл на диске, в процесс передаётся только путь (байты в память целиком не читаются)
+    """
+    async with spooled_upload(upload) as (path, size):
+        if size == 0:
+            raise HTTPException(status_code=400, detail="Файл пустой")
+        return await run_in_image_pool(ImageProcessor.process_image, path, upload.filename, base_dir)
+
+
+def shutdown_image_pool() -> None:
+    global _executor, _slots
+    if _executor is not None:
+        _executor.shutdown(wait=True, cancel_futures=True)
+        _executor = None
+    _slots = None
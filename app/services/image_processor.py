@@ -1,10 +1,19 @@
+import hashlib
+import math
 import os
 import uuid
-from PIL import Image
-from typing import Tuple, Optional
+from PIL import Image, features
+from typing import Tuple, Optional, Union
 import io
 
 
+def _pillow_supports(feature: str) -> bool:
+    try:
+        return bool(features.check(feature))
+    except Exception:
+        return False
+
+
 class ImageProcessor:
     """Сервис для обработки изображений с автоматическим созданием разных размеров"""
     
@@ -17,13 +26,29 @@ class ImageProcessor:
         'selection_card': (600, 400),     # Карточка в подборках (увеличено)
     }
     
+    # Оригинал ограничиваем по длинной стороне: с запасом покрывает самый крупный вариант,
+    # а JPEG с телефона (12 Мп) можно декодировать сразу в половинном масштабе
+    ORIGINAL_MAX_SIDE = 1600
+    
+    # Современные форматы вариантов в порядке предпочтения: (формат Pillow, расширение, MIME, параметры).
+    # Хранятся рядом с основным файлом как abc.jpg.webp / abc.jpg.avif и отдаются по заголовку Accept
+    MODERN_FORMATS = [
+        fmt for fmt in [
+            ('AVIF', '.avif', 'image/avif', {'quality': 60, 'speed': 6}),
+            ('WEBP', '.webp', 'image/webp', {'quality': 80, 'method': 4}),
+        ]
+        if _pillow_supports(fmt[0].lower())
+    ]
+    
     @staticmethod
-    def process_image(image_data: bytes, original_filename: str, base_dir: str = "uploads") -> dict:
+    def process_image(image_data: Union[bytes, str], original_filename: str, base_dir: str = "uploads") -> dict:
         """
-        Обрабатывает загруженное изображение и создает версии разных размеров
+        Обрабатывает загруженное изображение: сохраняет нормализованный оригинал.
+        Версии разных размеров создаются лениво, при первом запросе (см. render_variant).
+        Имя файла — хэш содержимого: повторная загрузка тех же байтов не обрабатывается заново
         
         Args:
-            image_data: Байты изображения
+            image_data: Байты изображения или путь к временному файлу загрузки
             original_filename: Оригинальное имя файла
             base_dir: Базовая директория для сохранения
             
@@ -31,93 +56,225 @@ class ImageProcessor:
             dict: Словарь с URL'ами для разных размеров
         """
         try:
-            # Открываем изображение
-            image = Image.open(io.BytesIO(image_data))
+            base_filename = ImageProcessor.content_key(image_data)
+            source = io.BytesIO(image_data) if isinstance(image_data, bytes) else image_data
             
-            # Конвертируем в RGB если нужно
-            if image.mode in ('RGBA', 'LA', 'P'):
-                # Создаем белый фон для прозрачных изображений
-                background = Image.new('RGB', image.size, (255, 255, 255))
-                if image.mode == 'P':
-                    image = image.convert('RGBA')
-                background.paste(image, mask=image.split()[-1] if image.mode == 'RGBA' else None)
-                image = background
-            elif image.mode != 'RGB':
-                image = image.convert('RGB')
+            # Такое изображение уже загружали — возвращаем существующий набор без декодирования
+            existing_extension = ImageProcessor._find_original_extension(base_filename, base_dir)
+            if existing_extension:
+                with Image.open(source) as header:
+                    source_size = header.size
+                # Обновляем mtime оригинала: сборщик мусора не удалит набор, пока его заново сохраняют в блюде
+                os.utime(os.path.join(base_dir, "original", f"{base_filename}_original{existing_extension}"))
+                return ImageProcessor._result(base_filename, existing_extension, source_size, deduplicated=True)
+            
+            image, source_size = ImageProcessor._load_rgb(source, [], max_side=ImageProcessor.ORIGINAL_MAX_SIDE)
+            
+            # Оригинал храним не больше ORIGINAL_MAX_SIDE по длинной стороне
+            if max(image.size) > ImageProcessor.ORIGINAL_MAX_SIDE:
+                image = image.resize(
+                    ImageProcessor._fit_size(image.size, ImageProcessor.ORIGINAL_MAX_SIDE),
+                    Image.Resampling.LANCZOS, reducing_gap=3.0,
+                )
             
             # Генерируем базовое имя файла
             file_extension = os.path.splitext(original_filename)[1] if original_filename else '.jpg'
             if file_extension.lower() not in ['.jpg', '.jpeg', '.png']:
                 file_extension = '.jpg'
             
-            base_filename = str(uuid.uuid4())
-            
-            # Создаем папки если их нет
-            for size_name in ImageProcessor.SIZES.keys():
-                size_dir = os.path.join(base_dir, size_name)
-                if not os.path.exists(size_dir):
-                    os.makedirs(size_dir)
-            
-            # Создаем версии разных размеров
-            urls = {}
-            for size_name, (width, height) in ImageProcessor.SIZES.items():
-                # Изменяем размер с обрезкой по центру (crop to fit)
-                # Это гарантирует, что изображение заполнит весь размер без белых областей
-                resized_image = image.copy()
-                
-                # Вычисляем соотношение сторон
-                img_ratio = resized_image.width / resized_image.height
-                target_ratio = width / height
-                
-                if img_ratio > target_ratio:
-                    # Изображение шире - обрезаем по ширине
-                    new_width = int(resized_image.height * target_ratio)
-                    left = (resized_image.width - new_width) // 2
-                    resized_image = resized_image.crop((left, 0, left + new_width, resized_image.height))
-                else:
-                    # Изображение выше - обрезаем по высоте
-                    new_height = int(resized_image.width / target_ratio)
-                    top = (resized_image.height - new_height) // 2
-                    resized_image = resized_image.crop((0, top, resized_image.width, top + new_height))
-                
-                # Изменяем размер до точного размера
-                final_image = resized_image.resize((width, height), Image.Resampling.LANCZOS)
-                
-                # Сохраняем
-                filename = f"{base_filename}{file_extension}"
-                file_path = os.path.join(base_dir, size_name, filename)
-                
-                # Сохраняем с оптимизацией
-                if file_extension.lower() in ['.jpg', '.jpeg']:
-                    final_image.save(file_path, 'JPEG', quality=95, optimize=True)
-                else:
-                    final_image.save(file_path, 'PNG', optimize=True)
-                
-                urls[size_name] = f"/uploads/{size_name}/{filename}"
-            
-            # Сохраняем оригинал
-            original_filename = f"{base_filename}_original{file_extension}"
-            original_path = os.path.join(base_dir, "original", original_filename)
-            if not os.path.exists(os.path.join(base_dir, "original")):
-                os.makedirs(os.path.join(base_dir, "original"))
+            # Сохраняем оригинал (атомарно: та же картинка может загружаться параллельно)
+            original_path = os.path.join(base_dir, "original", f"{base_filename}_original{file_extension}")
+            ImageProcessor._save_atomic(original_path, lambda path: ImageProcessor._save(image, path, file_extension))
             
-            if file_extension.lower() in ['.jpg', '.jpeg']:
-                image.save(original_path, 'JPEG', quality=95, optimize=True)
-            else:
-                image.save(original_path, 'PNG', optimize=True)
-            
-            urls['original'] = f"/uploads/original/{original_filename}"
-            
-            return {
-                "status": "ok",
-                "urls": urls,
-                "original_size": image.size,
-                "processed_sizes": ImageProcessor.SIZES
-            }
+            return ImageProcessor._result(base_filename, file_extension, source_size, deduplicated=False)
             
         except Exception as e:
             raise Exception(f"Ошибка при обработке изображения: {str(e)}")
     
+    @staticmethod
+    def content_key(image_data: Union[bytes, str]) -> str:
+        """Базовое имя файла по содержимому: одинаковые байты — одинаковое имя"""
+        if isinstance(image_data, bytes):
+            return hashlib.sha256(image_data).hexdigest()[:32]
+        with open(image_data, 'rb') as f:
+            return hashlib.file_digest(f, 'sha256').hexdigest()[:32]
+    
+    @staticmethod
+    def _find_original_extension(base_filename: str, base_dir: str) -> Optional[str]:
+        for ext in ['.jpg', '.jpeg', '.png']:
+            if os.path.exists(os.path.join(base_dir, "original", f"{base_filename}_original{ext}")):
+                return ext
+        return None
+    
+    @staticmethod
+    def _result(base_filename: str, file_extension: str, source_size: Tuple[int, int], deduplicated: bool) -> dict:
+        # URL'ы вариантов: файлы появятся при первом обращении
+        filename = f"{base_filename}{file_extension}"
+        urls = {size_name: f"/uploads/{size_name}/{filename}" for size_name in ImageProcessor.SIZES}
+        urls['original'] = f"/uploads/original/{base_filename}_original{file_extension}"
+        return {
+            "status": "ok",
+            "urls": urls,
+            "original_size": source_size,
+            "processed_sizes": ImageProcessor.SIZES,
+            "deduplicated": deduplicated,
+        }
+    
+    @staticmethod
+    def original_path_for(filename: str, base_dir: str = "uploads") -> str:
+        """Путь к оригиналу для имени файла варианта (abc.jpg -> original/abc_original.jpg)"""
+        stem, ext = os.path.splitext(filename)
+        return os.path.join(base_dir, "original", f"{stem}_original{ext}")
+    
+    @staticmethod
+    def render_variant(size_name: str, filename: str, base_dir: str = "uploads", image_format: Optional[str] = None) -> Optional[str]:
+        """
+        Создает вариант size_name из сохраненного оригинала, если его еще нет на диске
+        
+        Args:
+            image_format: Формат из MODERN_FORMATS (например, 'WEBP'); None — формат по расширению filename
+            
+        Returns:
+            str: Путь к файлу варианта или None, если размер неизвестен или нет оригинала
+        """
+        if size_name not in ImageProcessor.SIZES:
+            return None
+        if image_format:
+            return ImageProcessor._render_modern_format(size_name, filename, base_dir, image_format)
+        variant_path = os.path.join(base_dir, size_name, filename)
+        if os.path.exists(variant_path):
+            return variant_path
+        original_path = ImageProcessor.original_path_for(filename, base_dir)
+        if not os.path.exists(original_path):
+            return None
+        
+        width, height = ImageProcessor.SIZES[size_name]
+        with open(original_path, 'rb') as f:
+            image, _ = ImageProcessor._load_rgb(f, [(width, height)])
+        level = ImageProcessor._pyramid_level([image], width, height)
+        
+        # Обрезка по центру (crop to fit) и ресайз одним вызовом, без копии изображения
+        final_image = level.resize(
+            (width, height), Image.Resampling.LANCZOS,
+            box=ImageProcessor._crop_box(level.size, width, height),
+        )
+        
+        ImageProcessor._save_atomic(variant_path, lambda path: ImageProcessor._save(final_image, path, os.path.splitext(filename)[1]))
+        return variant_path
+    
+    @staticmethod
+    def _render_modern_format(size_name: str, filename: str, base_dir: str, image_format: str) -> Optional[str]:
+        fmt = next((f for f in ImageProcessor.MODERN_FORMATS if f[0] == image_format), None)
+        if fmt is None:
+            return None
+        pil_format, extension, _, params = fmt
+        variant_path = os.path.join(base_dir, size_name, filename + extension)
+        if os.path.exists(variant_path):
+            return variant_path
+        # Перекодируем уже готовый вариант нужного размера: он маленький и обрезан как надо
+        source_path = ImageProcessor.render_variant(size_name, filename, base_dir)
+        if not source_path:
+            return None
+        with Image.open(source_path) as source:
+            image = source.convert('RGB')
+        ImageProcessor._save_atomic(variant_path, lambda path: image.save(path, pil_format, **params))
+        return variant_path
+    
+    @staticmethod
+    def _save_atomic(target_path: str, save) -> None:
+        """Пишем во временный файл и переименовываем: параллельный запрос не увидит недописанный файл"""
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        tmp_path = f"{target_path}.{uuid.uuid4().hex}.tmp"
+        try:
+            save(tmp_path)
+            os.replace(tmp_path, target_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    
+    @staticmethod
+    def _load_rgb(fp, targets: list, max_side: Optional[int] = None) -> Tuple[Image.Image, Tuple[int, int]]:
+        """Открывает изображение и декодирует его в RGB в минимальном достаточном масштабе"""
+        image = Image.open(fp)
+        source_size = image.size
+        
+        # JPEG декодируем сразу в уменьшенном масштабе (1/2, 1/4, 1/8 в DCT),
+        # достаточном для нужных размеров
+        if image.format == 'JPEG':
+            image.draft('RGB', ImageProcessor._decode_size(source_size, targets, max_side))
+        
+        # Конвертируем в RGB если нужно
+        if image.mode in ('RGBA', 'LA', 'P'):
+            # Создаем белый фон для прозрачных изображений
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            if image.mode == 'P':
+                image = image.convert('RGBA')
+            background.paste(image, mask=image.split()[-1] if image.mode == 'RGBA' else None)
+            image = background
+        elif image.mode != 'RGB':
+            image = image.convert('RGB')
+        else:
+            image.load()
+        return image, source_size
+    
+    @staticmethod
+    def _fit_size(size: Tuple[int, int], max_side: int) -> Tuple[int, int]:
+        """Размер, вписанный в квадрат max_side с сохранением пропорций"""
+        scale = max_side / max(size)
+        return max(1, round(size[0] * scale)), max(1, round(size[1] * scale))
+    
+    @staticmethod
+    def _cover_scale(size: Tuple[int, int], width: int, height: int) -> float:
+        """Во сколько раз нужно масштабировать изображение, чтобы обрезка по центру заполнила width×height"""
+        return max(width / size[0], height / size[1])
+    
+    @staticmethod
+    def _decode_size(size: Tuple[int, int], targets: list, max_side: Optional[int] = None) -> Tuple[int, int]:
+        """Минимальный размер декодирования, которого хватает на все targets и на оригинал до max_side"""
+        scale = min(1.0, max_side / max(size)) if max_side else 0.0
+        for width, height in targets:
+            scale = max(scale, ImageProcessor._cover_scale(size, width, height))
+        scale = min(1.0, scale)
+        return math.ceil(size[0] * scale), math.ceil(size[1] * scale)
+    
+    @staticmethod
+    def _pyramid_level(pyramid: list, width: int, height: int) -> Image.Image:
+        """Наименьший уровень пирамиды, покрывающий width×height (уровни достраиваются по мере надобности)"""
+        index = 0
+        while True:
+            level = pyramid[index]
+            half = (level.width // 2, level.height // 2)
+            # уменьшаем вдвое, пока остаётся двукратный запас — финальный LANCZOS сохраняет качество
+            if min(half) < 1 or ImageProcessor._cover_scale(half, width, height) > 0.5:
+                return level
+            if index + 1 == len(pyramid):
+                pyramid.append(level.reduce(2))
+            index += 1
+    
+    @staticmethod
+    def _crop_box(size: Tuple[int, int], width: int, height: int) -> Tuple[float, float, float, float]:
+        img_width, img_height = size
+        # Вычисляем соотношение сторон
+        img_ratio = img_width / img_height
+        target_ratio = width / height
+        if img_ratio > target_ratio:
+            # Изображение шире - обрезаем по ширине
+            new_width = img_height * target_ratio
+            left = (img_width - new_width) / 2
+            return (left, 0, left + new_width, img_height)
+        # Изображение выше - обрезаем по высоте
+        new_height = img_width / target_ratio
+        top = (img_height - new_height) / 2
+        return (0, top, img_width, top + new_height)
+    
+    @staticmethod
+    def _save(image: Image.Image, file_path: str, file_extension: str) -> None:
+        # Сохраняем с оптимизацией
+        if file_extension.lower() in ['.jpg', '.jpeg']:
+            image.save(file_path, 'JPEG', quality=95, optimize=True)
+        else:
+            image.save(file_path, 'PNG', optimize=True)
+    
     @staticmethod
     def get_url_for_size(base_url: str, size_name: str) -> str:
         """
@@ -142,7 +299,8 @@ class ImageProcessor:
     @staticmethod
     def delete_image_variants(base_filename: str, base_dir: str = "uploads") -> bool:
         """
-        Удаляет все варианты изображения
+        Удаляет все варианты изображения. Файлы общие для всех загрузок с тем же содержимым,
+        поэтому вызывать через image_refs.delete_image_if_unreferenced
         
         Args:
             base_filename: Базовое имя файла (без расширения)
@@ -157,8 +315,10 @@ class ImageProcessor:
                 size_dir = os.path.join(base_dir, size_name)
                 for ext in ['.jpg', '.jpeg', '.png']:
                     file_path = os.path.join(size_dir, f"{base_filename}{ext}")
-                    if os.path.exists(file_path):
-                        os.remove(file_path)
+                    # вместе с основным файлом удаляем его WebP/AVIF копии
+                    for path in [file_path, file_path + '.avif', file_path + '.webp']:
+                        if os.path.exists(path):
+                            os.remove(path)
             
             # Удаляем оригинал
             original_dir = os.path.join(base_dir, "original")
@@ -169,4 +329,4 @@ class ImageProcessor:
             
             return True
         except Exception:
-            return False 
\ No newline at end of file
+            return False 
\ No newline at end of file
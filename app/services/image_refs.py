@@ -0,0 +1,86 @@
+import os
+import time
+from typing import Iterable
+
+from sqlalchemy.orm import Session
+
+from app.logging_config import get_logger
+from app.models import Restaurant as ORestaurant, Dish as ODish, Collection as OCollection, CollectionItem as OCollectionItem
+from app.services.image_processor import ImageProcessor
+
+
+# Все колонки, где хранятся ссылки на файлы из uploads
+IMAGE_COLUMNS = (ORestaurant.image, ODish.image, OCollection.image, OCollectionItem.image)
+# Недавно загруженный (или загруженный повторно) набор может ждать сохранения в другой форме —
+# такие не удаляем сразу, их заберёт uploads_gc
+RECENT_UPLOAD_SECONDS = 3600
+
+logger = get_logger("image_refs")
+
+
+def image_key(url: str | None) -> str | None:
+    """
+    Базовое имя набора файлов по URL любого варианта:
+    /uploads/dish_card/abc.jpg, /uploads/dish_card/abc.jpg.webp, /uploads/original/abc_original.jpg -> abc
+    """
+    if not url or "/uploads/" not in url:
+        return None
+    name = os.path.basename(url.split("?", 1)[0])
+    key = name.split(".", 1)[0]
+    if key.endswith("_original"):
+        key = key[: -len("_original")]
+    return key or None
+
+
+def referenced_keys(db: Session) -> set[str]:
+    """Индекс ссылок: базовые имена всех изображений, на которые ссылаются записи в БД"""
+    keys: set[str] = set()
+    for column in IMAGE_COLUMNS:
+        for (url,) in db.query(column).filter(column.like("%/uploads/%")).yield_per(1000):
+            key = image_key(url)
+            if key:
+                keys.add(key)
+    return keys
+
+
+def is_referenced(key: str, db: Session) -> bool:
+    for column in IMAGE_COLUMNS:
+        if db.query(column).filter(column.like(f"%/uploads/%/{key}%")).first() is not None:
+            return True
+    return False
+
+
+def delete_image_if_unreferenced(url_or_key: str, db: Session, base_dir: str = "uploads") -> bool:
+    """
+    Удаляет файлы изображения, только если на него больше никто не ссылается:
+    после дедупликации один набор файлов может принадлежать нескольким блюдам и ресторанам
+    """
+    key = image_key(url_or_key) if "/" in url_or_key else url_or_key
+    if not key or is_referenced(key, db) or _recently_uploaded(key, base_dir):
+        return False
+    deleted = ImageProcessor.delete_image_variants(key, base_dir)
+    if deleted:
+        logger.info("deleted unreferenced image %s", key)
+    return deleted
+
+
+def release_images(urls: Iterable[str | None], db: Session, base_dir: str = "uploads") -> int:
+    """
+    Вызывается после commit, когда запись сменила или потеряла картинку: удаляет файлы прежних
+    изображений без других ссылок. Возвращает число удалённых наборов; ошибки только логируются
+    """
+    deleted = 0
+    for key in {image_key(url) for url in urls} - {None}:
+        try:
+            deleted += delete_image_if_unreferenced(key, db, base_dir)
+        except Exception:
+            logger.exception("failed to release image %s", key)
+    return deleted
+
+
+def _recently_uploaded(key: str, base_dir: str) -> bool:
+    extension = ImageProcessor._find_original_extension(key, base_dir)
+    if not extension:
+        return False
+    path = os.path.join(base_dir, "original", f"{key}_original{extension}")
+    return time.time() - os.path.getmtime(path) < RECENT_UPLOAD_SECONDS
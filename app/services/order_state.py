@@ -0,0 +1,75 @@
+from typing import Any
+
+from sqlalchemy import update
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Session
+
+from app.models import Order as DBOrder
+
+
+# действие -> (допустимые исходные статусы, целевой статус)
+TRANSITIONS: dict[str, tuple[frozenset[str], str]] = {
+    "accept": (frozenset({"created", "sent", "modified"}), "accepted"),
+    "cancel": (frozenset({"created", "sent", "accepted", "modified"}), "cancelled"),
+    "deliver": (frozenset({"accepted", "modified"}), "delivered"),
+    "modify": (frozenset({"created", "sent", "accepted", "modified"}), "modified"),
+}
+
+# поля заказа, которые нужны обработчикам после перехода (уведомления, пересчёт суммы)
+_RETURNING = (
+    DBOrder.id,
+    DBOrder.user_id,
+    DBOrder.restaurant_id,
+    DBOrder.status,
+    DBOrder.total_price,
+    DBOrder.delivery_type,
+    DBOrder.address,
+    DBOrder.phone,
+    DBOrder.payment_method,
+    DBOrder.client_comment,
+    DBOrder.eta_minutes,
+)
+
+
+class TransitionError(Exception):
+    """Переход не выполнен: reason = "not_found" или "invalid_status", current — текущий статус"""
+
+    def __init__(self, reason: str, current: str | None = None):
+        super().__init__(reason)
+        self.reason = reason
+        self.current = current
+
+
+def transition(db: Session, order_id: int, action: str, restaurant_id: int | None = None, commit: bool = True,
+               **values: Any) -> Row:
+    """
+    Переводит заказ одним UPDATE ... WHERE id=? AND status IN (...) RETURNING ...
+
+    Чтение статуса выполняется только при неудаче, чтобы отличить отсутствующий заказ
+    от недопустимого перехода. Одновременные нажатия с двух устройств безопасны:
+    выиграет ровно одно, второе получит TransitionError("invalid_status").
+
+    С commit=False переход остаётся в открытой транзакции вызывающего (begin_transaction),
+    и строка заказа заблокирована до его commit — так вместе со статусом меняют состав заказа.
+    При неудаче транзакция откатывается в любом случае.
+    """
+    sources, target = TRANSITIONS[action]
+    stmt = update(DBOrder).where(DBOrder.id == order_id, DBOrder.status.in_(sources))
+    if restaurant_id is not None:
+        stmt = stmt.where(DBOrder.restaurant_id == restaurant_id)
+    stmt = (
+        stmt.values(status=target, **values)
+        .returning(*_RETURNING)
+        .execution_options(synchronize_session=False)
+    )
+    row = db.execute(stmt).first()
+    if row is None:
+        db.rollback()
+        q = db.query(DBOrder.status).filter(DBOrder.id == order_id)
+        if restaurant_id is not None:
+            q = q.filter(DBOrder.restaurant_id == restaurant_id)
+        current = q.scalar()
+        raise TransitionError("not_found" if current is None else "invalid_status", current)
+    if commit:
+        db.commit()
+    return row
@@ -0,0 +1,154 @@
+import json
+import threading
+import time
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Iterable, Mapping
+
+from sqlalchemy.orm import Session
+
+from app.models import Restaurant as ORestaurant, Dish as ODish, OptionGroup as OGroup, Option as OOption
+
+
+# Страховочный TTL: изменения меню, сделанные в обход API (миграции, другой процесс),
+# подхватываются не позже чем через это время
+_TTL_SECONDS = 300
+
+
+@dataclass(frozen=True)
+class DishPrice:
+    id: int
+    name: str
+    price: int
+    is_available: bool
+
+
+@dataclass(frozen=True)
+class OptionPrice:
+    id: int
+    dish_id: int
+    name: str
+    price_delta: int
+
+
+@dataclass(frozen=True)
+class PriceTable:
+    """Неизменяемый снимок цен ресторана: блюда, доступность, надбавки опций, условия доставки"""
+    restaurant_id: int
+    version: int
+    built_at: float
+    delivery_fee: int
+    delivery_min_sum: int
+    dishes: Mapping[int, DishPrice]
+    options: Mapping[int, OptionPrice]
+
+    def options_for(self, dish_id: int, option_ids: Iterable[int]) -> list[OptionPrice]:
+        """Опции блюда из выбранных; чужие, несуществующие и повторные id пропускаются"""
+        result = []
+        for oid in dict.fromkeys(option_ids):
+            op = self.options.get(oid)
+            if op and op.dish_id == dish_id:
+                result.append(op)
+        return result
+
+    def options_delta(self, dish_id: int, option_ids: Iterable[int]) -> int:
+        return sum(op.price_delta for op in self.options_for(dish_id, option_ids))
+
+    def unit_price(self, dish_id: int, option_ids: Iterable[int]) -> int | None:
+        """Цена одной порции с опциями или None, если блюда нет в меню ресторана"""
+        dish = self.dishes.get(dish_id)
+        if not dish:
+            return None
+        return dish.price + self.options_delta(dish_id, option_ids)
+
+
+def parse_option_ids(raw) -> list[int]:
+    """Приводит chosen_options (JSON строка или список) к списку int без повторов"""
+    if not raw:
+        return []
+    if isinstance(raw, str):
+        try:
+            raw = json.loads(raw)
+        except ValueError:
+            return []
+        if not isinstance(raw, list):
+            return []
+    result = []
+    for x in raw:
+        try:
+            result.append(int(x))
+        except (ValueError, TypeError):
+            continue
+    return list(dict.fromkeys(result))
+
+
+_lock = threading.Lock()
+_versions: dict[int, int] = {}
+_tables: dict[int, PriceTable] = {}
+
+
+def menu_version(restaurant_id: int) -> int:
+    return _versions.get(restaurant_id, 0)
+
+
+def bump_menu_version(restaurant_id: int | None) -> None:
+    """Вызывается после любых изменений меню или условий доставки ресторана"""
+    if restaurant_id is None:
+        return
+    with _lock:
+        _versions[restaurant_id] = _versions.get(restaurant_id, 0) + 1
+        _tables.pop(restaurant_id, None)
+
+
+def _build_table(restaurant_id: int, version: int, db: Session) -> PriceTable | None:
+    r = db.query(ORestaurant).filter(ORestaurant.id == restaurant_id).first()
+    if not r:
+        return None
+    dishes = db.query(ODish).filter(ODish.restaurant_id == restaurant_id).all()
+    option_rows = (
+        db.query(OOption.id, OGroup.dish_id, OOption.name, OOption.price_delta)
+        .join(OGroup, OGroup.id == OOption.group_id)
+        .join(ODish, ODish.id == OGroup.dish_id)
+        .filter(ODish.restaurant_id == restaurant_id)
+        .all()
+    )
+    return PriceTable(
+        restaurant_id=restaurant_id,
+        version=version,
+        built_at=time.monotonic(),
+        delivery_fee=r.delivery_fee or 0,
+        delivery_min_sum=r.delivery_min_sum or 0,
+        dishes=MappingProxyType({
+            d.id: DishPrice(id=d.id, name=d.name, price=d.price or 0, is_available=bool(d.is_available))
+            for d in dishes
+        }),
+        options=MappingProxyType({
+            oid: OptionPrice(id=oid, dish_id=dish_id, name=name, price_delta=delta or 0)
+            for (oid, dish_id, name, delta) in option_rows
+        }),
+    )
+
+
+def get_price_table(restaurant_id: int, db: Session) -> PriceTable | None:
+    """Возвращает прайс ресторана из кэша, перестраивая его при смене версии меню"""
+    version = menu_version(restaurant_id)
+    table = _tables.get(restaurant_id)
+    if table and table.version == version and time.monotonic() - table.built_at < _TTL_SECONDS:
+        return table
+    table = _build_table(restaurant_id, version, db)
+    if table is None:
+        return None
+    with _lock:
+        # за время построения меню могли изменить — такой снимок не кэшируем
+        if menu_version(restaurant_id) == version:
+            _tables[restaurant_id] = table
+    return table
+
+
+def get_price_tables(restaurant_ids: Iterable[int], db: Session) -> dict[int, PriceTable]:
+    tables: dict[int, PriceTable] = {}
+    for rid in set(restaurant_ids):
+        table = get_price_table(rid, db)
+        if table:
+            tables[rid] = table
+    return tables
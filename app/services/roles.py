@@ -0,0 +1,129 @@
+"""
+Роли пользователя для бота: блокировка, главный админ, админ какого ресторана.
+
+Бот кэширует роли (bot/role_cache.py), API — списки админов ресторанов для уведомлений
+(restaurant_admin_ids), поэтому после изменения ролей вызывается roles_changed():
+- кэш админов этого процесса и слушатели в нём (бот внутри API или BOT_API_MODE=inprocess)
+  сбрасываются сразу, в других процессах API список обновится через RESTAURANT_ADMINS_CACHE_TTL;
+- процессам бота из BOT_ROLES_PUSH_URLS уходит POST /internal/roles/invalidate
+  (в фоне, ошибки только логируются — остальное добьёт TTL кэша).
+"""
+
+import asyncio
+import os
+import time
+from typing import Callable, Iterable
+
+import httpx
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.db import get_session
+from app.deps.auth import SUPER_ADMINS
+from app.logging_config import get_logger
+from app.models import RestaurantAdmin as DBRestaurantAdmin, User as DBUser
+
+
+ROLES_INVALIDATE_PATH = "/internal/roles/invalidate"
+INTERNAL_SECRET_HEADER = "X-Internal-Secret"
+# Базовые адреса процессов бота в режиме webhook, через запятую (например http://bot:8081)
+BOT_ROLES_PUSH_URLS = [u.strip().rstrip("/") for u in os.getenv("BOT_ROLES_PUSH_URLS", "").split(",") if u.strip()]
+INTERNAL_SECRET = os.getenv("BOT_WEBHOOK_SECRET", "").strip()
+_PUSH_TIMEOUT_SECONDS = 2.0
+RESTAURANT_ADMINS_CACHE_TTL = float(os.getenv("RESTAURANT_ADMINS_CACHE_TTL", "60"))
+
+logger = get_logger("roles")
+
+_listeners: list[Callable[[list[int]], None]] = []
+_push_tasks: set[asyncio.Task] = set()
+_admin_ids: dict[int, tuple[float, list[int]]] = {}
+# поколение: список, прочитанный до сброса, не должен попасть в кэш после него
+_admin_ids_generation = 0
+
+
+def get_user_roles(db: Session, user_id: int) -> dict:
+    """Роли одним запросом; пользователь не создаётся (в отличие от /users/activate)"""
+    row = db.execute(
+        select(DBUser.is_blocked, DBRestaurantAdmin.restaurant_id)
+        .select_from(DBUser)
+        .outerjoin(DBRestaurantAdmin, DBRestaurantAdmin.user_id == DBUser.id)
+        .where(DBUser.id == user_id)
+    ).first()
+    if row is None:
+        # админа ресторана могут назначить до первого /start
+        restaurant_id = db.execute(
+            select(DBRestaurantAdmin.restaurant_id).where(DBRestaurantAdmin.user_id == user_id)
+        ).scalar()
+        is_blocked = False
+    else:
+        is_blocked, restaurant_id = bool(row[0]), row[1]
+    return {
+        "user_id": user_id,
+        "is_blocked": is_blocked,
+        "is_super_admin": user_id in SUPER_ADMINS,
+        "restaurant_id": restaurant_id,
+    }
+
+
+def _load_admin_ids(restaurant_id: int) -> list[int]:
+    with get_session() as db:
+        return list(db.execute(
+            select(DBRestaurantAdmin.user_id).where(DBRestaurantAdmin.restaurant_id == restaurant_id)
+        ).scalars())
+
+
+async def restaurant_admin_ids(restaurant_id: int) -> list[int]:
+    """Telegram id админов ресторана; из кэша, при промахе — запрос в БД в отдельном потоке"""
+    entry = _admin_ids.get(restaurant_id)
+    if entry is not None and entry[0] > time.monotonic():
+        return entry[1]
+    generation = _admin_ids_generation
+    ids = await asyncio.to_thread(_load_admin_ids, restaurant_id)
+    if generation == _admin_ids_generation:
+        _admin_ids[restaurant_id] = (time.monotonic() + RESTAURANT_ADMINS_CACHE_TTL, ids)
+    return ids
+
+
+def add_roles_listener(listener: Callable[[list[int]], None]) -> None:
+    _listeners.append(listener)
+
+
+def roles_changed(user_ids: Iterable[int]) -> None:
+    """Оповещает бота, что роли пользователей изменились (вызывать после commit)"""
+    global _admin_ids_generation
+    ids = sorted({int(u) for u in user_ids})
+    if not ids:
+        return
+    # какому ресторану принадлежал пользователь, здесь неизвестно — сбрасываем все списки
+    _admin_ids_generation += 1
+    _admin_ids.clear()
+    for listener in _listeners:
+        try:
+            listener(ids)
+        except Exception as exc:
+            logger.warning("roles listener failed: %s", repr(exc))
+    if not BOT_ROLES_PUSH_URLS:
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        logger.warning("roles push skipped outside event loop: %s", ids)
+        return
+    task = loop.create_task(_push(ids))
+    _push_tasks.add(task)
+    task.add_done_callback(_push_tasks.discard)
+
+
+async def _push(ids: list[int]) -> None:
+    async with httpx.AsyncClient(timeout=_PUSH_TIMEOUT_SECONDS) as client:
+        for base_url in BOT_ROLES_PUSH_URLS:
+            try:
+                r = await client.post(
+                    base_url + ROLES_INVALIDATE_PATH,
+                    json={"user_ids": ids},
+                    headers={INTERNAL_SECRET_HEADER: INTERNAL_SECRET},
+                )
+                if r.status_code != 200:
+                    logger.warning("roles push to %s: status %s", base_url, r.status_code)
+            except Exception as exc:
+                logger.warning("roles push to %s failed: %s", base_url, repr(exc))
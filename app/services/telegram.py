@@ -1,8 +1,12 @@
+import asyncio
 import os
 import httpx
 from dotenv import load_dotenv
 from app.logging_config import get_logger
+from app.services.roles import restaurant_admin_ids
 from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 
 
 load_dotenv()
@@ -12,17 +16,51 @@ BOT_TOKEN = os.getenv("BOT_TOKEN", "")
 ADMIN_CHANNEL_ID = os.getenv("ADMIN_CHANNEL_ID", "")
 WEBAPP_URL = os.getenv("WEBAPP_URL", "")
 SUPPORT_TG_URL = os.getenv("SUPPORT_TG_URL", "https://t.me/support")
+# Адрес Bot API; для нагрузочных тестов — локальная заглушка (benchmarks/fake_telegram.py)
+BOT_API_BASE = os.getenv("BOT_API_BASE", "https://api.telegram.org").rstrip("/")
+# Сколько запросов к Bot API одно уведомление (например, всем админам ресторана) шлёт одновременно
+TELEGRAM_SEND_CONCURRENCY = int(os.getenv("TELEGRAM_SEND_CONCURRENCY", "8"))
 logger = get_logger("telegram")
 
+
+def bot_api_url(method: str) -> str:
+    return f"{BOT_API_BASE}/bot{BOT_TOKEN}/{method}"
+
+
+def create_bot(token: str = BOT_TOKEN) -> Bot:
+    """aiogram-бот, работающий с BOT_API_BASE"""
+    return Bot(token, session=AiohttpSession(api=TelegramAPIServer.from_base(BOT_API_BASE)))
+
+
 # Создаем объект бота для рассылки
-bot = Bot(BOT_TOKEN) if BOT_TOKEN else None
+bot = create_bot() if BOT_TOKEN else None
+
+_http: httpx.AsyncClient | None = None
+
+
+def telegram_http() -> httpx.AsyncClient:
+    """Общий клиент для Bot API: соединения переиспользуются между отправками"""
+    global _http
+    if _http is None:
+        _http = httpx.AsyncClient(
+            timeout=10,
+            limits=httpx.Limits(max_connections=4 * TELEGRAM_SEND_CONCURRENCY, max_keepalive_connections=TELEGRAM_SEND_CONCURRENCY),
+        )
+    return _http
+
+
+async def close_telegram_http() -> None:
+    global _http
+    if _http is not None:
+        await _http.aclose()
+        _http = None
 
 
 async def send_admin_message(text: str) -> None:
     if not BOT_TOKEN or not ADMIN_CHANNEL_ID:
         logger.warning("admin_message: missing token or channel")
         return
-    url = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
+    url = bot_api_url("sendMessage")
     payload = {"chat_id": ADMIN_CHANNEL_ID, "text": text}
     async with httpx.AsyncClient(timeout=10) as client:
         try:
@@ -36,7 +74,7 @@ async def send_user_message(chat_id: int, text: str, button_text: str | None = N
     if not BOT_TOKEN or not chat_id:
         logger.warning("user_message: missing token or chat_id")
         return False
-    url = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
+    url = bot_api_url("sendMessage")
     payload: dict = {"chat_id": chat_id, "text": text}
     if button_text and button_url:
         payload["reply_markup"] = {
@@ -61,7 +99,7 @@ async def send_user_message(chat_id: int, text: str, button_text: str | None = N
 async def notify_user_order_modified(chat_id: int, url: str, text: str | None = None) -> None:
     if not BOT_TOKEN or not chat_id:
         return
-    api = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
+    api = bot_api_url("sendMessage")
     payload = {
         "chat_id": chat_id,
         "text": text or "Заказ изменён рестораном. Нажмите, чтобы открыть текущий заказ.",
@@ -77,7 +115,7 @@ async def notify_user_order_modified(chat_id: int, url: str, text: str | None =
 async def notify_user_order_cancelled(chat_id: int, restaurant_name: str, reason: str | None = None) -> None:
     if not BOT_TOKEN or not chat_id:
         return
-    api = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
+    api = bot_api_url("sendMessage")
     
     reason_text = f"\n\nПричина отмены: {reason}" if reason else ""
     text = f"Ресторан \"{restaurant_name}\" отменил заказ.{reason_text}"
@@ -96,7 +134,7 @@ async def notify_user_order_cancelled(chat_id: int, restaurant_name: str, reason
 async def notify_user_order_accepted(chat_id: int, url: str, restaurant_name: str, eta_minutes: int) -> None:
     if not BOT_TOKEN or not chat_id:
         return
-    api = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
+    api = bot_api_url("sendMessage")
     text = f"Ресторан \"{restaurant_name}\" принял Ваш заказ.  Время доставки - {eta_minutes} мин."
     payload = {
         "chat_id": chat_id,
@@ -117,7 +155,7 @@ async def notify_user_order_delivered(chat_id: int, order_id: int, restaurant_na
     
     review_url = f"{WEBAPP_URL}/static/order.html?id={order_id}&show_review=1"
     
-    api = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
+    api = bot_api_url("sendMessage")
     text = f"🎉 Ваш заказ из ресторана \"{restaurant_name}\" доставлен!\n\nПожалуйста, оцените качество обслуживания и оставьте отзыв о ресторане."
     payload = {
         "chat_id": chat_id,
@@ -136,60 +174,55 @@ async def notify_user_order_delivered(chat_id: int, order_id: int, restaurant_na
             return
 
 
-async def notify_restaurant_admins(restaurant_id: int, message: str, button_text: str | None = None, button_url: str | None = None) -> None:
-    """Отправляет уведомление всем админам конкретного ресторана"""
+async def notify_restaurant_admins(restaurant_id: int, message: str, button_text: str | None = None, button_url: str | None = None) -> dict[int, str]:
+    """
+    Отправляет уведомление всем админам ресторана — параллельно, не больше TELEGRAM_SEND_CONCURRENCY
+    запросов одновременно, через общий клиент. Возвращает итог по каждому админу:
+    "ok", "http <код>" или "error: <исключение>"
+    """
     if not BOT_TOKEN:
-        return
-    
-    # Получаем список админов ресторана из базы данных
-    from app.db import get_session
-    from app.models import RestaurantAdmin
-    
+        return {}
+
     try:
-        db = get_session()
-        admin_rows = db.query(RestaurantAdmin).filter(RestaurantAdmin.restaurant_id == restaurant_id).all()
-        
-        if not admin_rows:
-            logger.warning(f"No restaurant admins found for restaurant_id={restaurant_id}")
-            return
-        
-        api = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
-        
-        for admin in admin_rows:
-            payload = {
-                "chat_id": admin.user_id,
-                "text": message
-            }
-            
-            if button_text and button_url:
-                # Добавляем uid админа в URL
-                admin_url = button_url
-                if '?' in button_url:
-                    admin_url += f"&uid={admin.user_id}"
-                else:
-                    admin_url += f"?uid={admin.user_id}"
-                
-                payload["reply_markup"] = {
-                    "inline_keyboard": [[
-                        {"text": button_text, "web_app": {"url": admin_url}}
-                    ]]
-                }
-            
-            async with httpx.AsyncClient(timeout=10) as client:
-                try:
-                    resp = await client.post(api, json=payload)
-                    if resp.status_code == 200:
-                        logger.info(f"Notification sent to restaurant admin {admin.user_id} for restaurant {restaurant_id}")
-                    else:
-                        logger.warning(f"Failed to send notification to admin {admin.user_id}: {resp.status_code}")
-                except Exception as exc:
-                    logger.exception(f"Error sending notification to admin {admin.user_id}: {exc}")
-                    
+        # список админов — из кэша (app/services/roles.py), сбрасывается при назначении/снятии
+        admin_ids = await restaurant_admin_ids(restaurant_id)
     except Exception as exc:
         logger.exception(f"Error in notify_restaurant_admins: {exc}")
-    finally:
-        if 'db' in locals():
-            db.close()
+        return {}
+    if not admin_ids:
+        logger.warning(f"No restaurant admins found for restaurant_id={restaurant_id}")
+        return {}
+
+    api = bot_api_url("sendMessage")
+    semaphore = asyncio.Semaphore(TELEGRAM_SEND_CONCURRENCY)
+
+    async def send(admin_id: int) -> str:
+        payload: dict = {
+            "chat_id": admin_id,
+            "text": message
+        }
+        if button_text and button_url:
+            # Добавляем uid админа в URL
+            admin_url = button_url + ("&" if "?" in button_url else "?") + f"uid={admin_id}"
+            payload["reply_markup"] = {
+                "inline_keyboard": [[
+                    {"text": button_text, "web_app": {"url": admin_url}}
+                ]]
+            }
+        async with semaphore:
+            try:
+                resp = await telegram_http().post(api, json=payload)
+            except Exception as exc:
+                return f"error: {exc!r}"
+        return "ok" if resp.status_code == 200 else f"http {resp.status_code}"
+
+    outcomes = dict(zip(admin_ids, await asyncio.gather(*(send(admin_id) for admin_id in admin_ids))))
+    failed = {admin_id: outcome for admin_id, outcome in outcomes.items() if outcome != "ok"}
+    if failed:
+        logger.warning(f"Restaurant {restaurant_id} admins not notified: {failed} (sent {len(outcomes) - len(failed)}/{len(outcomes)})")
+    else:
+        logger.info(f"Notification sent to {len(outcomes)} admins of restaurant {restaurant_id}")
+    return outcomes
 
 
 async def resolve_username_to_user_id(username: str) -> int | None:
@@ -209,7 +242,7 @@ async def resolve_username_to_user_id(username: str) -> int | None:
         return db_user_id
     
     # Пробуем метод getChat (работает с публичными каналами/группами)
-    url = f"https://api.telegram.org/bot{BOT_TOKEN}/getChat"
+    url = bot_api_url("getChat")
     payload = {"chat_id": f"@{clean_username}"}
     
     async with httpx.AsyncClient(timeout=10) as client:
@@ -225,7 +258,7 @@ async def resolve_username_to_user_id(username: str) -> int | None:
     # Если getChat не сработал, пробуем метод getUpdates для поиска пользователя
     # Это работает только если пользователь недавно взаимодействовал с ботом
     try:
-        url = f"https://api.telegram.org/bot{BOT_TOKEN}/getUpdates"
+        url = bot_api_url("getUpdates")
         resp = await client.get(url)
         if resp.status_code == 200:
             data = resp.json()
@@ -0,0 +1,51 @@
+import os
+import tempfile
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from fastapi import HTTPException, UploadFile
+from starlette.concurrency import run_in_threadpool
+
+
+MAX_IMAGE_UPLOAD_BYTES = int(os.getenv("MAX_IMAGE_UPLOAD_BYTES", str(20 * 1024 * 1024)))
+# Лимит Telegram Bot API на отправку файлов ботом — 50MB; держим запас, как и раньше
+BROADCAST_MEDIA_MAX_BYTES = 20 * 1024 * 1024
+_CHUNK_SIZE = 1024 * 1024
+
+
+def _copy_to_named_file(src, suffix: str, max_bytes: int) -> tuple[str, int]:
+    src.seek(0)
+    fd, path = tempfile.mkstemp(prefix="upload_", suffix=suffix)
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as dst:
+            while True:
+                chunk = src.read(_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(status_code=413, detail=f"Файл слишком большой. Максимальный размер: {max_bytes // (1024 * 1024)}MB")
+                dst.write(chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path, size
+
+
+@asynccontextmanager
+async def spooled_upload(upload: UploadFile, max_bytes: int = MAX_IMAGE_UPLOAD_BYTES) -> AsyncIterator[tuple[str, int]]:
+    """
+    Копирует загруженный файл во временный файл на диске кусками (без чтения в память целиком)
+    и отдаёт (путь, размер). Путь можно передать в другой процесс; файл удаляется на выходе.
+    """
+    suffix = os.path.splitext(upload.filename or "")[1][:10]
+    path, size = await run_in_threadpool(_copy_to_named_file, upload.file, suffix, max_bytes)
+    try:
+        yield path, size
+    finally:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
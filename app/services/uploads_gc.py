@@ -0,0 +1,132 @@
+"""
+Сборка мусора в uploads: удаляет наборы файлов изображений, на которые не ссылается
+ни одна запись (Restaurant/Dish/Collection/CollectionItem.image).
+
+Запуск вручную или из cron (по умолчанию — только отчёт):
+    python -m app.services.uploads_gc [--delete] [--min-age-hours 24] [--batch-size 500]
+"""
+
+import os
+import time
+from dataclasses import dataclass, field
+
+from sqlalchemy.orm import Session
+
+from app.logging_config import get_logger
+from app.services.image_refs import image_key, referenced_keys
+
+
+# Только что загруженная картинка ещё не сохранена в блюде/ресторане — такие не трогаем
+DEFAULT_MIN_AGE_HOURS = 24
+DEFAULT_BATCH_SIZE = 500
+_SKIP_FILES = {".gitkeep"}
+
+logger = get_logger("uploads_gc")
+
+
+@dataclass
+class _ImageSet:
+    paths: list[str] = field(default_factory=list)
+    size_bytes: int = 0
+    newest_mtime: float = 0.0
+
+
+def _scan(base_dir: str) -> tuple[dict[str, _ImageSet], int]:
+    """Группирует файлы uploads/<папка>/<файл> по базовому имени"""
+    sets: dict[str, _ImageSet] = {}
+    scanned = 0
+    if not os.path.isdir(base_dir):
+        return sets, scanned
+    for folder in os.scandir(base_dir):
+        if not folder.is_dir():
+            continue
+        for entry in os.scandir(folder.path):
+            if not entry.is_file() or entry.name in _SKIP_FILES:
+                continue
+            key = image_key(f"/uploads/{folder.name}/{entry.name}")
+            if not key:
+                continue
+            stat = entry.stat()
+            scanned += 1
+            item = sets.setdefault(key, _ImageSet())
+            item.paths.append(entry.path)
+            item.size_bytes += stat.st_size
+            item.newest_mtime = max(item.newest_mtime, stat.st_mtime)
+    return sets, scanned
+
+
+def collect_garbage(
+    db: Session,
+    base_dir: str = "uploads",
+    dry_run: bool = True,
+    min_age_hours: float = DEFAULT_MIN_AGE_HOURS,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> dict:
+    """
+    Находит наборы файлов без ссылок из БД, не изменявшиеся min_age_hours, и удаляет их пачками.
+    Перед каждой пачкой ссылки перечитываются: картинку могли назначить блюду во время сборки.
+    """
+    sets, scanned = _scan(base_dir)
+    referenced = referenced_keys(db)
+    cutoff = time.time() - min_age_hours * 3600
+    orphans = sorted(
+        key for key, item in sets.items()
+        if key not in referenced and item.newest_mtime < cutoff
+    )
+    report = {
+        "dry_run": dry_run,
+        "scanned_files": scanned,
+        "image_sets": len(sets),
+        "referenced_sets": len(referenced & sets.keys()),
+        "orphaned_sets": len(orphans),
+        "orphaned_files": sum(len(sets[k].paths) for k in orphans),
+        "orphaned_bytes": sum(sets[k].size_bytes for k in orphans),
+        "deleted_sets": 0,
+        "deleted_files": 0,
+        "deleted_bytes": 0,
+        "sample": orphans[:20],
+    }
+    if dry_run:
+        return report
+
+    for start in range(0, len(orphans), max(1, batch_size)):
+        batch = orphans[start:start + batch_size]
+        if start:
+            referenced = referenced_keys(db)
+        for key in batch:
+            if key in referenced:
+                continue
+            for path in sets[key].paths:
+                try:
+                    size = os.path.getsize(path)
+                    os.remove(path)
+                except FileNotFoundError:
+                    continue
+                except OSError as exc:
+                    logger.warning("failed to delete %s: %s", path, repr(exc))
+                    continue
+                report["deleted_files"] += 1
+                report["deleted_bytes"] += size
+            report["deleted_sets"] += 1
+        logger.info("uploads gc: batch %s..%s done, deleted files so far: %s", start, start + len(batch), report["deleted_files"])
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    from app.db import get_session
+
+    parser = argparse.ArgumentParser(description="Сборка мусора в uploads")
+    parser.add_argument("--base-dir", default="uploads")
+    parser.add_argument("--delete", action="store_true", help="удалить найденное (по умолчанию только отчёт)")
+    parser.add_argument("--min-age-hours", type=float, default=DEFAULT_MIN_AGE_HOURS)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+    with get_session() as session:
+        result = collect_garbage(
+            session, args.base_dir, dry_run=not args.delete,
+            min_age_hours=args.min_age_hours, batch_size=args.batch_size,
+        )
+    print(json.dumps(result, ensure_ascii=False, indent=2))
@@ -0,0 +1,203 @@
+"""
+Статика мини-приложения: сборка (отпечатки + предсжатие) и раздача.
+
+Сборка (в Dockerfile, локально — по желанию):
+    python -m app.static_assets [--src webapp/static] [--out webapp/dist]
+
+- css/js/картинки копируются под именем с отпечатком содержимого (styles.v23.3f2a9c1b0d.css),
+  ссылки /static/... в html/css/js переписываются на эти имена (query-хаки ?v=NN отбрасываются);
+- исходные имена тоже остаются: на них ведут ссылки из бота и закэшированные страницы;
+- для текстовых файлов рядом пишутся .gz и .br (если установлен brotli);
+- manifest.json: исходное имя -> имя с отпечатком.
+
+PrecompressedStaticFiles отдаёт готовый .br/.gz по Accept-Encoding (без сжатия на каждый запрос),
+файлы с отпечатком — с Cache-Control immutable, остальные — с обязательной ревалидацией по ETag.
+"""
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+from app.logging_config import get_logger
+from app.middleware import accepted_encodings
+
+try:
+    import brotli
+except ImportError:  # brotli необязателен: без него отдаём только gzip
+    brotli = None
+
+
+DEFAULT_SRC_DIR = "webapp/static"
+DEFAULT_OUT_DIR = "webapp/dist"
+MANIFEST_NAME = "manifest.json"
+
+# Что получает отпечаток в имени; html не трогаем — на страницы ведут постоянные ссылки
+FINGERPRINT_EXTENSIONS = {".css", ".js", ".jpg", ".jpeg", ".png", ".gif", ".svg", ".webp", ".ico", ".woff", ".woff2"}
+# Что имеет смысл сжимать
+COMPRESS_EXTENSIONS = {".html", ".css", ".js", ".svg", ".json", ".txt"}
+COMPRESS_MIN_SIZE = 1024
+FINGERPRINT_LENGTH = 10
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+_FINGERPRINTED_RE = re.compile(r"\.[0-9a-f]{%d}\.[A-Za-z0-9]+$" % FINGERPRINT_LENGTH)
+# /static/<имя>[?v=...] внутри html/css/js
+_STATIC_REF_RE = re.compile(r"/static/([A-Za-z0-9_.\-]+)(\?v=[A-Za-z0-9_.\-]*)?")
+
+logger = get_logger("static_assets")
+
+
+def fingerprinted_name(name: str, data: bytes) -> str:
+    stem, ext = os.path.splitext(name)
+    digest = hashlib.sha256(data).hexdigest()[:FINGERPRINT_LENGTH]
+    return f"{stem}.{digest}{ext}"
+
+
+def is_fingerprinted(path: str) -> bool:
+    return bool(_FINGERPRINTED_RE.search(path))
+
+
+def _rewrite_refs(text: str, manifest: dict[str, str]) -> str:
+    def replace(match: re.Match) -> str:
+        target = manifest.get(match.group(1))
+        return f"/static/{target}" if target else match.group(0)
+    return _STATIC_REF_RE.sub(replace, text)
+
+
+def _write_compressed(path: str, data: bytes) -> list[str]:
+    written = []
+    gz = gzip.compress(data, compresslevel=9, mtime=0)
+    if len(gz) < len(data):
+        with open(path + ".gz", "wb") as f:
+            f.write(gz)
+        written.append(path + ".gz")
+    if brotli is not None:
+        br = brotli.compress(data, quality=11)
+        if len(br) < len(data):
+            with open(path + ".br", "wb") as f:
+                f.write(br)
+            written.append(path + ".br")
+    return written
+
+
+def build_static(src_dir: str = DEFAULT_SRC_DIR, out_dir: str = DEFAULT_OUT_DIR) -> dict:
+    """Собирает out_dir из src_dir; возвращает manifest"""
+    names = sorted(
+        entry.name for entry in os.scandir(src_dir)
+        if entry.is_file() and not entry.name.startswith(".")
+    )
+    contents = {}
+    for name in names:
+        with open(os.path.join(src_dir, name), "rb") as f:
+            contents[name] = f.read()
+
+    # Сначала отпечатки ресурсов без ссылок на другие ресурсы (картинки и т.п.),
+    # затем css/js с переписанными ссылками, затем html
+    manifest: dict[str, str] = {}
+    text_exts = (".css", ".js")
+    for name in names:
+        ext = os.path.splitext(name)[1].lower()
+        if ext in FINGERPRINT_EXTENSIONS and ext not in text_exts:
+            manifest[name] = fingerprinted_name(name, contents[name])
+    for name in names:
+        ext = os.path.splitext(name)[1].lower()
+        if ext in text_exts:
+            contents[name] = _rewrite_refs(contents[name].decode("utf-8"), manifest).encode("utf-8")
+            manifest[name] = fingerprinted_name(name, contents[name])
+    for name in names:
+        if os.path.splitext(name)[1].lower() == ".html":
+            contents[name] = _rewrite_refs(contents[name].decode("utf-8"), manifest).encode("utf-8")
+
+    tmp_dir = out_dir.rstrip("/") + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    stats = {"files": 0, "compressed": 0, "bytes": 0, "gzip_bytes": 0, "brotli_bytes": 0}
+    for name in names:
+        data = contents[name]
+        targets = [name] + ([manifest[name]] if name in manifest else [])
+        for target in targets:
+            path = os.path.join(tmp_dir, target)
+            with open(path, "wb") as f:
+                f.write(data)
+            stats["files"] += 1
+            stats["bytes"] += len(data)
+            if os.path.splitext(name)[1].lower() in COMPRESS_EXTENSIONS and len(data) >= COMPRESS_MIN_SIZE:
+                for extra in _write_compressed(path, data):
+                    stats["compressed"] += 1
+                    stats["gzip_bytes" if extra.endswith(".gz") else "brotli_bytes"] += os.path.getsize(extra)
+    with open(os.path.join(tmp_dir, MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+
+    # Подмена каталога целиком, чтобы работающий сервер не увидел полусобранную статику
+    old_dir = out_dir.rstrip("/") + ".old"
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if os.path.isdir(out_dir):
+        os.rename(out_dir, old_dir)
+    os.rename(tmp_dir, out_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    logger.info("static built: %s -> %s %s", src_dir, out_dir, stats)
+    return manifest
+
+
+def resolve_static_dir(src_dir: str = DEFAULT_SRC_DIR, out_dir: str = DEFAULT_OUT_DIR) -> str:
+    """Собранная статика, если она есть; иначе исходники (локальная разработка)"""
+    if os.getenv("STATIC_DIR"):
+        return os.environ["STATIC_DIR"]
+    if os.path.isfile(os.path.join(out_dir, MANIFEST_NAME)):
+        return out_dir
+    return src_dir
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles, отдающий предсжатые .br/.gz соседние файлы и долгий кэш для файлов с отпечатком"""
+
+    # В порядке предпочтения
+    ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200):
+        request_headers = Headers(scope=scope)
+        full_path = str(full_path)
+        media_type = mimetypes.guess_type(full_path)[0] or "text/plain"
+        headers = {
+            "Cache-Control": IMMUTABLE_CACHE_CONTROL if is_fingerprinted(full_path) else REVALIDATE_CACHE_CONTROL,
+        }
+
+        path = full_path
+        if os.path.splitext(full_path)[1].lower() in COMPRESS_EXTENSIONS:
+            headers["Vary"] = "Accept-Encoding"
+            accepted = accepted_encodings(request_headers.get("accept-encoding", ""))
+            for encoding, suffix in self.ENCODINGS:
+                if encoding not in accepted:
+                    continue
+                try:
+                    variant_stat = os.stat(full_path + suffix)
+                except FileNotFoundError:
+                    continue
+                path, stat_result = full_path + suffix, variant_stat
+                headers["Content-Encoding"] = encoding
+                break
+
+        response = FileResponse(path, status_code=status_code, stat_result=stat_result, media_type=media_type, headers=headers)
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Сборка статики мини-приложения")
+    parser.add_argument("--src", default=DEFAULT_SRC_DIR)
+    parser.add_argument("--out", default=DEFAULT_OUT_DIR)
+    args = parser.parse_args()
+    result = build_static(args.src, args.out)
+    print(f"{len(result)} fingerprinted assets, brotli={'yes' if brotli is not None else 'no'}")
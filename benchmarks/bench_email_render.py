@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк формирования письма о заказе: прежний f-string (HTML со стилями и текст собираются
+заново для каждого письма, без экранирования) против предкомпилированных шаблонов Jinja2.
+
+Меряется только рендер текста и HTML (--mime — вместе со сборкой MIME-сообщения).
+
+Запуск из корня проекта:
+    python benchmarks/bench_email_render.py [--emails 5000] [--items 6] [--mime]
+"""
+
+import argparse
+import os
+import sys
+import time
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.email_service import EmailService, create_template_env
+
+
+def legacy_render(webapp_url: str, restaurant_name: str, order_data: dict) -> tuple[str, str]:
+    """Как было до шаблонов (без экранирования)"""
+    order_items = []
+    total = 0
+    for item in order_data.get('items', []):
+        item_total = item['price'] * item['qty']
+        total += item_total
+        order_items.append(f"• {item['name']} × {item['qty']} - {item_total} ₽")
+    html_content = f"""
+        <!DOCTYPE html>
+        <html>
+        <head>
+            <meta charset="utf-8">
+            <style>
+                body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
+                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
+                .header {{ background: #3b82f6; color: white; padding: 20px; text-align: center; border-radius: 8px 8px 0 0; }}
+                .content {{ background: #f8fafc; padding: 20px; border-radius: 0 0 8px 8px; }}
+                .order-info {{ background: white; padding: 15px; margin: 15px 0; border-radius: 6px; border-left: 4px solid #3b82f6; }}
+                .order-items {{ background: white; padding: 15px; margin: 15px 0; border-radius: 6px; }}
+                .total {{ font-weight: bold; font-size: 18px; color: #1f2937; }}
+                .button {{ display: inline-block; background: #10b981; color: white; padding: 12px 24px; text-decoration: none; border-radius: 6px; margin-top: 15px; }}
+                .button:hover {{ background: #059669; }}
+                .footer {{ text-align: center; margin-top: 20px; color: #6b7280; font-size: 14px; }}
+            </style>
+        </head>
+        <body>
+            <div class="container">
+                <div class="header">
+                    <h1>Новый заказ #{order_data['id']}</h1>
+                    <p>Ресторан: {restaurant_name}</p>
+                </div>
+                <div class="content">
+                    <div class="order-info">
+                        <h3>Информация о заказе</h3>
+                        <p><strong>Статус:</strong> Обрабатывается оператором</p>
+                        <p><strong>Дата:</strong> {order_data.get('created_at', 'Не указана')}</p>
+                        <p><strong>Адрес доставки:</strong> {order_data.get('delivery_address', 'Не указан')}</p>
+                        <p><strong>Способ оплаты:</strong> {order_data.get('payment_method', 'Не указан')}</p>
+                    </div>
+                    <div class="order-items">
+                        <h3>Состав заказа</h3>
+                        {''.join(order_items)}
+                        <hr style="margin: 15px 0;">
+                        <p class="total">Итого: {total} ₽</p>
+                    </div>
+                    <div style="text-align: center;">
+                        <a href="{webapp_url}/static/ra.html?order_id={order_data['id']}&uid={order_data.get('user_id', '')}" class="button">
+                            Открыть заказ в боте
+                        </a>
+                    </div>
+                    <div class="footer">
+                        <p>Это автоматическое уведомление. Не отвечайте на это письмо.</p>
+                    </div>
+                </div>
+            </div>
+        </body>
+        </html>
+        """
+    text_content = f"""
+Новый заказ #{order_data['id']} - {restaurant_name}
+
+Статус: Обрабатывается оператором
+Дата: {order_data.get('created_at', 'Не указана')}
+Адрес доставки: {order_data.get('delivery_address', 'Не указан')}
+Способ оплаты: {order_data.get('payment_method', 'Не указан')}
+
+Состав заказа:
+{chr(10).join(order_items)}
+
+Итого: {total} ₽
+
+Для обработки заказа перейдите по ссылке:
+{webapp_url}/static/ra.html?order_id={order_data['id']}&uid={order_data.get('user_id', '')}
+
+Это автоматическое уведомление. Не отвечайте на это письмо.
+            """
+    return text_content, html_content
+
+
+def to_mime(text: str, html: str) -> MIMEMultipart:
+    msg = MIMEMultipart('alternative')
+    msg['Subject'] = "Новый заказ"
+    msg['To'] = "restaurant@example.com"
+    msg.attach(MIMEText(text, 'plain', 'utf-8'))
+    msg.attach(MIMEText(html, 'html', 'utf-8'))
+    return msg
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--emails', type=int, default=5000)
+    parser.add_argument('--items', type=int, default=6)
+    parser.add_argument('--mime', action='store_true', help="вместе со сборкой MIME-сообщения")
+    args = parser.parse_args()
+
+    service = EmailService()
+    order_data = {
+        'id': 12345, 'user_id': 777, 'created_at': '19.10.2026 19:45',
+        'delivery_address': 'ул. Ленина, д. 1, кв. 2 <подъезд 3>', 'payment_method': 'Картой курьеру',
+        'items': [{'name': f'Бургер "Двойной" & картофель {i}', 'qty': 1 + i % 3, 'price': 390 + i * 10} for i in range(args.items)],
+    }
+    text_tpl, html_tpl = service.templates["order.txt"], service.templates["order.html"]
+
+    def run_legacy():
+        text, html = legacy_render(service.webapp_url, "Кафе «Уют»", order_data)
+        return to_mime(text, html) if args.mime else html
+
+    def run_jinja():
+        if args.mime:
+            return service.build_order_notification("restaurant@example.com", "Кафе «Уют»", order_data)
+        ctx = service._order_context(order_data)
+        return text_tpl.render(restaurant_name="Кафе «Уют»", order=ctx), html_tpl.render(restaurant_name="Кафе «Уют»", order=ctx)
+
+    start = time.perf_counter()
+    env = create_template_env()
+    for name in ("order.html", "order.txt"):
+        env.get_template(name)
+    compile_ms = (time.perf_counter() - start) * 1000
+
+    print(f"emails={args.emails} items={args.items} mime={'yes' if args.mime else 'no'} "
+          f"(one-time template compile: {compile_ms:.1f} ms)")
+    for name, fn in (("legacy f-string", run_legacy), ("jinja2 precompiled", run_jinja)):
+        for _ in range(min(200, args.emails)):
+            fn()
+        start = time.perf_counter()
+        for _ in range(args.emails):
+            fn()
+        per_email = (time.perf_counter() - start) / args.emails * 1e6
+        print(f"{name:<20} {per_email:>8.1f} us/email")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк обработки загружаемых изображений: прежняя схема (полное декодирование,
+copy() + crop + LANCZOS от оригинала на каждый размер) против пирамиды с JPEG draft().
+
+- legacy  — прежняя реализация, все варианты сразу при загрузке;
+- pyramid — загрузка + все варианты через render_variant (полная стоимость);
+- upload  — только загрузка: варианты создаются лениво при первом запросе.
+
+Каждая реализация запускается в отдельном процессе, чтобы честно измерить пиковый RSS.
+Запуск из корня проекта:
+    python benchmarks/bench_image_processing.py [--runs 10] [--width 4032 --height 3024]
+"""
+
+import argparse
+import io
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from PIL import Image
+
+from app.services.image_processor import ImageProcessor
+
+
+def make_photo(width: int, height: int) -> bytes:
+    """Синтетическое «фото»: шум поверх градиента, чтобы JPEG был похож по размеру на снимок с телефона"""
+    gradient = Image.linear_gradient('L').resize((width, height))
+    noise = Image.effect_noise((width, height), 64)
+    image = Image.merge('RGB', (gradient, noise, Image.blend(gradient, noise, 0.5)))
+    buf = io.BytesIO()
+    image.save(buf, 'JPEG', quality=92)
+    return buf.getvalue()
+
+
+def legacy_process_image(image_data: bytes, base_dir: str) -> None:
+    """Прежняя реализация process_image (без записи URL'ов), для сравнения"""
+    image = Image.open(io.BytesIO(image_data))
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    for size_name, (width, height) in ImageProcessor.SIZES.items():
+        resized_image = image.copy()
+        img_ratio = resized_image.width / resized_image.height
+        target_ratio = width / height
+        if img_ratio > target_ratio:
+            new_width = int(resized_image.height * target_ratio)
+            left = (resized_image.width - new_width) // 2
+            resized_image = resized_image.crop((left, 0, left + new_width, resized_image.height))
+        else:
+            new_height = int(resized_image.width / target_ratio)
+            top = (resized_image.height - new_height) // 2
+            resized_image = resized_image.crop((0, top, resized_image.width, top + new_height))
+        final_image = resized_image.resize((width, height), Image.Resampling.LANCZOS)
+        os.makedirs(os.path.join(base_dir, size_name), exist_ok=True)
+        final_image.save(os.path.join(base_dir, size_name, 'x.jpg'), 'JPEG', quality=95, optimize=True)
+    os.makedirs(os.path.join(base_dir, 'original'), exist_ok=True)
+    image.save(os.path.join(base_dir, 'original', 'x_original.jpg'), 'JPEG', quality=95, optimize=True)
+
+
+def run_child(impl: str, photo_path: str, runs: int) -> None:
+    with open(photo_path, 'rb') as f:
+        data = f.read()
+    with tempfile.TemporaryDirectory() as base_dir:
+        started = time.perf_counter()
+        for _ in range(runs):
+            if impl == 'legacy':
+                legacy_process_image(data, base_dir)
+                continue
+            result = ImageProcessor.process_image(data, 'photo.jpg', base_dir=base_dir)
+            if impl == 'pyramid':
+                filename = os.path.basename(result['urls']['dish_card'])
+                for size_name in ImageProcessor.SIZES:
+                    ImageProcessor.render_variant(size_name, filename, base_dir)
+        elapsed = time.perf_counter() - started
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{elapsed / runs * 1000:.1f} {runs / elapsed:.2f} {peak_mb:.1f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--width', type=int, default=4032)
+    parser.add_argument('--height', type=int, default=3024)
+    parser.add_argument('--child', choices=['legacy', 'pyramid', 'upload'])
+    parser.add_argument('--photo')
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.photo, args.runs)
+        return
+
+    with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as f:
+        f.write(make_photo(args.width, args.height))
+        photo_path = f.name
+    try:
+        print(f"Фото {args.width}×{args.height} ({os.path.getsize(photo_path) / 1024:.0f} КБ), прогонов: {args.runs}")
+        print(f"{'реализация':<10} {'мс/фото':>9} {'фото/с':>8} {'пик RSS, МБ':>12}")
+        for impl in ('legacy', 'pyramid', 'upload'):
+            out = subprocess.run(
+                [sys.executable, __file__, '--child', impl, '--photo', photo_path, '--runs', str(args.runs)],
+                check=True, capture_output=True, text=True,
+            ).stdout.split()
+            ms, per_sec, peak = out
+            print(f"{impl:<10} {ms:>9} {per_sec:>8} {peak:>12}")
+    finally:
+        os.remove(photo_path)
+
+
+if __name__ == '__main__':
+    main()
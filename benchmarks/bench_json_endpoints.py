@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк больших списочных эндпоинтов: прежний путь (ORM-объекты, Pydantic-модель на строку,
+повторная валидация и сериализация FastAPI через stdlib json) против проекции колонок
+(select(...).mappings()) и FastJSONResponse (orjson).
+
+Данные — временная SQLite-база: ресторан с меню на 800 блюд, 2000 пользователей,
+300 заказов одного пользователя по 3 позиции. Запросы подаются прямо в ASGI-приложение.
+
+Запуск из корня проекта:
+    python benchmarks/bench_json_endpoints.py [--requests 50]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+_tmp_dir = tempfile.mkdtemp(prefix="bench_json_")
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp_dir}/bench.db"
+os.environ.setdefault("SUPER_ADMIN_IDS", "1")
+
+from fastapi import Depends, FastAPI
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app.db import Base, engine, get_db
+from app.models import (
+    Category as OCategory, Dish as ODish, Order as DBOrder, OrderItem as DBOrderItem,
+    Restaurant as ORestaurant, RestaurantAdmin as DBRestaurantAdmin, User as DBUser,
+)
+from app.responses import orjson
+from app.routers import admin, menu, orders, restaurants
+from app.routers.menu import Dish
+from app.routers.orders import Order, OrderItem, safe_dish_name
+from app.routers.restaurants import Restaurant, _compute_is_open
+
+DISHES = 800
+USERS = 2000
+ORDERS = 300
+
+
+def seed() -> None:
+    Base.metadata.create_all(engine)
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(insert(ORestaurant), [
+            {"id": rid, "name": f"Ресторан {rid}", "is_enabled": True, "rating_agg": 4.7, "delivery_min_sum": 500,
+             "delivery_fee": 150, "delivery_time_minutes": 45, "address": "ул. Ленина, 1", "phone": "+7 900 000-00-00",
+             "description": "Кухня на любой вкус", "image": "/uploads/restaurant_banner/x.jpg"}
+            for rid in range(1, 31)
+        ])
+        conn.execute(insert(OCategory), [{"id": c, "restaurant_id": 1, "name": f"Категория {c}", "sort": c} for c in range(1, 21)])
+        conn.execute(insert(ODish), [
+            {"id": d, "restaurant_id": 1, "category_id": d % 20 + 1, "name": f"Блюдо {d}", "price": 300 + d % 500,
+             "description": "Сочная котлета, соус, свежие овощи и немного специй", "image": f"/uploads/dish_card/{d:032x}.jpg",
+             "is_available": True, "has_options": d % 3 == 0}
+            for d in range(1, DISHES + 1)
+        ])
+        conn.execute(insert(DBUser), [
+            {"id": u, "username": f"user{u}", "name": f"Пользователь {u}", "phone": "+79000000000", "created_at": now, "last_activity": now}
+            for u in range(1, USERS + 1)
+        ])
+        conn.execute(insert(DBRestaurantAdmin), [{"user_id": u, "restaurant_id": u % 30 + 1} for u in range(2, 60)])
+        conn.execute(insert(DBOrder), [
+            {"id": o, "user_id": 1, "restaurant_id": 1, "status": "delivered", "total_price": 1500, "delivery_type": "delivery",
+             "address": "ул. Пушкина, 10", "phone": "+79000000000", "payment_method": "cash", "created_at": now}
+            for o in range(1, ORDERS + 1)
+        ])
+        conn.execute(insert(DBOrderItem), [
+            {"order_id": o, "dish_id": o * 3 % DISHES + i, "name": f"Блюдо {i}", "price": 500, "qty": 1, "chosen_options": [1, 2]}
+            for o in range(1, ORDERS + 1) for i in range(1, 4)
+        ])
+
+
+# --- прежние реализации (как были до проекции и FastJSONResponse) ---
+
+legacy = FastAPI()
+
+
+@legacy.get("/restaurants")
+async def legacy_list_restaurants(db: Session = Depends(get_db)) -> List[Restaurant]:
+    rows = db.query(ORestaurant).filter(ORestaurant.is_enabled == True).all()
+    return [Restaurant(
+        id=r.id, name=r.name, is_enabled=r.is_enabled, rating_agg=r.rating_agg, delivery_min_sum=r.delivery_min_sum,
+        delivery_fee=r.delivery_fee, delivery_time_minutes=r.delivery_time_minutes, address=r.address, phone=r.phone,
+        description=r.description, image=r.image, work_open_min=r.work_open_min, work_close_min=r.work_close_min,
+        is_open_now=_compute_is_open(r),
+    ) for r in rows]
+
+
+@legacy.get("/menu")
+async def legacy_menu(db: Session = Depends(get_db)) -> dict:
+    cats = db.query(OCategory).filter(OCategory.restaurant_id == 1).order_by(OCategory.sort.asc()).all()
+    dishes = db.query(ODish).filter(ODish.restaurant_id == 1).all()
+    return {
+        "categories": [{"id": c.id, "restaurant_id": c.restaurant_id, "name": c.name, "sort": c.sort} for c in cats],
+        "dishes": [{
+            "id": d.id, "restaurant_id": d.restaurant_id, "category_id": d.category_id, "name": d.name,
+            "description": d.description, "price": d.price, "image": d.image, "is_available": d.is_available,
+            "has_options": d.has_options,
+        } for d in dishes],
+    }
+
+
+@legacy.get("/dishes")
+async def legacy_dishes(db: Session = Depends(get_db)) -> List[Dish]:
+    rows = db.query(ODish).filter(ODish.restaurant_id == 1).all()
+    return [Dish(
+        id=d.id, restaurant_id=d.restaurant_id, category_id=d.category_id, name=d.name,
+        description=d.description, price=d.price, image=d.image, is_available=d.is_available, has_options=d.has_options
+    ) for d in rows]
+
+
+@legacy.get("/orders")
+async def legacy_orders(db: Session = Depends(get_db)) -> List[Order]:
+    result = []
+    for o in db.query(DBOrder).filter(DBOrder.user_id == 1).all():
+        items = db.query(DBOrderItem).filter(DBOrderItem.order_id == o.id).all()
+        result.append(Order(
+            id=o.id, user_id=o.user_id, restaurant_id=o.restaurant_id, status=o.status, total_price=o.total_price,
+            delivery_type=o.delivery_type, address=o.address, phone=o.phone, payment_method=o.payment_method,
+            client_comment=o.client_comment, staff_comment=o.staff_comment, accepted_at=o.accepted_at,
+            eta_minutes=o.eta_minutes, cutlery_count=o.cutlery_count or 0, created_at=o.created_at,
+            items=[OrderItem(dish_id=it.dish_id, name=safe_dish_name(it.name), price=it.price, qty=it.qty, chosen_options=it.chosen_options or []) for it in items],
+        ))
+    return result
+
+
+@legacy.get("/users")
+async def legacy_users(db: Session = Depends(get_db)) -> List[dict]:
+    admin_map = {r.user_id: r.restaurant_id for r in db.query(DBRestaurantAdmin).all()}
+    return [{
+        "id": u.id, "username": u.username, "is_blocked": u.is_blocked, "phone": u.phone, "name": u.name,
+        "address": u.address, "birth_date": u.birth_date, "created_at": u.created_at,
+        "restaurant_admin_of": admin_map.get(u.id),
+    } for u in db.query(DBUser).all()]
+
+
+# --- текущие эндпоинты ---
+
+current = FastAPI()
+current.include_router(restaurants.router, prefix="/api/restaurants")
+current.include_router(menu.router, prefix="/api")
+current.include_router(orders.router, prefix="/api/orders")
+current.include_router(admin.router, prefix="/api/admin")
+
+CASES = (
+    ("list_restaurants", "/restaurants", "/api/restaurants"),
+    ("menu (800 dishes)", "/menu", "/api/restaurants/1/menu"),
+    ("get_dishes_bulk", "/dishes", "/api/dishes?restaurant_id=1"),
+    ("list_orders", "/orders", "/api/orders?user_id=1"),
+    ("list_users", "/users", "/api/admin/users"),
+)
+
+
+async def call(app, url: str) -> int:
+    path, _, query = url.partition("?")
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": query.encode(),
+        "root_path": "", "server": ("testserver", 80), "client": ("127.0.0.1", 1),
+        "headers": [(b"host", b"testserver"), (b"x-telegram-user-id", b"1")],
+    }
+    size = 0
+    status = 0
+    body_sent = False
+    disconnected = asyncio.Event()
+
+    async def receive():
+        nonlocal body_sent
+        if not body_sent:
+            body_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal size, status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            size += len(message.get("body", b""))
+
+    await app(scope, receive, send)
+    disconnected.set()
+    assert status == 200, (url, status)
+    return size
+
+
+async def measure(app, url: str, requests: int) -> tuple[float, int]:
+    size = await call(app, url)
+    timings = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        await call(app, url)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return timings[len(timings) // 2] * 1000, size
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=50)
+    args = parser.parse_args()
+
+    seed()
+    print(f"orjson: {'yes' if orjson is not None else 'no (stdlib json fallback)'}")
+    print(f"{'endpoint':<20} {'legacy ms':>10} {'fast ms':>9} {'speedup':>8} {'bytes':>9}")
+    for name, legacy_url, current_url in CASES:
+        legacy_ms, _ = await measure(legacy, legacy_url, args.requests)
+        fast_ms, size = await measure(current, current_url, args.requests)
+        print(f"{name:<20} {legacy_ms:>10.2f} {fast_ms:>9.2f} {legacy_ms / fast_ms:>7.1f}x {size:>9}")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк стека middleware: прежний (LargeFileMiddleware на BaseHTTPMiddleware + GZipMiddleware
+с уровнем 9) против текущего (UploadLimitMiddleware + CompressionMiddleware на чистом ASGI).
+
+Запросы подаются прямо в ASGI-приложение, без сети и HTTP-клиента, поэтому в цифрах только
+накладные расходы middleware и сжатия. Ответы — JSON трёх размеров: маленький (статус заказа),
+средний (список ресторанов) и большой (меню на ~800 блюд).
+
+Запуск из корня проекта:
+    python benchmarks/bench_middleware.py [--requests 2000]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from app.middleware import CompressionMiddleware, UploadLimitMiddleware, MB
+
+
+def make_payloads() -> dict:
+    dish = lambda i: {
+        "id": i, "category_id": i % 20, "name": f"Блюдо {i}", "price": 300 + i % 500,
+        "description": "Сочная котлета, соус, свежие овощи и немного специй " * 2,
+        "image": f"/uploads/dish_card/{i:032x}.jpg", "is_available": True, "weight": "350 г",
+    }
+    return {
+        "small": {"status": "ok", "order_id": 123, "eta_minutes": 40},
+        "medium": [dict(dish(i), rating=4.8) for i in range(40)],
+        "large": [dish(i) for i in range(800)],
+    }
+
+
+def build_app(stack: str) -> FastAPI:
+    app = FastAPI()
+    payloads = make_payloads()
+    for name, payload in payloads.items():
+        app.add_api_route(f"/api/{name}", (lambda p: lambda: p)(payload), methods=["GET"])
+
+    if stack == "legacy":
+        class LargeFileMiddleware(BaseHTTPMiddleware):
+            async def dispatch(self, request: Request, call_next):
+                if request.url.path.startswith("/api/admin/broadcast-with-media"):
+                    request._body = await request.body()
+                return await call_next(request)
+
+        app.add_middleware(GZipMiddleware, minimum_size=1000)
+        app.add_middleware(LargeFileMiddleware)
+    elif stack == "asgi":
+        app.add_middleware(CompressionMiddleware, minimum_size=1000, exclude_paths=("/uploads/",))
+        app.add_middleware(UploadLimitMiddleware, max_bytes=21 * MB, path_limits={"/api/admin/broadcast-with-media": 50 * MB})
+    app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+    return app
+
+
+async def call(app, path: str) -> int:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"",
+        "root_path": "", "server": ("testserver", 80), "client": ("127.0.0.1", 1),
+        "headers": [(b"host", b"testserver"), (b"accept-encoding", b"gzip, deflate, br")],
+    }
+    size = 0
+    body_sent = False
+    disconnected = asyncio.Event()
+
+    async def receive():
+        # Как настоящий сервер: тело один раз, дальше ждём отключения клиента
+        nonlocal body_sent
+        if not body_sent:
+            body_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal size
+        if message["type"] == "http.response.body":
+            size += len(message.get("body", b""))
+
+    await app(scope, receive, send)
+    disconnected.set()
+    return size
+
+
+async def measure(app, path: str, requests: int) -> tuple[float, int]:
+    for _ in range(min(50, requests)):
+        size = await call(app, path)
+    start = time.perf_counter()
+    for _ in range(requests):
+        await call(app, path)
+    return (time.perf_counter() - start) / requests * 1e6, size
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    apps = {stack: build_app(stack) for stack in ("bare", "legacy", "asgi")}
+    print(f"{'payload':<8} {'stack':<7} {'us/req':>9} {'overhead us':>12} {'body bytes':>11}")
+    for name in ("small", "medium", "large"):
+        requests = args.requests if name != "large" else max(1, args.requests // 10)
+        bare_us, _ = await measure(apps["bare"], f"/api/{name}", requests)
+        for stack in ("bare", "legacy", "asgi"):
+            us, size = await measure(apps[stack], f"/api/{name}", requests)
+            print(f"{name:<8} {stack:<7} {us:>9.1f} {us - bare_us:>12.1f} {size:>11}")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
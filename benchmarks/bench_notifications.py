@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк уведомлений без настоящего Telegram и SMTP: задержка создания заказа (уведомления
+журналу, клиенту и админам ресторана идут в запросе) с доставкой письма ресторану и скорость
+рассылки /api/admin/broadcast.
+
+Заглушки Bot API (benchmarks/fake_telegram.py) и SMTP (benchmarks/fake_smtp.py) запускаются
+в отдельных потоках этого процесса, приложение подключается к ним через BOT_API_BASE и
+SMTP_SERVER; данные — временная SQLite-база, запросы подаются прямо в ASGI-приложение.
+Параметры заглушки Bot API — как у fake_telegram.py (--latency-ms, --flood-rate, --blocked-rate ...).
+
+Запуск из корня проекта:
+    python benchmarks/bench_notifications.py [--orders 200] [--order-concurrency 8] [--admins 3]
+        [--users 300] [--latency-ms 50] [--flood-rate 0.01] [--blocked-rate 0.02] [--scenarios orders,broadcast]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from fake_smtp import FakeSMTPServer
+from fake_telegram import add_arguments, config_from_args, create_fake_bot_api, start_in_thread
+
+SUPER_ADMIN_ID = 1
+ADMIN_ID_BASE = 900000
+RESTAURANT_ID = 1
+
+
+def pct(values: list[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] * 1000 if values else 0.0
+
+
+def setup_env(bot_api_port: int, smtp_port: int) -> None:
+    """Окружение до импорта приложения: модули читают его при импорте"""
+    tmp_dir = tempfile.mkdtemp(prefix="bench_notify_")
+    os.environ.update(
+        DATABASE_URL=f"sqlite:///{tmp_dir}/bench.db",
+        BOT_TOKEN="42:BENCH",
+        BOT_API_BASE=f"http://127.0.0.1:{bot_api_port}",
+        ADMIN_CHANNEL_ID="-1001",
+        SUPER_ADMIN_IDS=str(SUPER_ADMIN_ID),
+        WEBAPP_URL="http://bench.local",
+        SMTP_SERVER="127.0.0.1",
+        SMTP_PORT=str(smtp_port),
+        SMTP_STARTTLS="0",
+        SMTP_AUTH="0",
+        FROM_EMAIL="bot@bench.local",
+        EMAIL_DIGEST_TICK_SECONDS="0",
+    )
+
+
+def seed(users: int, admins: int) -> None:
+    from sqlalchemy import insert, update
+
+    from app.db import engine
+    from app.db_init import init_db_and_seed
+    from app.models import Restaurant, RestaurantAdmin, User
+
+    init_db_and_seed()
+    now = datetime.utcnow()
+    admin_ids = [ADMIN_ID_BASE + i for i in range(admins)]
+    with engine.begin() as conn:
+        conn.execute(insert(User), [
+            {"id": uid, "username": f"user{uid}", "created_at": now, "last_activity": now}
+            for uid in [*range(1, users + 1), *admin_ids]
+        ])
+        conn.execute(insert(RestaurantAdmin), [{"user_id": uid, "restaurant_id": RESTAURANT_ID} for uid in admin_ids])
+        conn.execute(update(Restaurant).where(Restaurant.id == RESTAURANT_ID).values(email="orders@bench.local"))
+
+
+async def bench_orders(client, fake, smtp: FakeSMTPServer, orders: int, concurrency: int, users: int) -> None:
+    from app.db import get_session
+    from app.email_service import email_service
+    from app.models import Dish
+
+    with get_session() as db:
+        dish_id = db.query(Dish.id).filter(Dish.restaurant_id == RESTAURANT_ID).first()[0]
+
+    fake.stats.clear()
+    smtp.received.clear()
+    latencies: list[float] = []
+    started_at: dict[int, float] = {}
+    errors = 0
+    queue: asyncio.Queue = asyncio.Queue()
+    for i in range(orders):
+        queue.put_nowait(i)
+
+    async def worker() -> None:
+        nonlocal errors
+        while not queue.empty():
+            i = queue.get_nowait()
+            payload = {
+                "user_id": 2 + i % max(1, users - 1), "restaurant_id": RESTAURANT_ID, "total_price": 0,
+                "delivery_type": "delivery", "address": "ул. Ленина, 1", "phone": "+79000000000",
+                "payment_method": "cash", "items": [{"dish_id": dish_id, "name": "", "price": 0, "qty": 3 + i % 3}],
+            }
+            start, start_mono = time.perf_counter(), time.monotonic()
+            r = await client.post("/api/orders", json=payload)
+            latencies.append(time.perf_counter() - start)
+            if r.status_code != 200:
+                errors += 1
+                continue
+            started_at[r.json()["id"]] = start_mono
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    await email_service.dispatcher.drain(timeout=120)
+
+    email_delays = []
+    for mail in smtp.received:
+        order_id = int(mail.subject.split("#", 1)[1].split()[0]) if "#" in mail.subject else None
+        if order_id in started_at:
+            email_delays.append(mail.received_at - started_at[order_id])
+    print(f"orders: {orders} (concurrency {concurrency}) in {elapsed:.2f}s, {orders / elapsed:.1f} orders/s, errors {errors}")
+    print(f"  create_order latency ms: p50={pct(latencies, 0.5):.1f} p95={pct(latencies, 0.95):.1f} "
+          f"p99={pct(latencies, 0.99):.1f} max={pct(latencies, 1.0):.1f}")
+    # письмо ставится в очередь посреди запроса, поэтому отсчёт — от начала запроса
+    print(f"  email received after request start ms: p50={pct(email_delays, 0.5):.1f} p95={pct(email_delays, 0.95):.1f} "
+          f"({len(email_delays)}/{len(started_at)} emails, smtp {dict(smtp.stats)})")
+    print(f"  bot api calls: {dict(sorted(fake.stats.items()))}")
+
+
+async def bench_broadcast(client, fake) -> None:
+    fake.stats.clear()
+    start = time.perf_counter()
+    r = await client.post(
+        "/api/admin/broadcast",
+        json={"text": "Скидка 20% на всё меню сегодня!", "target_type": "all"},
+        headers={"X-Telegram-User-Id": str(SUPER_ADMIN_ID)},
+    )
+    elapsed = time.perf_counter() - start
+    body = r.json()
+    total = body.get("total", 0)
+    print(f"broadcast: {total} recipients in {elapsed:.2f}s, {total / elapsed:.1f} msg/s; "
+          f"sent={body.get('sent')} failed={body.get('failed')}")
+    print(f"  bot api calls: {dict(sorted(fake.stats.items()))}")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--orders', type=int, default=200)
+    parser.add_argument('--order-concurrency', type=int, default=8)
+    parser.add_argument('--admins', type=int, default=3, help="админов у ресторана заказов")
+    parser.add_argument('--users', type=int, default=300, help="пользователей (получателей рассылки)")
+    parser.add_argument('--smtp-latency-ms', type=float, default=30.0)
+    parser.add_argument('--scenarios', default="orders,broadcast")
+    add_arguments(parser)
+    args = parser.parse_args()
+    scenarios = {s.strip() for s in args.scenarios.split(",")}
+
+    fake_app = create_fake_bot_api(config_from_args(args))
+    _, bot_api_port = start_in_thread(fake_app)
+    smtp = FakeSMTPServer(latency_ms=args.smtp_latency_ms)
+    smtp_port = smtp.start_in_thread()
+    setup_env(bot_api_port, smtp_port)
+    seed(args.users, args.admins)
+
+    import httpx
+    from app.main import app
+    print(f"fake Bot API: latency {args.latency_ms}±{args.jitter_ms} ms, global rps {args.global_rps or '-'}, "
+          f"flood {args.flood_rate}, blocked {args.blocked_rate}; smtp latency {args.smtp_latency_ms} ms")
+
+    fake = fake_app.state.fake
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://api.local", timeout=600) as client:
+        if "orders" in scenarios:
+            await bench_orders(client, fake, smtp, args.orders, args.order_concurrency, args.users)
+        if "broadcast" in scenarios:
+            await bench_broadcast(client, fake)
+
+    from app.services.telegram import bot, close_telegram_http
+    await close_telegram_http()
+    if bot is not None:
+        await bot.session.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Локальный SMTP-сервер для нагрузочных тестов писем: принимает письма и никуда их не отправляет.
+
+Понимает EHLO/HELO, AUTH PLAIN/LOGIN (любой логин), MAIL, RCPT, DATA, RSET, NOOP, QUIT; STARTTLS нет,
+поэтому приложение запускается с SMTP_STARTTLS=0 (и SMTP_AUTH=0, если авторизация не нужна).
+- --latency-ms — задержка ответа на DATA (время «доставки» письма);
+- --fail-rate — доля писем с временной ошибкой 451, --reject-rate — с постоянной 550.
+Принятые письма (время, получатели, тема) хранятся в памяти; с --verbose печатаются.
+
+    python benchmarks/fake_smtp.py --port 8025 --latency-ms 30
+    SMTP_SERVER=localhost SMTP_PORT=8025 SMTP_STARTTLS=0 SMTP_AUTH=0 python -m uvicorn app.main:app
+"""
+
+import argparse
+import asyncio
+import random
+import threading
+import time
+from collections import Counter, deque
+from dataclasses import dataclass
+from email import message_from_bytes
+from email.header import decode_header, make_header
+
+
+@dataclass
+class ReceivedEmail:
+    received_at: float  # time.monotonic()
+    mail_from: str
+    rcpt_to: list[str]
+    subject: str
+    size: int
+
+
+class FakeSMTPServer:
+    def __init__(self, latency_ms: float = 0.0, fail_rate: float = 0.0, reject_rate: float = 0.0,
+                 keep: int = 100000, verbose: bool = False, seed: int = 1) -> None:
+        self.latency_ms = latency_ms
+        self.fail_rate = fail_rate
+        self.reject_rate = reject_rate
+        self.verbose = verbose
+        self.random = random.Random(seed)
+        self.received: deque[ReceivedEmail] = deque(maxlen=keep)
+        self.stats: Counter = Counter()
+        self._server: asyncio.AbstractServer | None = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> int:
+        self._server = await asyncio.start_server(self._session, host, port)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def _session(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.stats["connections"] += 1
+
+        async def reply(line: str) -> None:
+            writer.write(line.encode() + b"\r\n")
+            await writer.drain()
+
+        mail_from, rcpt_to = "", []
+        try:
+            await reply("220 fake-smtp ready")
+            while True:
+                raw = await reader.readline()
+                if not raw:
+                    break
+                line = raw.decode("utf-8", "replace").rstrip("\r\n")
+                verb, _, arg = line.partition(" ")
+                verb = verb.upper()
+                if verb == "EHLO":
+                    writer.write(b"250-fake-smtp\r\n250-8BITMIME\r\n250-SIZE 52428800\r\n")
+                    await reply("250 AUTH PLAIN LOGIN")
+                elif verb == "HELO":
+                    await reply("250 fake-smtp")
+                elif verb == "AUTH":
+                    mechanism, _, initial = arg.partition(" ")
+                    if mechanism.upper() == "LOGIN":
+                        # логин (если не пришёл сразу) и пароль — по запросу 334
+                        for _ in range(1 if initial else 2):
+                            await reply("334 VXNlcm5hbWU6")
+                            await reader.readline()
+                    elif not initial:
+                        await reply("334 ")
+                        await reader.readline()
+                    await reply("235 2.7.0 Authentication successful")
+                elif verb == "MAIL":
+                    mail_from, rcpt_to = arg.partition(":")[2].strip(), []
+                    await reply("250 OK")
+                elif verb == "RCPT":
+                    rcpt_to.append(arg.partition(":")[2].strip().strip("<>"))
+                    await reply("250 OK")
+                elif verb == "DATA":
+                    await reply("354 End data with <CR><LF>.<CR><LF>")
+                    data = await self._read_data(reader)
+                    await reply(await self._accept(mail_from, rcpt_to, data))
+                    mail_from, rcpt_to = "", []
+                elif verb == "RSET":
+                    mail_from, rcpt_to = "", []
+                    await reply("250 OK")
+                elif verb == "NOOP":
+                    await reply("250 OK")
+                elif verb == "QUIT":
+                    await reply("221 Bye")
+                    break
+                else:
+                    await reply("502 Command not implemented")
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_data(reader: asyncio.StreamReader) -> bytes:
+        lines = []
+        while True:
+            line = await reader.readline()
+            if not line or line in (b".\r\n", b".\n"):
+                break
+            lines.append(line[1:] if line.startswith(b"..") else line)
+        return b"".join(lines)
+
+    async def _accept(self, mail_from: str, rcpt_to: list[str], data: bytes) -> str:
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+        roll = self.random.random()
+        if roll < self.reject_rate:
+            self.stats["rejected"] += 1
+            return "550 5.7.1 Message rejected"
+        if roll < self.reject_rate + self.fail_rate:
+            self.stats["temp_failed"] += 1
+            return "451 4.3.0 Try again later"
+        subject = str(make_header(decode_header(message_from_bytes(data).get("Subject", ""))))
+        self.received.append(ReceivedEmail(time.monotonic(), mail_from, list(rcpt_to), subject, len(data)))
+        self.stats["accepted"] += 1
+        if self.verbose:
+            print(f"mail {mail_from} -> {', '.join(rcpt_to)}: {subject} ({len(data)} bytes)")
+        return "250 OK: queued"
+
+    def start_in_thread(self, host: str = "127.0.0.1", port: int = 0) -> int:
+        """Запускает сервер в отдельном потоке (своём event loop); возвращает порт"""
+        started: dict = {}
+        ready = threading.Event()
+
+        async def run() -> None:
+            started["port"] = await self.start(host, port)
+            ready.set()
+            await self._server.serve_forever()
+
+        threading.Thread(target=asyncio.run, args=(run(),), daemon=True).start()
+        if not ready.wait(10):
+            raise RuntimeError("fake SMTP server failed to start")
+        return started["port"]
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8025)
+    parser.add_argument('--latency-ms', type=float, default=0.0)
+    parser.add_argument('--fail-rate', type=float, default=0.0, help="доля писем с ответом 451")
+    parser.add_argument('--reject-rate', type=float, default=0.0, help="доля писем с ответом 550")
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+    server = FakeSMTPServer(args.latency_ms, args.fail_rate, args.reject_rate, verbose=args.verbose)
+    port = await server.start(args.host, args.port)
+    print(f"fake SMTP on {args.host}:{port} (SMTP_STARTTLS=0)")
+    await server._server.serve_forever()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Локальная заглушка Telegram Bot API для нагрузочных тестов уведомлений и рассылок.
+
+Отвечает на /bot<token>/<method> как Telegram: sendMessage, sendPhoto, sendVideo, getChat, getMe
+(остальные методы — {"ok": true, "result": true}), с настраиваемой задержкой и ошибками:
+- --latency-ms/--jitter-ms — задержка ответа;
+- --global-rps — больше стольких запросов в секунду получают 429 с retry_after (0 — без лимита);
+- --flood-rate — доля случайных 429 с parameters.retry_after = --retry-after;
+- --blocked-rate — доля пользователей, «заблокировавших бота» (403); выбор по chat_id постоянный;
+  --blocked-chats — явный список таких chat_id.
+GET /stats — счётчики по методам и кодам ответа, POST /stats/reset — обнулить.
+
+Приложение и бот подключаются через BOT_API_BASE:
+    python benchmarks/fake_telegram.py --port 8081 --latency-ms 50 --blocked-rate 0.02
+    BOT_API_BASE=http://localhost:8081 python -m uvicorn app.main:app
+"""
+
+import argparse
+import asyncio
+import hashlib
+import itertools
+import random
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+@dataclass
+class FakeBotApiConfig:
+    latency_ms: float = 50.0
+    jitter_ms: float = 10.0
+    global_rps: float = 0.0
+    flood_rate: float = 0.0
+    retry_after: int = 1
+    blocked_rate: float = 0.0
+    blocked_chats: set[str] = field(default_factory=set)
+    seed: int = 1
+
+
+class FakeBotApi:
+    def __init__(self, config: FakeBotApiConfig) -> None:
+        self.config = config
+        self.random = random.Random(config.seed)
+        self.stats: Counter = Counter()
+        self._message_ids = itertools.count(1)
+        self._window_start = 0.0
+        self._window_count = 0
+
+    def _is_blocked(self, chat_id: str) -> bool:
+        if chat_id in self.config.blocked_chats:
+            return True
+        if not self.config.blocked_rate or chat_id.startswith("@") or chat_id.startswith("-"):
+            return False
+        digest = hashlib.sha1(chat_id.encode()).digest()
+        return int.from_bytes(digest[:4], "big") / 2 ** 32 < self.config.blocked_rate
+
+    def _over_global_limit(self) -> bool:
+        if not self.config.global_rps:
+            return False
+        now = time.monotonic()
+        if now - self._window_start >= 1.0:
+            self._window_start, self._window_count = now, 0
+        self._window_count += 1
+        return self._window_count > self.config.global_rps
+
+    def _message(self, chat_id: str, params: dict) -> dict:
+        message_id = next(self._message_ids)
+        chat = {"id": int(chat_id) if chat_id.lstrip("-").isdigit() else 0, "type": "private"}
+        result = {"message_id": message_id, "date": int(time.time()), "chat": chat}
+        if "text" in params:
+            result["text"] = params["text"]
+        if "caption" in params:
+            result["caption"] = params["caption"]
+        return result
+
+    def _result(self, method: str, params: dict):
+        chat_id = str(params.get("chat_id", ""))
+        if method == "getMe":
+            return {"id": 42, "is_bot": True, "first_name": "Fake Bot", "username": "fake_bot"}
+        if method == "getChat":
+            if chat_id.startswith("@"):
+                # username -> постоянный «id» пользователя
+                uid = int.from_bytes(hashlib.sha1(chat_id.encode()).digest()[:4], "big")
+                return {"id": uid, "type": "private", "username": chat_id[1:]}
+            return {"id": int(chat_id or 0), "type": "private", "username": f"user{chat_id}"}
+        if method == "sendMessage":
+            return self._message(chat_id, params)
+        if method == "sendPhoto":
+            result = self._message(chat_id, params)
+            file_id = f"fake-photo-{result['message_id']}"
+            result["photo"] = [{"file_id": file_id, "file_unique_id": file_id, "width": 1280, "height": 720}]
+            return result
+        if method == "sendVideo":
+            result = self._message(chat_id, params)
+            file_id = f"fake-video-{result['message_id']}"
+            result["video"] = {"file_id": file_id, "file_unique_id": file_id, "width": 1280, "height": 720, "duration": 10}
+            return result
+        return True
+
+    async def handle(self, method: str, params: dict) -> tuple[int, dict]:
+        config = self.config
+        if config.latency_ms or config.jitter_ms:
+            await asyncio.sleep(max(0.0, config.latency_ms + self.random.uniform(-config.jitter_ms, config.jitter_ms)) / 1000)
+        chat_id = str(params.get("chat_id", ""))
+        if method.startswith("send") and (self._over_global_limit() or self.random.random() < config.flood_rate):
+            return 429, {
+                "ok": False, "error_code": 429,
+                "description": f"Too Many Requests: retry after {config.retry_after}",
+                "parameters": {"retry_after": config.retry_after},
+            }
+        if method.startswith("send") and self._is_blocked(chat_id):
+            return 403, {"ok": False, "error_code": 403, "description": "Forbidden: bot was blocked by the user"}
+        return 200, {"ok": True, "result": self._result(method, params)}
+
+
+def create_fake_bot_api(config: FakeBotApiConfig) -> FastAPI:
+    fake = FakeBotApi(config)
+    app = FastAPI()
+    app.state.fake = fake
+
+    @app.get("/stats")
+    async def stats() -> dict:
+        return dict(fake.stats)
+
+    @app.post("/stats/reset")
+    async def reset_stats() -> dict:
+        fake.stats.clear()
+        return {"ok": True}
+
+    @app.api_route("/bot{token}/{method}", methods=["GET", "POST"])
+    async def bot_method(token: str, method: str, request: Request) -> JSONResponse:
+        params = dict(request.query_params)
+        content_type = request.headers.get("content-type", "")
+        if content_type.startswith("application/json"):
+            params.update(await request.json())
+        elif content_type.startswith(("multipart/form-data", "application/x-www-form-urlencoded")):
+            # aiogram шлёт все методы формой; файлы (InputFile) просто читаются
+            form = await request.form()
+            params.update({k: v for k, v in form.items() if isinstance(v, str)})
+        status, body = await fake.handle(method, params)
+        fake.stats[f"{method} {status}"] += 1
+        return JSONResponse(body, status_code=status)
+
+    return app
+
+
+def start_in_thread(app: FastAPI, host: str = "127.0.0.1", port: int = 0) -> tuple[uvicorn.Server, int]:
+    """Запускает приложение в отдельном потоке (своём event loop); возвращает (server, порт)"""
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning", access_log=False))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError("fake server failed to start")
+        time.sleep(0.01)
+    return server, server.servers[0].sockets[0].getsockname()[1]
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument('--latency-ms', type=float, default=50.0)
+    parser.add_argument('--jitter-ms', type=float, default=10.0)
+    parser.add_argument('--global-rps', type=float, default=0.0, help="лимит запросов в секунду (0 — без лимита)")
+    parser.add_argument('--flood-rate', type=float, default=0.0, help="доля случайных ответов 429")
+    parser.add_argument('--retry-after', type=int, default=1)
+    parser.add_argument('--blocked-rate', type=float, default=0.0, help="доля пользователей, заблокировавших бота (403)")
+    parser.add_argument('--blocked-chats', default="", help="chat_id через запятую, всегда 403")
+    parser.add_argument('--seed', type=int, default=1)
+
+
+def config_from_args(args: argparse.Namespace) -> FakeBotApiConfig:
+    return FakeBotApiConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        global_rps=args.global_rps,
+        flood_rate=args.flood_rate,
+        retry_after=args.retry_after,
+        blocked_rate=args.blocked_rate,
+        blocked_chats={c.strip() for c in args.blocked_chats.split(",") if c.strip()},
+        seed=args.seed,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8081)
+    add_arguments(parser)
+    args = parser.parse_args()
+    print(f"fake Bot API on http://{args.host}:{args.port} (BOT_API_BASE)")
+    uvicorn.run(create_fake_bot_api(config_from_args(args)), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == '__main__':
+    main()
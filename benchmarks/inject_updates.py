@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Нагрузочная подача апдейтов в webhook бота (локальный «Telegram»).
+
+Генерирует текстовые сообщения от --chats разных пользователей и отправляет их POST-запросами
+с секретным заголовком, как это делает Telegram, --concurrency запросов одновременно.
+
+- По умолчанию всё в одном процессе: webhook-приложение (bot/webhook.py) вызывается через
+  ASGI без сети, методы Bot API (sendMessage и т.п.) отвечаются локально с задержкой
+  --api-latency мс, API приложения — в режиме BOT_API_MODE=inprocess на временной SQLite.
+- С --url апдейты отправляются на уже запущенный webhook (BOT_MODE=webhook python bot/main.py),
+  секрет — --secret или BOT_WEBHOOK_SECRET.
+
+Запуск из корня проекта:
+    python benchmarks/inject_updates.py [--updates 2000] [--chats 200] [--concurrency 64]
+    python benchmarks/inject_updates.py --url http://localhost:8081/telegram/webhook --secret ...
+"""
+
+import argparse
+import asyncio
+import itertools
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import httpx
+
+DEFAULT_TEXTS = "/id,/status,/start"
+
+
+def make_update(update_id: int, chat_id: int, text: str) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(datetime.now().timestamp()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": f"Load {chat_id}", "username": f"load{chat_id}"},
+            "text": text,
+        },
+    }
+
+
+def setup_inprocess(api_latency: float, concurrency: int, storage: str):
+    """Webhook-приложение с локальным Bot API; возвращает (app, processor, счётчик вызовов Bot API)"""
+    tmp_dir = tempfile.mkdtemp(prefix="bench_webhook_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmp_dir}/bench.db"
+    os.environ["BOT_API_MODE"] = "inprocess"
+    os.environ["BOT_FSM_STORAGE"] = storage
+    os.environ.setdefault("BOT_WEBHOOK_SECRET", "load-test-secret")
+    os.environ["BOT_WEBHOOK_CONCURRENCY"] = str(concurrency)
+    os.environ.setdefault("BOT_TOKEN", "42:LOAD-TEST")
+    os.chdir(tmp_dir)
+    os.makedirs("uploads", exist_ok=True)
+
+    from aiogram import Bot
+    from aiogram.client.session.base import BaseSession
+    from aiogram.methods import GetMe
+    from aiogram.types import Message, User
+    from fastapi import FastAPI
+
+    from app.db_init import init_db_and_seed
+    from bot.main import dp
+    from bot.webhook import setup_webhook
+
+    init_db_and_seed()
+    calls = {"count": 0}
+
+    class LocalBotApiSession(BaseSession):
+        """Отвечает на методы Bot API без сети; для send*-методов — фиктивным сообщением"""
+
+        async def make_request(self, bot, method, timeout=None):
+            calls["count"] += 1
+            if api_latency:
+                await asyncio.sleep(api_latency / 1000)
+            if isinstance(method, GetMe):
+                return User(id=42, is_bot=True, first_name="bench")
+            if method.__returning__ is Message:
+                chat_id = getattr(method, "chat_id", 0)
+                return Message(message_id=calls["count"], date=datetime.now(), chat={"id": chat_id, "type": "private"},
+                               text=getattr(method, "text", None))
+            return True
+
+        async def stream_content(self, *args, **kwargs):
+            yield b""
+
+        async def close(self) -> None:
+            pass
+
+    bot = Bot(os.environ["BOT_TOKEN"], session=LocalBotApiSession())
+    app = FastAPI()
+    processor = setup_webhook(app, dp, bot)
+    return app, processor, calls
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--updates', type=int, default=2000)
+    parser.add_argument('--chats', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=64, help="одновременных POST-запросов")
+    parser.add_argument('--texts', default=DEFAULT_TEXTS, help="тексты сообщений через запятую, по кругу")
+    parser.add_argument('--url', help="адрес запущенного webhook; без него — всё в одном процессе")
+    parser.add_argument('--secret', default=os.getenv("BOT_WEBHOOK_SECRET", ""))
+    parser.add_argument('--api-latency', type=float, default=20.0, help="задержка ответа локального Bot API, мс")
+    parser.add_argument('--workers', type=int, default=32, help="BOT_WEBHOOK_CONCURRENCY для режима в одном процессе")
+    parser.add_argument('--storage', choices=("db", "memory"), default="db")
+    args = parser.parse_args()
+
+    processor = calls = None
+    if args.url:
+        client = httpx.AsyncClient(timeout=30, limits=httpx.Limits(max_connections=args.concurrency))
+        url = args.url
+        secret = args.secret
+    else:
+        app, processor, calls = setup_inprocess(args.api_latency, args.workers, args.storage)
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bot.local", timeout=30)
+        from bot.webhook import BOT_WEBHOOK_PATH, BOT_WEBHOOK_SECRET
+        url = BOT_WEBHOOK_PATH
+        secret = BOT_WEBHOOK_SECRET
+
+    texts = [t.strip() for t in args.texts.split(",") if t.strip()]
+    updates = [
+        make_update(i, 100000 + i % args.chats, text)
+        for i, text in zip(range(1, args.updates + 1), itertools.cycle(texts))
+    ]
+    queue: asyncio.Queue = asyncio.Queue()
+    for update in updates:
+        queue.put_nowait(update)
+
+    ack_times: list[float] = []
+    errors = 0
+
+    async def sender() -> None:
+        nonlocal errors
+        while not queue.empty():
+            update = queue.get_nowait()
+            start = time.perf_counter()
+            r = await client.post(url, json=update, headers={"X-Telegram-Bot-Api-Secret-Token": secret})
+            ack_times.append(time.perf_counter() - start)
+            if r.status_code != 200:
+                errors += 1
+
+    # неверный секрет должен отклоняться
+    r = await client.post(url, json=updates[0], headers={"X-Telegram-Bot-Api-Secret-Token": "wrong"})
+    print(f"wrong secret -> {r.status_code}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(sender() for _ in range(args.concurrency)))
+    acked = time.perf_counter() - start
+    if processor is not None:
+        await processor.drain(timeout=600)
+    total = time.perf_counter() - start
+    await client.aclose()
+
+    ack_times.sort()
+    pct = lambda p: ack_times[min(len(ack_times) - 1, int(len(ack_times) * p))] * 1000
+    print(f"updates: {len(updates)}  chats: {args.chats}  senders: {args.concurrency}  http errors: {errors}")
+    print(f"ack latency ms: p50={pct(0.5):.2f} p95={pct(0.95):.2f} p99={pct(0.99):.2f}")
+    print(f"all acked in {acked:.2f}s ({len(updates) / acked:.0f} updates/s)")
+    if processor is not None:
+        print(f"all processed in {total:.2f}s ({len(updates) / total:.0f} updates/s); "
+              f"processed={processor.processed} failed={processor.failed} bot api calls={calls['count']} "
+              f"workers={processor.concurrency} api latency={args.api_latency}ms")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,160 @@
+"""
+Клиент API для бота: один пул соединений на процесс и типизированные методы
+для эндпоинтов, которые использует бот.
+
+Режимы (BOT_API_MODE):
+- http (по умолчанию) — запросы к INTERNAL_API_URL через общий httpx.AsyncClient;
+- inprocess — бот и API в одном окружении (общая БД): частые операции (активация
+  пользователя, роли) идут прямо в сервисный слой, остальное — в приложение FastAPI
+  через ASGITransport, без сети и сокетов.
+"""
+
+import asyncio
+import os
+
+import httpx
+
+from app.logging_config import get_logger
+
+
+INTERNAL_API_URL = os.getenv("INTERNAL_API_URL", os.getenv("WEBAPP_URL", "https://empty-hounds-cover.loca.lt"))
+BOT_API_MODE = os.getenv("BOT_API_MODE", "http").strip().lower()
+BOT_API_TIMEOUT = float(os.getenv("BOT_API_TIMEOUT", "3"))
+BOT_API_MAX_CONNECTIONS = int(os.getenv("BOT_API_MAX_CONNECTIONS", "50"))
+
+logger = get_logger("bot-api")
+
+
+class ApiError(Exception):
+    """Ответ API с кодом не 2xx"""
+
+    def __init__(self, status_code: int, detail: str) -> None:
+        super().__init__(f"{status_code}: {detail}")
+        self.status_code = status_code
+        self.detail = detail
+
+
+class BotApiClient:
+    def __init__(self, base_url: str = INTERNAL_API_URL, mode: str = BOT_API_MODE, timeout: float = BOT_API_TIMEOUT) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.inprocess = mode == "inprocess"
+        self.timeout = timeout
+        self._client: httpx.AsyncClient | None = None
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        """Общий клиент внутреннего API; только для путей API — в режиме inprocess любой URL уходит в приложение"""
+        if self._client is None:
+            if self.inprocess:
+                from app.main import app as api_app
+                # ошибки приложения — ответом 500, как по сети, а не исключением из транспорта
+                transport = httpx.ASGITransport(app=api_app, raise_app_exceptions=False)
+                base_url = "http://api.internal"
+            else:
+                transport = None
+                base_url = self.base_url
+            self._client = httpx.AsyncClient(
+                base_url=base_url,
+                transport=transport,
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=BOT_API_MAX_CONNECTIONS, max_keepalive_connections=BOT_API_MAX_CONNECTIONS // 2),
+            )
+            logger.info("bot api client: mode=%s base_url=%s", "inprocess" if self.inprocess else "http", base_url)
+        return self._client
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _request(self, method: str, path: str, actor_id: int | None = None, **kwargs):
+        headers = kwargs.pop("headers", {})
+        if actor_id is not None:
+            headers["X-Telegram-User-Id"] = str(actor_id)
+        r = await self.http.request(method, path, headers=headers, **kwargs)
+        if r.status_code >= 400:
+            raise ApiError(r.status_code, r.text)
+        return r.json() if r.content else None
+
+    # --- пользователи ---
+
+    async def activate_user(self, user_id: int, username: str | None = None) -> dict:
+        """Регистрирует/отмечает активность пользователя; {"id", "is_blocked"}"""
+        if self.inprocess:
+            from app.store import ensure_user
+            u = await asyncio.to_thread(ensure_user, user_id, username)
+            return {"id": u.id, "is_blocked": u.is_blocked}
+        data = await self._request("POST", "/api/users/activate", user_id, json={"username": username} if username else {})
+        return (data or {}).get("user", {})
+
+    async def user_roles(self, user_id: int) -> dict:
+        """{"user_id", "is_blocked", "is_super_admin", "restaurant_id"}; только чтение (кэш — bot/role_cache.py)"""
+        if self.inprocess:
+            from app.db import SessionLocal
+            from app.services.roles import get_user_roles
+
+            def load() -> dict:
+                with SessionLocal() as db:
+                    return get_user_roles(db, user_id)
+            return await asyncio.to_thread(load)
+        return await self._request("GET", f"/api/users/{user_id}/roles", user_id)
+
+    async def resolve_username(self, username: str, actor_id: int | None = None) -> int | None:
+        data = await self._request("GET", "/api/admin/users/resolve-username", actor_id, params={"username": username})
+        return int(data["user_id"]) if data and data.get("user_id") else None
+
+    async def bind_restaurant_admin(self, actor_id: int, user_id: int, restaurant_id: int) -> dict:
+        return await self._request("POST", "/api/admin/users/bind-admin", actor_id, params={"user_id": user_id, "restaurant_id": restaurant_id})
+
+    # --- рестораны (главный админ) ---
+
+    async def admin_restaurants(self, actor_id: int) -> list[dict]:
+        return await self._request("GET", "/api/admin/restaurants", actor_id) or []
+
+    async def create_restaurant(self, actor_id: int, name: str) -> dict:
+        return await self._request("POST", "/api/admin/restaurants", actor_id, json={"name": name}) or {}
+
+    async def update_restaurant(self, actor_id: int, restaurant_id: int, **fields) -> dict:
+        return await self._request("PATCH", f"/api/admin/restaurants/{restaurant_id}", actor_id, json=fields)
+
+    async def delete_restaurant(self, actor_id: int, restaurant_id: int) -> dict:
+        return await self._request("DELETE", f"/api/admin/restaurants/{restaurant_id}", actor_id)
+
+    async def broadcast(self, actor_id: int, payload: dict) -> dict:
+        return await self._request("POST", "/api/admin/broadcast-telegram", actor_id, json=payload) or {}
+
+    async def external_link_token(self) -> str | None:
+        data = await self._request("POST", "/api/auth/external-link", timeout=5)
+        return (data or {}).get("token")
+
+    # --- статистика ---
+
+    async def stats(self, actor_id: int) -> dict:
+        return await self._request("GET", "/api/admin/stats", actor_id) or {}
+
+    async def stats_users(self, actor_id: int) -> dict:
+        return await self._request("GET", "/api/admin/stats/users", actor_id) or {}
+
+    async def stats_restaurants(self, actor_id: int) -> list[dict]:
+        data = await self._request("GET", "/api/admin/stats/restaurants", actor_id) or {}
+        return data.get("restaurants", [])
+
+    async def stats_by_restaurant(self, actor_id: int, restaurant_id: int) -> dict:
+        return await self._request("GET", "/api/admin/stats/by-restaurant", actor_id, params={"restaurant_id": restaurant_id}) or {}
+
+    # --- админ ресторана ---
+
+    async def ra_restaurant(self, user_id: int) -> dict:
+        return await self._request("GET", "/api/ra/restaurant", user_id) or {}
+
+    async def ra_update_restaurant(self, user_id: int, **fields) -> dict:
+        return await self._request("PATCH", "/api/ra/restaurant", user_id, json=fields)
+
+    async def ra_set_restaurant_status(self, user_id: int, enabled: bool) -> dict:
+        return await self._request("POST", "/api/ra/restaurant/status", user_id, params={"enabled": "true" if enabled else "false"})
+
+    async def ra_orders(self, user_id: int) -> list[dict]:
+        return await self._request("GET", "/api/ra/orders", user_id) or []
+
+
+api = BotApiClient()
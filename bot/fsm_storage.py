@@ -0,0 +1,133 @@
+"""
+Хранилище FSM (состояний диалогов) бота.
+
+DatabaseStorage держит состояние и данные диалога в таблице bot_fsm_states общей БД, поэтому
+незавершённые диалоги (добавление ресторана, рассылка, ввод полей) переживают перезапуск,
+а апдейты одного чата может обработать любой из нескольких процессов бота.
+
+BOT_FSM_STORAGE:
+- db (по умолчанию) — DatabaseStorage;
+- memory — aiogram MemoryStorage (тесты, локальная отладка; всё теряется при перезапуске).
+"""
+
+import asyncio
+import json
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from app.db import SessionLocal, begin_transaction, engine
+from app.logging_config import get_logger
+from app.models import BotFSMState
+
+
+BOT_FSM_STORAGE = os.getenv("BOT_FSM_STORAGE", "db").strip().lower()
+# Брошенные диалоги старше этого срока удаляются
+BOT_FSM_TTL = timedelta(days=int(os.getenv("BOT_FSM_TTL_DAYS", "7")))
+_PURGE_INTERVAL_SECONDS = 3600
+
+logger = get_logger("bot-fsm")
+
+
+def storage_key_str(key: StorageKey) -> str:
+    parts = [str(key.bot_id), str(key.chat_id), str(key.user_id)]
+    if key.thread_id:
+        parts.append(str(key.thread_id))
+    if key.business_connection_id:
+        parts.append(key.business_connection_id)
+    parts.append(key.destiny)
+    return ":".join(parts)
+
+
+def _state_str(state: StateType) -> Optional[str]:
+    return state.state if isinstance(state, State) else state
+
+
+class DatabaseStorage(BaseStorage):
+    """FSM-хранилище в таблице bot_fsm_states; запросы к БД выполняются в потоках"""
+
+    def __init__(self) -> None:
+        self._table_ready = False
+        self._last_purge = 0.0
+
+    def _prepare(self) -> None:
+        if not self._table_ready:
+            # бот может стартовать раньше API, который создаёт остальные таблицы
+            BotFSMState.__table__.create(bind=engine, checkfirst=True)
+            self._table_ready = True
+        now = time.monotonic()
+        if now - self._last_purge >= _PURGE_INTERVAL_SECONDS:
+            self._last_purge = now
+            with SessionLocal() as db:
+                deleted = db.query(BotFSMState).filter(
+                    BotFSMState.updated_at < datetime.utcnow() - BOT_FSM_TTL
+                ).delete(synchronize_session=False)
+                db.commit()
+            if deleted:
+                logger.info("purged %s stale fsm records", deleted)
+
+    def _load(self, key: str) -> tuple[Optional[str], Dict[str, Any]]:
+        self._prepare()
+        with SessionLocal() as db:
+            row = db.get(BotFSMState, key)
+            if row is None:
+                return None, {}
+            return row.state, json.loads(row.data) if row.data else {}
+
+    def _save(self, key: str, **fields: Any) -> Dict[str, Any]:
+        """Меняет state и/или data (update= — слияние с текущими данными) одной транзакцией"""
+        self._prepare()
+        with SessionLocal() as db:
+            begin_transaction(db)
+            row = db.get(BotFSMState, key)
+            state = row.state if row is not None else None
+            data = json.loads(row.data) if row is not None and row.data else {}
+            if "state" in fields:
+                state = fields["state"]
+            if "data" in fields:
+                data = dict(fields["data"])
+            if "update" in fields:
+                data.update(fields["update"])
+            if state is None and not data:
+                if row is not None:
+                    db.delete(row)
+            else:
+                if row is None:
+                    row = BotFSMState(key=key)
+                    db.add(row)
+                row.state = state
+                row.data = json.dumps(data, ensure_ascii=False) if data else None
+                row.updated_at = datetime.utcnow()
+            db.commit()
+            return data
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        await asyncio.to_thread(self._save, storage_key_str(key), state=_state_str(state))
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        state, _ = await asyncio.to_thread(self._load, storage_key_str(key))
+        return state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        await asyncio.to_thread(self._save, storage_key_str(key), data=data)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        _, data = await asyncio.to_thread(self._load, storage_key_str(key))
+        return data
+
+    async def update_data(self, key: StorageKey, data: Dict[str, Any]) -> Dict[str, Any]:
+        return (await asyncio.to_thread(self._save, storage_key_str(key), update=data)).copy()
+
+    async def close(self) -> None:
+        pass
+
+
+def create_storage() -> BaseStorage:
+    if BOT_FSM_STORAGE == "memory":
+        return MemoryStorage()
+    return DatabaseStorage()
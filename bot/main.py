@@ -1,60 +1,67 @@
 import asyncio
 import os
-from aiogram import Bot, Dispatcher, types, F
-from aiogram.filters import CommandStart, Command
+from dataclasses import replace
+from aiogram import Dispatcher, types, F
+from aiogram.filters import CommandStart, Command, StateFilter
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.fsm.storage.memory import SimpleEventIsolation
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, WebAppInfo, ReplyKeyboardMarkup, KeyboardButton
 from dotenv import load_dotenv
-import httpx
 from app.logging_config import get_logger
 
 load_dotenv()
 
+from bot.api_client import api, ApiError  # после load_dotenv: клиент читает окружение при импорте
+from bot.fsm_storage import create_storage
+from bot.role_cache import roles
+from app.services.telegram import bot_api_url, close_telegram_http, create_bot, telegram_http
+
 
 BOT_TOKEN = os.getenv("BOT_TOKEN", "")
+# polling — один процесс опрашивает getUpdates; webhook — см. bot/webhook.py
+BOT_MODE = os.getenv("BOT_MODE", "polling").strip().lower()
 # Публичный URL (для web_app ссылок)
 PUBLIC_WEBAPP_URL = os.getenv("PUBLIC_WEBAPP_URL", os.getenv("WEBAPP_URL", "https://empty-hounds-cover.loca.lt"))
-# Внутренний URL API (для http-запросов из docker-сети)
-INTERNAL_API_URL = os.getenv("INTERNAL_API_URL", os.getenv("WEBAPP_URL", "https://empty-hounds-cover.loca.lt"))
 SUPER_ADMIN_IDS = {int(x) for x in os.getenv("SUPER_ADMIN_IDS", "").split(",") if x.strip().isdigit()}
 ADMIN_CODE = os.getenv("ADMIN_CODE", "").strip()
 
-# Простая сессия для авторизованных по кодовому слову
-ADMIN_SESSIONS: set[int] = set()
+# Сессия для авторизованных по кодовому слову хранится в FSM-хранилище под отдельным destiny,
+# чтобы отмена/завершение диалогов (state.clear()) её не сбрасывали
+ADMIN_SESSION_DESTINY = "admin_session"
+
+
+class AddRestaurant(StatesGroup):
+    username = State()  # ждём @username или ID админа ресторана
+    name = State()  # ждём название ресторана
+    form = State()  # старая форма с кнопками "@Имя аккаунта" / "Название ресторана"
+
+
+class Broadcast(StatesGroup):
+    content = State()  # ждём текст/фото/видео рассылки, затем подтверждение
+
+
+class PendingInput(StatesGroup):
+    value = State()  # ждём текстовое значение; что именно — в data["kind"]
 
 
 logger = get_logger("tg-bot")
-dp = Dispatcher()
+# Апдейты одного чата обрабатываются по очереди, разных чатов — параллельно (важно для webhook)
+dp = Dispatcher(storage=create_storage(), events_isolation=SimpleEventIsolation())
 
 
 @dp.message(CommandStart())
 async def start(message: types.Message) -> None:
-    # deny access for blocked users
-    try:
-        async with httpx.AsyncClient(timeout=3) as client:
-            r = await client.get(INTERNAL_API_URL + f"/api/admin/users?t=0")
-            # lightweight check endpoint could be better; we fallback to activate and read flag below
-    except Exception:
-        pass
-    # register user as active and save username
+    # register user as active and save username; deny access for blocked users
     username = message.from_user.username
     
     try:
-        async with httpx.AsyncClient(timeout=3) as client:
-            # Активируем пользователя и сохраняем username
-            r = await client.post(
-                INTERNAL_API_URL + "/api/users/activate", 
-                headers={"X-Telegram-User-Id": str(message.from_user.id)},
-                json={"username": username} if username else {}
-            )
-            logger.info("activate_user id=%s username=%s status=%s", message.from_user.id, username, getattr(r, "status_code", "n/a"))
-            # If API returns user blocked flag
-            try:
-                data = r.json()
-                if isinstance(data, dict) and data.get("user", {}).get("is_blocked"):
-                    await message.answer("Ошибка доступа")
-                    return
-            except Exception:
-                pass
+        # Активируем пользователя и сохраняем username
+        user = await api.activate_user(message.from_user.id, username)
+        logger.info("activate_user id=%s username=%s", message.from_user.id, username)
+        if user.get("is_blocked"):
+            await message.answer("Ошибка доступа")
+            return
     except Exception as exc:
         logger.exception("activate_user failed: %s", repr(exc))
         # Продолжаем выполнение даже если активация не удалась
@@ -72,34 +79,23 @@ async def start(message: types.Message) -> None:
 
 
 async def _is_restaurant_admin(user_id: int) -> bool:
-    try:
-        async with httpx.AsyncClient(timeout=3) as client:
-            url = INTERNAL_API_URL + "/api/ra/me"
-            r = await client.get(url, headers={"X-Telegram-User-Id": str(user_id)})
-            return r.status_code == 200
-    except Exception:
-        return False
+    return (await roles.get(user_id)).get("restaurant_id") is not None
 
 
 async def _is_user_blocked(user_id: int) -> bool:
     """Проверяет, заблокирован ли пользователь"""
-    try:
-        async with httpx.AsyncClient(timeout=3) as client:
-            url = INTERNAL_API_URL + "/api/users/activate"
-            r = await client.post(url, headers={"X-Telegram-User-Id": str(user_id), "Content-Type": "application/json"}, json={})
-            if r.status_code == 200:
-                data = r.json()
-                return data.get("user", {}).get("is_blocked", False)
-            return False
-    except Exception:
-        return False
+    return bool((await roles.get(user_id)).get("is_blocked"))
+
 
+def _admin_session(state: FSMContext) -> FSMContext:
+    return FSMContext(storage=state.storage, key=replace(state.key, destiny=ADMIN_SESSION_DESTINY))
 
-async def _check_admin_access(user_id: int) -> bool:
+
+async def _check_admin_access(user_id: int, state: FSMContext) -> bool:
     """Проверяет доступ к админке (не заблокирован и в сессии)"""
     if await _is_user_blocked(user_id):
         return False
-    return user_id in ADMIN_SESSIONS
+    return bool((await _admin_session(state).get_data()).get("granted"))
 
 
 def _inline_kb(rows: list[list[tuple[str, str]]]) -> InlineKeyboardMarkup:
@@ -230,7 +226,7 @@ STATS_KB = InlineKeyboardMarkup(
 
 
 @dp.message(lambda message: message.text and os.getenv("ADMIN_CODE", "").strip() and message.text.strip() == os.getenv("ADMIN_CODE", "").strip())
-async def handle_admin_code(message: types.Message) -> None:
+async def handle_admin_code(message: types.Message, state: FSMContext) -> None:
     user_id = message.from_user.id
     
     # Проверяем, заблокирован ли пользователь
@@ -239,7 +235,7 @@ async def handle_admin_code(message: types.Message) -> None:
         return
     
     # Вход в главную админку по кодовому слову
-    ADMIN_SESSIONS.add(user_id)
+    await _admin_session(state).set_data({"granted": True})
     await message.answer("Код принят. Доступ в админку открыт.", reply_markup=ADMIN_INLINE_KB)
 
 
@@ -262,12 +258,7 @@ CONFIRM_KB = ReplyKeyboardMarkup(
     keyboard=[[KeyboardButton(text="Да"), KeyboardButton(text="Нет")]], resize_keyboard=True
 )
 
-ADD_FLOW: dict[int, dict] = {}
-BROADCAST_FLOW: dict[int, dict] = {}
-DEL_FLOW: dict[int, dict] = {}
-
-
-async def _resolve_user_id_by_username(username: str) -> int | None:
+async def _resolve_user_id_by_username(username: str, actor_id: int | None = None) -> int | None:
     uname = username.strip()
     if not uname:
         return None
@@ -279,27 +270,19 @@ async def _resolve_user_id_by_username(username: str) -> int | None:
             # Resolving username
     
     try:
-        async with httpx.AsyncClient(timeout=3) as client:
-            # Сначала пробуем getChat
-            resp = await client.get(f"https://api.telegram.org/bot{BOT_TOKEN}/getChat", params={"chat_id": uname})
-            data = resp.json()
-            # getChat response
-            
-            if data.get("ok") and data.get("result", {}).get("id"):
-                user_id = int(data["result"]["id"])
-                # Found user_id via getChat
-                return user_id
-            
-            # Если getChat не сработал, пробуем через API нашего приложения
-            # getChat failed, trying internal API
-            api_resp = await client.get(f"{INTERNAL_API_URL}/api/admin/users/resolve-username?username={uname}")
-            api_data = api_resp.json()
-            # Internal API response
-            
-            if api_resp.status_code == 200 and api_data.get("user_id"):
-                user_id = int(api_data["user_id"])
-                # Found user_id via internal API
-                return user_id
+        # Сначала пробуем getChat — своим клиентом Bot API: api.http в режиме inprocess ходит в наше приложение
+        resp = await telegram_http().get(bot_api_url("getChat"), params={"chat_id": uname})
+        data = resp.json()
+        # getChat response
+        
+        if data.get("ok") and data.get("result", {}).get("id"):
+            user_id = int(data["result"]["id"])
+            # Found user_id via getChat
+            return user_id
+        
+        # Если getChat не сработал, пробуем через API нашего приложения
+        # getChat failed, trying internal API
+        return await api.resolve_username(uname, actor_id)
                 
     except Exception as e:
         # Exception in _resolve_user_id_by_username
@@ -311,12 +294,12 @@ async def _resolve_user_id_by_username(username: str) -> int | None:
 
 # Обработчики Inline кнопок админки
 @dp.callback_query(F.data == "admin_add_restaurant")
-async def admin_add_restaurant_callback(callback: types.CallbackQuery) -> None:
+async def admin_add_restaurant_callback(callback: types.CallbackQuery, state: FSMContext) -> None:
     uid = callback.from_user.id
     print(f"DEBUG: admin_add_restaurant_callback called for user {uid}")
     
     # Проверяем доступ к админке
-    if not await _check_admin_access(uid):
+    if not await _check_admin_access(uid, state):
         await callback.answer("Доступ запрещен.")
         return
     
@@ -325,8 +308,8 @@ async def admin_add_restaurant_callback(callback: types.CallbackQuery) -> None:
         return
     
     # Инициализируем процесс добавления ресторана
-    ADD_FLOW[uid] = {"username": None, "name": None, "step": "username"}
-    print(f"DEBUG: ADD_FLOW initialized for user {uid}: {ADD_FLOW[uid]}")
+    await state.set_state(AddRestaurant.username)
+    await state.set_data({"username": None, "name": None})
     
     await callback.message.answer("Введите username админа в формате @username или ID пользователя")
     await callback.answer()
@@ -339,32 +322,27 @@ async def admin_delete_restaurant_callback(callback: types.CallbackQuery) -> Non
         return
     
     try:
-        async with httpx.AsyncClient(timeout=3) as client:
-            response = await client.get(INTERNAL_API_URL + "/api/admin/restaurants", headers={"X-Telegram-User-Id": str(uid)})
-            if response.status_code == 200:
-                restaurants = response.json()
-                
-                if not restaurants:
-                    await callback.message.answer("❌ Нет ресторанов для удаления.")
-                    return
-                
-                # Создаем клавиатуру со списком ресторанов
-                keyboard = []
-                for restaurant in restaurants:
-                    status = "✅" if restaurant.get("is_enabled") else "❌"
-                    keyboard.append([
-                        InlineKeyboardButton(
-                            text=f"{status} {restaurant['name']}", 
-                            callback_data=f"delete_rest_{restaurant['id']}"
-                        )
-                    ])
-                
-                keyboard.append([InlineKeyboardButton(text="← Назад", callback_data="admin_back")])
-                
-                kb = InlineKeyboardMarkup(inline_keyboard=keyboard)
-                await callback.message.edit_text("🗑️ Выберите ресторан для удаления:", reply_markup=kb)
-            else:
-                await callback.message.answer("❌ Ошибка получения списка ресторанов")
+        restaurants = await api.admin_restaurants(uid)
+        
+        if not restaurants:
+            await callback.message.answer("❌ Нет ресторанов для удаления.")
+            return
+        
+        # Создаем клавиатуру со списком ресторанов
+        keyboard = []
+        for restaurant in restaurants:
+            status = "✅" if restaurant.get("is_enabled") else "❌"
+            keyboard.append([
+                InlineKeyboardButton(
+                    text=f"{status} {restaurant['name']}", 
+                    callback_data=f"delete_rest_{restaurant['id']}"
+                )
+            ])
+        
+        keyboard.append([InlineKeyboardButton(text="← Назад", callback_data="admin_back")])
+        
+        kb = InlineKeyboardMarkup(inline_keyboard=keyboard)
+        await callback.message.edit_text("🗑️ Выберите ресторан для удаления:", reply_markup=kb)
     except Exception as e:
         logger.exception("Error getting restaurants for delete")
         await callback.message.answer("❌ Ошибка получения списка ресторанов")
@@ -379,32 +357,27 @@ async def admin_enable_restaurant_callback(callback: types.CallbackQuery) -> Non
         return
     
     try:
-        async with httpx.AsyncClient(timeout=3) as client:
-            response = await client.get(INTERNAL_API_URL + "/api/admin/restaurants", headers={"X-Telegram-User-Id": str(uid)})
-            if response.status_code == 200:
-                restaurants = response.json()
-                disabled_restaurants = [r for r in restaurants if not r.get("is_enabled")]
-                
-                if not disabled_restaurants:
-                    await callback.message.answer("❌ Нет выключенных ресторанов для включения.")
-                    return
-                
-                # Создаем клавиатуру со списком выключенных ресторанов
-                keyboard = []
-                for restaurant in disabled_restaurants:
-                    keyboard.append([
-                        InlineKeyboardButton(
-                            text=f"✅ {restaurant['name']}", 
-                            callback_data=f"enable_rest_{restaurant['id']}"
-                        )
-                    ])
-                
-                keyboard.append([InlineKeyboardButton(text="← Назад", callback_data="admin_back")])
-                
-                kb = InlineKeyboardMarkup(inline_keyboard=keyboard)
-                await callback.message.edit_text("🔓 Выберите ресторан для включения:", reply_markup=kb)
-            else:
-                await callback.message.answer("❌ Ошибка получения списка ресторанов")
+        restaurants = await api.admin_restaurants(uid)
+        disabled_restaurants = [r for r in restaurants if not r.get("is_enabled")]
+        
+        if not disabled_restaurants:
+            await callback.message.answer("❌ Нет выключенных ресторанов для включения.")
+            return
+        
+        # Создаем клавиатуру со списком выключенных ресторанов
+        keyboard = []
+        for restaurant in disabled_restaurants:
+            keyboard.append([
+                InlineKeyboardButton(
+                    text=f"✅ {restaurant['name']}", 
+                    callback_data=f"enable_rest_{restaurant['id']}"
+                )
+            ])
+        
+        keyboard.append([InlineKeyboardButton(text="← Назад", callback_data="admin_back")])
+        
+        kb = InlineKeyboardMarkup(inline_keyboard=keyboard)
+        await callback.message.edit_text("🔓 Выберите ресторан для включения:", reply_markup=kb)
     except Exception as e:
         logger.exception("Error getting restaurants for enable")
         await callback.message.answer("❌ Ошибка получения списка ресторанов")
@@ -419,32 +392,27 @@ async def admin_disable_restaurant_callback(callback: types.CallbackQuery) -> No
         return
     
     try:
-        async with httpx.AsyncClient(timeout=3) as client:
-            response = await client.get(INTERNAL_API_URL + "/api/admin/restaurants", headers={"X-Telegram-User-Id": str(uid)})
-            if response.status_code == 200:
-                restaurants = response.json()
-                enabled_restaurants = [r for r in restaurants if r.get("is_enabled")]
-                
-                if not enabled_restaurants:
-                    await callback.message.answer("❌ Нет включенных ресторанов для выключения.")
-                    return
-                
-                # Создаем клавиатуру со списком включенных ресторанов
-                keyboard = []
-                for restaurant in enabled_restaurants:
-                    keyboard.append([
-                        InlineKeyboardButton(
-                            text=f"❌ {restaurant['name']}", 
-                            callback_data=f"disable_rest_{restaurant['id']}"
-                        )
-                    ])
-                
-                keyboard.append([InlineKeyboardButton(text="← Назад", callback_data="admin_back")])
-                
-                kb = InlineKeyboardMarkup(inline_keyboard=keyboard)
-                await callback.message.edit_text("🔒 Выберите ресторан для выключения:", reply_markup=kb)
-            else:
-                await callback.message.answer("❌ Ошибка получения списка ресторанов")
+        restaurants = await api.admin_restaurants(uid)
+        enabled_restaurants = [r for r in restaurants if r.get("is_enabled")]
+        
+        if not enabled_restaurants:
+            await callback.message.answer("❌ Нет включенных ресторанов для выключения.")
+            return
+        
+        # Создаем клавиатуру со списком включенных ресторанов
+        keyboard = []
+        for restaurant in enabled_restaurants:
+            keyboard.append([
+                InlineKeyboardButton(
+                    text=f"❌ {restaurant['name']}", 
+                    callback_data=f"disable_rest_{restaurant['id']}"
+                )
+            ])
+        
+        keyboard.append([InlineKeyboardButton(text="← Назад", callback_data="admin_back")])
+        
+        kb = InlineKeyboardMarkup(inline_keyboard=keyboard)
+        await callback.message.edit_text("🔒 Выберите ресторан для выключения:", reply_markup=kb)
     except Exception as e:
         logger.exception("Error getting restaurants for disable")
         await callback.message.answer("❌ Ошибка получения списка ресторанов")
@@ -508,7 +476,7 @@ async def open_ra_profile(cb: types.CallbackQuery) -> None:
 # ===========================================
 
 @dp.callback_query(F.data.in_(["broadcast_all", "broadcast_clients", "broadcast_restaurants"]))
-async def broadcast_target_callback(callback: types.CallbackQuery) -> None:
+async def broadcast_target_callback(callback: types.CallbackQuery, state: FSMContext) -> None:
     uid = callback.from_user.id
     if uid not in SUPER_ADMIN_IDS:
         await callback.answer("Нет доступа к рассылке.")
@@ -516,18 +484,14 @@ async def broadcast_target_callback(callback: types.CallbackQuery) -> None:
     
     target_type = callback.data.replace("broadcast_", "")
     
-    # Инициализируем состояние рассылки
-    # Очищаем PENDING_INPUT и ADD_FLOW, чтобы избежать конфликтов
-    PENDING_INPUT.pop(uid, None)
-    ADD_FLOW.pop(uid, None)
-    
-    BROADCAST_FLOW[uid] = {
+    # Инициализируем состояние рассылки (заменяет незавершённые ввод и добавление ресторана)
+    await state.set_state(Broadcast.content)
+    await state.set_data({
         "target_type": target_type,
         "text": None,
         "media_type": None,
         "media_file_id": None,
-        "step": "text"
-    }
+    })
     
     target_names = {
         "all": "всем пользователям",
@@ -546,18 +510,16 @@ async def broadcast_target_callback(callback: types.CallbackQuery) -> None:
 
 
 @dp.callback_query(F.data == "admin_web")
-async def admin_web_callback(callback: types.CallbackQuery) -> None:
+async def admin_web_callback(callback: types.CallbackQuery, state: FSMContext) -> None:
     uid = callback.from_user.id
     
     # Проверяем доступ к админке
-    if not await _check_admin_access(uid):
+    if not await _check_admin_access(uid, state):
         await callback.answer("Доступ запрещен.")
         return
     token = None
     try:
-        async with httpx.AsyncClient(timeout=3) as client:
-            r = await client.post(INTERNAL_API_URL + "/api/auth/external-link", timeout=5)
-            token = r.json().get("token") if r.status_code == 200 else None
+        token = await api.external_link_token()
     except Exception:
         token = None
     url = PUBLIC_WEBAPP_URL + f"/static/admin.html?uid={uid}&ngrok-skip-browser-warning=1&v=5"
@@ -577,98 +539,81 @@ async def admin_menu_callback(callback: types.CallbackQuery) -> None:
 
 # Старые обработчики для совместимости
 @dp.message(F.text == "Добавить ресторан")
-async def ga_add_restaurant(message: types.Message) -> None:
+async def ga_add_restaurant(message: types.Message, state: FSMContext) -> None:
     uid = message.from_user.id
     if uid not in SUPER_ADMIN_IDS:
         await message.answer("Нет доступа к операции добавления ресторана.")
         return
-    ADD_FLOW[uid] = {"username": None, "name": None}
+    await state.set_state(AddRestaurant.form)
+    await state.set_data({"username": None, "name": None})
     await message.answer("Укажите данные для нового ресторана:", reply_markup=ADD_REST_KB)
 
 
-@dp.message(F.text == "@Имя аккаунта")
-async def ga_ask_username(message: types.Message) -> None:
+@dp.message(AddRestaurant.form, F.text == "@Имя аккаунта")
+async def ga_ask_username(message: types.Message, state: FSMContext) -> None:
     uid = message.from_user.id
-    if uid not in SUPER_ADMIN_IDS or uid not in ADD_FLOW:
+    if uid not in SUPER_ADMIN_IDS:
         return
-    PENDING_INPUT[uid] = {"kind": "ga_add_username"}
+    await state.update_data(kind="ga_add_username")
     await message.answer("Введите @username аккаунта ресторатора (пример: @user)")
 
 
-@dp.message(F.text == "Название ресторана")
-async def ga_ask_rest_name(message: types.Message) -> None:
+@dp.message(AddRestaurant.form, F.text == "Название ресторана")
+async def ga_ask_rest_name(message: types.Message, state: FSMContext) -> None:
     uid = message.from_user.id
-    if uid not in SUPER_ADMIN_IDS or uid not in ADD_FLOW:
+    if uid not in SUPER_ADMIN_IDS:
         return
-    PENDING_INPUT[uid] = {"kind": "ga_add_name"}
+    await state.update_data(kind="ga_add_name")
     await message.answer("Введите название ресторана")
 
 
-async def _try_finish_add_restaurant(uid: int, message: types.Message) -> None:
-    state = ADD_FLOW.get(uid)
-    if not state or not state.get("username") or not state.get("name"):
+async def _try_finish_add_restaurant(uid: int, message: types.Message, state: FSMContext) -> None:
+    flow = await state.get_data()
+    if not flow.get("username") or not flow.get("name"):
         return
     # resolve user id
-    admin_user_id = await _resolve_user_id_by_username(state["username"])
+    admin_user_id = await _resolve_user_id_by_username(flow["username"], uid)
     if not admin_user_id:
         await message.answer("Не удалось определить аккаунт по username. Проверьте написание и попробуйте снова.")
         return
     # create restaurant (disabled by default)
     try:
-        async with httpx.AsyncClient(timeout=3) as client:
-            r = await client.post(PUBLIC_WEBAPP_URL + "/api/admin/restaurants", json={"name": state["name"]}, headers={"X-Telegram-User-Id": str(uid)})
-            if r.status_code != 200:
-                await message.answer("Ошибка создания ресторана.")
-                return
-            new_id = (r.json() or {}).get("id")
-            if not new_id:
-                await message.answer("Не удалось получить id нового ресторана.")
-                return
-            # bind admin
-            await client.post(PUBLIC_WEBAPP_URL + f"/api/admin/users/bind-admin?user_id={admin_user_id}&restaurant_id={new_id}", headers={"X-Telegram-User-Id": str(uid)})
-        await message.answer(f"Ресторан \"{state['name']}\" добавлен.", reply_markup=ADMIN_INLINE_KB)
-        ADD_FLOW.pop(uid, None)
+        try:
+            new_id = (await api.create_restaurant(uid, flow["name"])).get("id")
+        except ApiError:
+            await message.answer("Ошибка создания ресторана.")
+            return
+        if not new_id:
+            await message.answer("Не удалось получить id нового ресторана.")
+            return
+        # bind admin
+        await api.bind_restaurant_admin(uid, admin_user_id, new_id)
+        await message.answer(f"Ресторан \"{flow['name']}\" добавлен.", reply_markup=ADMIN_INLINE_KB)
+        await state.clear()
     except Exception:
         await message.answer("Сбой при добавлении ресторана. Попробуйте снова.")
 
 
 @dp.message(F.text == "Отмена")
-async def ga_cancel(message: types.Message) -> None:
-    uid = message.from_user.id
-    ADD_FLOW.pop(uid, None)
-    DEL_FLOW.pop(uid, None)
-    PENDING_INPUT.pop(uid, None)
+async def ga_cancel(message: types.Message, state: FSMContext) -> None:
+    await state.clear()
     await message.answer("Действие отменено.", reply_markup=ADMIN_INLINE_KB)
 
 
 # Обработчик для отмены добавления ресторана
-@dp.message(lambda message: message.text and message.text.lower() == "отмена" and message.from_user.id in ADD_FLOW)
-async def cancel_add_restaurant(message: types.Message) -> None:
-    uid = message.from_user.id
-    
-    # Не обрабатываем, если пользователь в состоянии рассылки
-    if uid in BROADCAST_FLOW:
-        print(f"DEBUG: User {uid} in BROADCAST_FLOW, skipping ADD_FLOW cancel handler")
-        return
-    
-    if uid in ADD_FLOW:
-        ADD_FLOW.pop(uid, None)
-        await message.answer("❌ Добавление ресторана отменено.")
+@dp.message(StateFilter(AddRestaurant), lambda message: message.text and message.text.lower() == "отмена")
+async def cancel_add_restaurant(message: types.Message, state: FSMContext) -> None:
+    await state.clear()
+    await message.answer("❌ Добавление ресторана отменено.")
 
 
 # Обработчик для диалога добавления ресторана
-@dp.message(lambda message: message.from_user.id in ADD_FLOW and ADD_FLOW[message.from_user.id].get("step") == "username" and message.text and (message.text.startswith("@") or message.text.isdigit()))
-async def handle_add_restaurant_username(message: types.Message) -> None:
+@dp.message(AddRestaurant.username, lambda message: message.text and (message.text.startswith("@") or message.text.isdigit()))
+async def handle_add_restaurant_username(message: types.Message, state: FSMContext) -> None:
     uid = message.from_user.id
     
-    # Не обрабатываем, если пользователь в состоянии рассылки
-    if uid in BROADCAST_FLOW:
-        print(f"DEBUG: User {uid} in BROADCAST_FLOW, skipping restaurant username handler")
-        return
-    
     print(f"DEBUG: Username handler triggered for user {uid}, text: {message.text}")
     
-    state = ADD_FLOW[uid]
     input_text = message.text.strip()
     
     admin_user_id = None
@@ -679,29 +624,23 @@ async def handle_add_restaurant_username(message: types.Message) -> None:
         print(f"DEBUG: Using direct user_id: {admin_user_id}")
     else:
         # Если введен username
-        admin_user_id = await _resolve_user_id_by_username(input_text)
+        admin_user_id = await _resolve_user_id_by_username(input_text, uid)
         if not admin_user_id:
             await message.answer("❌ Не удалось найти пользователя с таким username. Проверьте написание и попробуйте снова.\n\n💡 Подсказка: Пользователь должен сначала взаимодействовать с ботом (написать /start), чтобы его можно было найти по username.")
             return
     
     # Сохраняем username/ID и переходим к следующему шагу
-    state["username"] = input_text
-    state["admin_user_id"] = admin_user_id  # Сохраняем ID для использования позже
-    state["step"] = "name"
+    await state.update_data(username=input_text, admin_user_id=admin_user_id)  # ID понадобится при создании
+    await state.set_state(AddRestaurant.name)
     await message.answer("Введите название ресторана")
 
-@dp.message(lambda message: message.from_user.id in ADD_FLOW and ADD_FLOW[message.from_user.id].get("step") == "name")
-async def handle_add_restaurant_name(message: types.Message) -> None:
+@dp.message(AddRestaurant.name, F.text)
+async def handle_add_restaurant_name(message: types.Message, state: FSMContext) -> None:
     uid = message.from_user.id
     
-    # Не обрабатываем, если пользователь в состоянии рассылки
-    if uid in BROADCAST_FLOW:
-        print(f"DEBUG: User {uid} in BROADCAST_FLOW, skipping restaurant name handler")
-        return
-    
     print(f"DEBUG: Restaurant name handler triggered for user {uid}, text: {message.text}")
     
-    state = ADD_FLOW[uid]
+    flow = await state.get_data()
     
     # Обрабатываем ввод названия ресторана
     restaurant_name = message.text.strip()
@@ -709,73 +648,60 @@ async def handle_add_restaurant_name(message: types.Message) -> None:
         await message.answer("❌ Название ресторана не может быть пустым. Попробуйте снова.")
         return
     
-    # Сохраняем название и создаем ресторан
-    state["name"] = restaurant_name
-    
     # Создаем ресторан
     try:
-        async with httpx.AsyncClient(timeout=3) as client:
-            # Создаем ресторан
-            create_response = await client.post(
-                INTERNAL_API_URL + "/api/admin/restaurants",
-                json={"name": restaurant_name},
-                headers={"X-Telegram-User-Id": str(uid)}
-            )
-            
-            if create_response.status_code != 200:
-                await message.answer("❌ Ошибка создания ресторана.")
-                ADD_FLOW.pop(uid, None)
-                return
-            
-            new_restaurant = create_response.json()
-            new_id = new_restaurant.get("id")
-            
-            if not new_id:
-                await message.answer("❌ Не удалось получить ID нового ресторана.")
-                ADD_FLOW.pop(uid, None)
-                return
-            
-            # Назначаем админа
-            admin_user_id = state.get("admin_user_id")
-            if not admin_user_id:
-                await message.answer("❌ Ошибка: не найден ID админа.")
-                ADD_FLOW.pop(uid, None)
-                return
-            bind_response = await client.post(
-                INTERNAL_API_URL + f"/api/admin/users/bind-admin?user_id={admin_user_id}&restaurant_id={new_id}",
-                headers={"X-Telegram-User-Id": str(uid)}
-            )
-            
-            if bind_response.status_code != 200:
-                await message.answer("⚠️ Ресторан создан, но не удалось назначить админа.")
-            else:
-                await message.answer(f"✅ Ресторан \"{restaurant_name}\" успешно создан и админ назначен!")
-            
-            # Очищаем состояние
-            ADD_FLOW.pop(uid, None)
+        try:
+            new_restaurant = await api.create_restaurant(uid, restaurant_name)
+        except ApiError:
+            await message.answer("❌ Ошибка создания ресторана.")
+            await state.clear()
+            return
+        new_id = new_restaurant.get("id")
+        
+        if not new_id:
+            await message.answer("❌ Не удалось получить ID нового ресторана.")
+            await state.clear()
+            return
+        
+        # Назначаем админа
+        admin_user_id = flow.get("admin_user_id")
+        if not admin_user_id:
+            await message.answer("❌ Ошибка: не найден ID админа.")
+            await state.clear()
+            return
+        try:
+            await api.bind_restaurant_admin(uid, admin_user_id, new_id)
+        except ApiError:
+            await message.answer("⚠️ Ресторан создан, но не удалось назначить админа.")
+        else:
+            await message.answer(f"✅ Ресторан \"{restaurant_name}\" успешно создан и админ назначен!")
+        
+        # Очищаем состояние
+        await state.clear()
             
     except Exception as e:
         print(f"DEBUG: Error creating restaurant: {e}")
         await message.answer("❌ Ошибка при создании ресторана. Попробуйте снова.")
-        ADD_FLOW.pop(uid, None)
+        await state.clear()
 
 
 @dp.message(F.text == "Удалить ресторан")
-async def ga_delete_restaurant(message: types.Message) -> None:
+async def ga_delete_restaurant(message: types.Message, state: FSMContext) -> None:
     uid = message.from_user.id
     if uid not in SUPER_ADMIN_IDS:
         await message.answer("Нет доступа к удалению ресторана.")
         return
     try:
-        async with httpx.AsyncClient(timeout=3) as client:
-            r = await client.get(PUBLIC_WEBAPP_URL + "/api/admin/restaurants", headers={"X-Telegram-User-Id": str(uid)})
-            data = r.json() if r.status_code == 200 else []
-            if not data:
-                await message.answer("Список ресторанов пуст.")
-                return
-            lines = [f"{it['id']}: {it['name']}" for it in data]
-            await message.answer("Выберите ресторан для удаления (введите ID):\n" + "\n".join(lines))
-            PENDING_INPUT[uid] = {"kind": "ga_delete_select", "list": data}
+        try:
+            data = await api.admin_restaurants(uid)
+        except ApiError:
+            data = []
+        if not data:
+            await message.answer("Список ресторанов пуст.")
+            return
+        lines = [f"{it['id']}: {it['name']}" for it in data]
+        await message.answer("Выберите ресторан для удаления (введите ID):\n" + "\n".join(lines))
+        await _expect(state, "ga_delete_select")
     except Exception:
         await message.answer("Не удалось получить список ресторанов.")
 
@@ -828,11 +754,9 @@ async def toggle_restaurant(message: types.Message) -> None:
         await message.answer("Нет доступа.")
         return
     try:
-        async with httpx.AsyncClient(timeout=3) as client:
-            info = await client.get(PUBLIC_WEBAPP_URL + "/api/ra/restaurant", headers={"X-Telegram-User-Id": str(uid)})
-            r = info.json()
-            enabled = not bool(r.get("is_enabled"))
-            await client.post(PUBLIC_WEBAPP_URL + f"/api/ra/restaurant/status?enabled={'true' if enabled else 'false'}", headers={"X-Telegram-User-Id": str(uid)})
+        r = await api.ra_restaurant(uid)
+        enabled = not bool(r.get("is_enabled"))
+        await api.ra_set_restaurant_status(uid, enabled)
         await message.answer("Статус обновлён.", reply_markup=RA_INLINE_KB)
     except Exception:
         await message.answer("Не удалось обновить статус.")
@@ -845,58 +769,55 @@ async def admin_orders(message: types.Message) -> None:
         await message.answer("Нет доступа.")
         return
     try:
-        async with httpx.AsyncClient(timeout=3) as client:
-            res = await client.get(PUBLIC_WEBAPP_URL + "/api/ra/orders", headers={"X-Telegram-User-Id": str(uid)})
-            if res.status_code != 200:
-                await message.answer("Нет доступа к заказам.")
-                return
-            orders = res.json() or []
-            if not orders:
-                await message.answer("Заказов нет.")
-                return
-            # Краткая история заказов
-            lines = []
-            for o in orders[-10:]:
-                items = ", ".join([f"{it.get('name','')}×{it.get('qty',0)}" for it in o.get('items', [])])
-                lines.append(f"#{o.get('id')} · {o.get('status')} · {o.get('total_price')} р\n{items}")
-            await message.answer("История заказов (последние):\n" + "\n\n".join(lines))
+        try:
+            orders = await api.ra_orders(uid)
+        except ApiError:
+            await message.answer("Нет доступа к заказам.")
+            return
+        if not orders:
+            await message.answer("Заказов нет.")
+            return
+        # Краткая история заказов
+        lines = []
+        for o in orders[-10:]:
+            items = ", ".join([f"{it.get('name','')}×{it.get('qty',0)}" for it in o.get('items', [])])
+            lines.append(f"#{o.get('id')} · {o.get('status')} · {o.get('total_price')} р\n{items}")
+        await message.answer("История заказов (последние):\n" + "\n\n".join(lines))
     except Exception:
         await message.answer("Ошибка получения заказов.")
 
 
 # --- Ввод текстовых значений ---
 
-PENDING_INPUT: dict[int, dict] = {}
-
-
-def _expect(user_id: int, kind: str) -> None:
-    PENDING_INPUT[user_id] = {"kind": kind}
+async def _expect(state: FSMContext, kind: str) -> None:
+    await state.set_state(PendingInput.value)
+    await state.set_data({"kind": kind})
 
 
 @dp.message(F.text == "Режим работы")
-async def ask_working_hours(message: types.Message) -> None:
+async def ask_working_hours(message: types.Message, state: FSMContext) -> None:
     if not await _is_restaurant_admin(message.from_user.id):
         await message.answer("Нет доступа.")
         return
-    _expect(message.from_user.id, "work_hours")
+    await _expect(state, "work_hours")
     await message.answer("Напишите режим работы строго в формате: с 10:00 - 20:00")
 
 
 @dp.message(F.text == "Адрес")
-async def ask_address(message: types.Message) -> None:
+async def ask_address(message: types.Message, state: FSMContext) -> None:
     if not await _is_restaurant_admin(message.from_user.id):
         await message.answer("Нет доступа.")
         return
-    _expect(message.from_user.id, "address")
+    await _expect(state, "address")
     await message.answer("Напишите адрес:")
 
 
 @dp.message(F.text == "Номер телефона")
-async def ask_phone(message: types.Message) -> None:
+async def ask_phone(message: types.Message, state: FSMContext) -> None:
     if not await _is_restaurant_admin(message.from_user.id):
         await message.answer("Нет доступа.")
         return
-    _expect(message.from_user.id, "phone")
+    await _expect(state, "phone")
     await message.answer("Напишите номер телефона:")
 
 
@@ -909,20 +830,20 @@ async def open_terms(message: types.Message) -> None:
 
 
 @dp.message(F.text == "Минимальная сумма заказа")
-async def ask_min_sum(message: types.Message) -> None:
+async def ask_min_sum(message: types.Message, state: FSMContext) -> None:
     if not await _is_restaurant_admin(message.from_user.id):
         await message.answer("Нет доступа.")
         return
-    _expect(message.from_user.id, "min_sum")
+    await _expect(state, "min_sum")
     await message.answer("Задайте сумму строго в формате 1500")
 
 
 @dp.message(F.text == "Время доставки")
-async def ask_delivery_time(message: types.Message) -> None:
+async def ask_delivery_time(message: types.Message, state: FSMContext) -> None:
     if not await _is_restaurant_admin(message.from_user.id):
         await message.answer("Нет доступа.")
         return
-    _expect(message.from_user.id, "delivery_time")
+    await _expect(state, "delivery_time")
     await message.answer("Напишите время доставки строго в минутах, например 90")
 
 
@@ -939,33 +860,25 @@ async def go_back(message: types.Message) -> None:
 # ОБРАБОТЧИКИ РАССЫЛКИ (ДОЛЖНЫ БЫТЬ ПЕРЕД ОБЩИМ ОБРАБОТЧИКОМ)
 # ===========================================
 
-@dp.message(lambda message: message.from_user.id in BROADCAST_FLOW)
-async def broadcast_text_handler(message: types.Message) -> None:
-    uid = message.from_user.id
-    state = BROADCAST_FLOW.get(uid)
-    if not state:
-        return
-    
-    # Проверяем, что мы в правильном шаге
-    if state.get("step") != "text":
-        return
-    
+@dp.message(Broadcast.content, lambda message: message.text and message.text.lower() == "отмена")
+async def broadcast_cancel(message: types.Message, state: FSMContext) -> None:
+    await state.clear()
+    await message.answer("❌ Рассылка отменена.", reply_markup=ADMIN_INLINE_KB)
+
+
+@dp.message(Broadcast.content)
+async def broadcast_text_handler(message: types.Message, state: FSMContext) -> None:
     # Обрабатываем медиа
     if message.photo:
-        state["media_type"] = "photo"
-        state["media_file_id"] = message.photo[-1].file_id
-        state["text"] = message.caption or ""
+        content = {"media_type": "photo", "media_file_id": message.photo[-1].file_id, "text": message.caption or ""}
     elif message.video:
-        state["media_type"] = "video"
-        state["media_file_id"] = message.video.file_id
-        state["text"] = message.caption or ""
+        content = {"media_type": "video", "media_file_id": message.video.file_id, "text": message.caption or ""}
     elif message.text:
-        state["text"] = message.text
-        state["media_type"] = None
-        state["media_file_id"] = None
+        content = {"media_type": None, "media_file_id": None, "text": message.text}
     else:
         await message.answer("❌ Поддерживаются только текст, фото и видео.")
         return
+    flow = await state.update_data(content)
     
     # Показываем превью и кнопку подтверждения
     target_names = {
@@ -975,11 +888,11 @@ async def broadcast_text_handler(message: types.Message) -> None:
     }
     
     preview_text = f"📢 <b>Превью рассылки</b>\n\n"
-    preview_text += f"<b>Получатели:</b> {target_names[state['target_type']]}\n"
-    preview_text += f"<b>Текст:</b> {state['text'][:200]}{'...' if len(state['text']) > 200 else ''}\n"
+    preview_text += f"<b>Получатели:</b> {target_names[flow['target_type']]}\n"
+    preview_text += f"<b>Текст:</b> {flow['text'][:200]}{'...' if len(flow['text']) > 200 else ''}\n"
     
-    if state['media_type']:
-        preview_text += f"<b>Медиа:</b> {state['media_type']}\n"
+    if flow['media_type']:
+        preview_text += f"<b>Медиа:</b> {flow['media_type']}\n"
     
     confirm_kb = InlineKeyboardMarkup(
         inline_keyboard=[
@@ -994,44 +907,38 @@ async def broadcast_text_handler(message: types.Message) -> None:
 
 
 @dp.callback_query(F.data == "broadcast_confirm")
-async def broadcast_confirm_callback(callback: types.CallbackQuery) -> None:
+async def broadcast_confirm_callback(callback: types.CallbackQuery, state: FSMContext) -> None:
     uid = callback.from_user.id
-    state = BROADCAST_FLOW.get(uid)
-    if not state:
+    if await state.get_state() != Broadcast.content.state:
         await callback.answer("Состояние рассылки не найдено.")
         return
+    flow = await state.get_data()
     
     try:
         # Отправляем рассылку через API
-        async with httpx.AsyncClient(timeout=3) as client:
-            payload = {
-                "text": state["text"],
-                "media_type": state["media_type"],
-                "media_file_id": state["media_file_id"],
-                "target_type": state["target_type"]
-            }
-            
-            response = await client.post(
-                INTERNAL_API_URL + "/api/admin/broadcast-telegram",
-                json=payload,
-                headers={"X-Telegram-User-Id": str(uid)}
+        payload = {
+            "text": flow.get("text"),
+            "media_type": flow.get("media_type"),
+            "media_file_id": flow.get("media_file_id"),
+            "target_type": flow["target_type"]
+        }
+        
+        try:
+            result = await api.broadcast(uid, payload)
+        except ApiError as e:
+            await callback.message.answer(
+                f"❌ Ошибка отправки рассылки: {e.detail}",
+                reply_markup=ADMIN_INLINE_KB
+            )
+        else:
+            await callback.message.answer(
+                f"✅ <b>Рассылка отправлена!</b>\n\n"
+                f"📊 Отправлено: {result.get('sent', 0)}\n"
+                f"❌ Ошибок: {result.get('failed', 0)}\n"
+                f"📈 Всего получателей: {result.get('total', 0)}",
+                reply_markup=ADMIN_INLINE_KB,
+                parse_mode="HTML"
             )
-            
-            if response.status_code == 200:
-                result = response.json()
-                await callback.message.answer(
-                    f"✅ <b>Рассылка отправлена!</b>\n\n"
-                    f"📊 Отправлено: {result.get('sent', 0)}\n"
-                    f"❌ Ошибок: {result.get('failed', 0)}\n"
-                    f"📈 Всего получателей: {result.get('total', 0)}",
-                    reply_markup=ADMIN_INLINE_KB,
-                    parse_mode="HTML"
-                )
-            else:
-                await callback.message.answer(
-                    f"❌ Ошибка отправки рассылки: {response.text}",
-                    reply_markup=ADMIN_INLINE_KB
-                )
     
     except Exception as e:
         await callback.message.answer(
@@ -1040,15 +947,14 @@ async def broadcast_confirm_callback(callback: types.CallbackQuery) -> None:
         )
     
     finally:
-        BROADCAST_FLOW.pop(uid, None)
+        await state.clear()
     
     await callback.answer()
 
 
 @dp.callback_query(F.data == "broadcast_cancel")
-async def broadcast_cancel_callback(callback: types.CallbackQuery) -> None:
-    uid = callback.from_user.id
-    BROADCAST_FLOW.pop(uid, None)
+async def broadcast_cancel_callback(callback: types.CallbackQuery, state: FSMContext) -> None:
+    await state.clear()
     await callback.message.answer("❌ Рассылка отменена.", reply_markup=ADMIN_INLINE_KB)
     await callback.answer()
 
@@ -1057,81 +963,74 @@ async def broadcast_cancel_callback(callback: types.CallbackQuery) -> None:
 # ===========================================
 
 @dp.message()
-async def handle_text_inputs(message: types.Message) -> None:
+async def handle_text_inputs(message: types.Message, state: FSMContext) -> None:
     # Обработка ожидаемого текстового ввода
     uid = message.from_user.id
     
-    # Не обрабатываем, если пользователь в состоянии рассылки
-    if uid in BROADCAST_FLOW:
+    current = await state.get_state()
+    if current not in (PendingInput.value.state, AddRestaurant.form.state):
         return
-    
-    task = PENDING_INPUT.get(uid)
-    if not task or not message.text:
+    task = await state.get_data()
+    if not task.get("kind") or not message.text:
         return
     kind = task.get("kind")
     text = message.text.strip()
+    next_step = False
     try:
-        async with httpx.AsyncClient(timeout=3) as client:
-            if kind == "address":
-                await client.patch(PUBLIC_WEBAPP_URL + "/api/ra/restaurant", headers={"X-Telegram-User-Id": str(uid)}, json={"address": text})
-                await message.answer("Адрес обновлён.", reply_markup=RESTAURANT_DATA_KB)
-            elif kind == "phone":
-                await client.patch(PUBLIC_WEBAPP_URL + "/api/ra/restaurant", headers={"X-Telegram-User-Id": str(uid)}, json={"phone": text})
-                await message.answer("Телефон обновлён.", reply_markup=RESTAURANT_DATA_KB)
-            elif kind == "min_sum":
-                val = int(text)
-                await client.patch(PUBLIC_WEBAPP_URL + "/api/ra/restaurant", headers={"X-Telegram-User-Id": str(uid)}, json={"delivery_min_sum": val})
-                await message.answer("Минимальная сумма обновлена.", reply_markup=ORDER_TERMS_KB)
-            elif kind == "delivery_time":
-                val = int(text)
-                await client.patch(PUBLIC_WEBAPP_URL + "/api/ra/restaurant", headers={"X-Telegram-User-Id": str(uid)}, json={"delivery_time_minutes": val})
-                await message.answer("Время доставки обновлено.", reply_markup=ORDER_TERMS_KB)
-            elif kind == "work_hours":
-                # ожидаемый формат: "с HH:MM - HH:MM"
-                import re
-                m = re.search(r"(\d{1,2}):(\d{2}).*?(\d{1,2}):(\d{2})", text)
-                if not m:
-                    await message.answer("Неверный формат. Пример: с 10:00 - 20:00")
-                else:
-                    h1, m1, h2, m2 = map(int, m.groups())
-                    open_min = h1 * 60 + m1
-                    close_min = h2 * 60 + m2
-                    await client.patch(PUBLIC_WEBAPP_URL + "/api/ra/restaurant", headers={"X-Telegram-User-Id": str(uid)}, json={"work_open_min": open_min, "work_close_min": close_min})
-                    await message.answer("Режим работы обновлён.", reply_markup=RESTAURANT_DATA_KB)
-            elif kind == "ga_add_username":
-                state = ADD_FLOW.get(uid)
-                if not state:
-                    return
-                state["username"] = text
-                await message.answer("Username сохранён. Теперь введите название (кнопка: Название ресторана).", reply_markup=ADD_REST_KB)
-                await _try_finish_add_restaurant(uid, message)
-            elif kind == "ga_add_name":
-                state = ADD_FLOW.get(uid)
-                if not state:
-                    return
-                state["name"] = text
-                await message.answer("Название сохранено. Теперь введите @username (кнопка: @Имя аккаунта).", reply_markup=ADD_REST_KB)
-                await _try_finish_add_restaurant(uid, message)
-            elif kind == "ga_delete_select":
-                # ожидаем ID и подтверждение
-                try:
-                    rid = int(text)
-                except ValueError:
-                    await message.answer("Нужно указать ID ресторана.")
+        if kind == "address":
+            await api.ra_update_restaurant(uid, address=text)
+            await message.answer("Адрес обновлён.", reply_markup=RESTAURANT_DATA_KB)
+        elif kind == "phone":
+            await api.ra_update_restaurant(uid, phone=text)
+            await message.answer("Телефон обновлён.", reply_markup=RESTAURANT_DATA_KB)
+        elif kind == "min_sum":
+            val = int(text)
+            await api.ra_update_restaurant(uid, delivery_min_sum=val)
+            await message.answer("Минимальная сумма обновлена.", reply_markup=ORDER_TERMS_KB)
+        elif kind == "delivery_time":
+            val = int(text)
+            await api.ra_update_restaurant(uid, delivery_time_minutes=val)
+            await message.answer("Время доставки обновлено.", reply_markup=ORDER_TERMS_KB)
+        elif kind == "work_hours":
+            # ожидаемый формат: "с HH:MM - HH:MM"
+            import re
+            m = re.search(r"(\d{1,2}):(\d{2}).*?(\d{1,2}):(\d{2})", text)
+            if not m:
+                await message.answer("Неверный формат. Пример: с 10:00 - 20:00")
+            else:
+                h1, m1, h2, m2 = map(int, m.groups())
+                open_min = h1 * 60 + m1
+                close_min = h2 * 60 + m2
+                await api.ra_update_restaurant(uid, work_open_min=open_min, work_close_min=close_min)
+                await message.answer("Режим работы обновлён.", reply_markup=RESTAURANT_DATA_KB)
+        elif kind == "ga_add_username":
+            await state.update_data(username=text)
+            await message.answer("Username сохранён. Теперь введите название (кнопка: Название ресторана).", reply_markup=ADD_REST_KB)
+            await _try_finish_add_restaurant(uid, message, state)
+        elif kind == "ga_add_name":
+            await state.update_data(name=text)
+            await message.answer("Название сохранено. Теперь введите @username (кнопка: @Имя аккаунта).", reply_markup=ADD_REST_KB)
+            await _try_finish_add_restaurant(uid, message, state)
+        elif kind == "ga_delete_select":
+            # ожидаем ID и подтверждение
+            try:
+                rid = int(text)
+            except ValueError:
+                await message.answer("Нужно указать ID ресторана.")
+                return
+            await state.update_data(kind="ga_delete_confirm", rid=rid)
+            next_step = True
+            await message.answer("Точно хотите удалить ресторан?", reply_markup=CONFIRM_KB)
+        elif kind == "ga_delete_confirm":
+            if text.lower() == "да":
+                rid = task.get("rid")
+                if not rid:
+                    await message.answer("Не найден ID ресторана.")
                     return
-                PENDING_INPUT[uid] = {"kind": "ga_delete_confirm", "rid": rid}
-                await message.answer("Точно хотите удалить ресторан?", reply_markup=CONFIRM_KB)
-            elif kind == "ga_delete_confirm":
-                if text.lower() == "да":
-                    rid = PENDING_INPUT.get(uid, {}).get("rid")
-                    if not rid:
-                        await message.answer("Не найден ID ресторана.")
-                        return
-                    async with httpx.AsyncClient(timeout=3) as client:
-                        await client.delete(PUBLIC_WEBAPP_URL + f"/api/admin/restaurants/{rid}", headers={"X-Telegram-User-Id": str(uid)})
-                    await message.answer("Ресторан удалён.", reply_markup=ADMIN_INLINE_KB)
-                else:
-                    await message.answer("Удаление отменено.", reply_markup=ADMIN_INLINE_KB)
+                await api.delete_restaurant(uid, rid)
+                await message.answer("Ресторан удалён.", reply_markup=ADMIN_INLINE_KB)
+            else:
+                await message.answer("Удаление отменено.", reply_markup=ADMIN_INLINE_KB)
     except ValueError:
         await message.answer("Нужно число. Повторите ввод.")
         return
@@ -1139,7 +1038,12 @@ async def handle_text_inputs(message: types.Message) -> None:
         await message.answer("Ошибка сохранения. Попробуйте ещё раз.")
         return
     finally:
-        PENDING_INPUT.pop(uid, None)
+        if current == AddRestaurant.form.state:
+            # форма добавления остаётся открытой, сбрасываем только ожидаемое поле
+            if await state.get_state() == AddRestaurant.form.state:
+                await state.update_data(kind=None)
+        elif not next_step:
+            await state.clear()
 
 
 # --- Обработчики статистики ---
@@ -1164,30 +1068,25 @@ async def stats_global_callback(callback: types.CallbackQuery) -> None:
         return
     
     try:
-        async with httpx.AsyncClient(timeout=3) as client:
-            response = await client.get(INTERNAL_API_URL + "/api/admin/stats", headers={"X-Telegram-User-Id": str(uid)})
-            if response.status_code == 200:
-                data = response.json()
-                
-                stats_text = "📊 **Общая статистика по всем ресторанам**\n\n"
-                
-                # Статистика за месяц
-                month_stats = data.get("month", {})
-                stats_text += f"📅 **За текущий месяц:**\n"
-                stats_text += f"• Заказов: {month_stats.get('orders', 0)} на сумму {month_stats.get('sum', 0):,} ₽\n"
-                stats_text += f"• Отмен: {month_stats.get('cancelled', 0)}\n"
-                stats_text += f"• Изменений: {month_stats.get('modified', 0)}\n\n"
-                
-                # Статистика за сегодня
-                today_stats = data.get("today", {})
-                stats_text += f"📆 **За сегодня:**\n"
-                stats_text += f"• Заказов: {today_stats.get('orders', 0)} на сумму {today_stats.get('sum', 0):,} ₽\n"
-                stats_text += f"• Отмен: {today_stats.get('cancelled', 0)}\n"
-                stats_text += f"• Изменений: {today_stats.get('modified', 0)}\n"
-                
-                await callback.message.edit_text(stats_text, parse_mode="Markdown", reply_markup=STATS_KB)
-            else:
-                await callback.message.edit_text("❌ Ошибка получения статистики", reply_markup=STATS_KB)
+        data = await api.stats(uid)
+        
+        stats_text = "📊 **Общая статистика по всем ресторанам**\n\n"
+        
+        # Статистика за месяц
+        month_stats = data.get("month", {})
+        stats_text += f"📅 **За текущий месяц:**\n"
+        stats_text += f"• Заказов: {month_stats.get('orders', 0)} на сумму {month_stats.get('sum', 0):,} ₽\n"
+        stats_text += f"• Отмен: {month_stats.get('cancelled', 0)}\n"
+        stats_text += f"• Изменений: {month_stats.get('modified', 0)}\n\n"
+        
+        # Статистика за сегодня
+        today_stats = data.get("today", {})
+        stats_text += f"📆 **За сегодня:**\n"
+        stats_text += f"• Заказов: {today_stats.get('orders', 0)} на сумму {today_stats.get('sum', 0):,} ₽\n"
+        stats_text += f"• Отмен: {today_stats.get('cancelled', 0)}\n"
+        stats_text += f"• Изменений: {today_stats.get('modified', 0)}\n"
+        
+        await callback.message.edit_text(stats_text, parse_mode="Markdown", reply_markup=STATS_KB)
     except Exception as e:
         logger.exception("Error getting global stats")
         await callback.message.edit_text("❌ Ошибка получения статистики", reply_markup=STATS_KB)
@@ -1204,27 +1103,22 @@ async def stats_users_callback(callback: types.CallbackQuery) -> None:
         return
     
     try:
-        async with httpx.AsyncClient(timeout=3) as client:
-            response = await client.get(INTERNAL_API_URL + "/api/admin/stats/users", headers={"X-Telegram-User-Id": str(uid)})
-            if response.status_code == 200:
-                data = response.json()
-                
-                stats_text = "👥 **Статистика пользователей**\n\n"
-                stats_text += f"📊 **Общие данные:**\n"
-                stats_text += f"• Всего пользователей: {data.get('total_users', 0):,}\n"
-                stats_text += f"• Заблокированных: {data.get('blocked_users', 0):,}\n\n"
-                
-                stats_text += f"📅 **За текущий месяц:**\n"
-                stats_text += f"• Новых пользователей: {data.get('unique_users_month', 0):,}\n"
-                stats_text += f"• Посещений: {data.get('visits_month', 0):,}\n\n"
-                
-                stats_text += f"📆 **За сегодня:**\n"
-                stats_text += f"• Новых пользователей: {data.get('unique_users_today', 0):,}\n"
-                stats_text += f"• Посещений: {data.get('visits_today', 0):,}\n"
-                
-                await callback.message.edit_text(stats_text, parse_mode="Markdown", reply_markup=STATS_KB)
-            else:
-                await callback.message.edit_text("❌ Ошибка получения статистики пользователей", reply_markup=STATS_KB)
+        data = await api.stats_users(uid)
+        
+        stats_text = "👥 **Статистика пользователей**\n\n"
+        stats_text += f"📊 **Общие данные:**\n"
+        stats_text += f"• Всего пользователей: {data.get('total_users', 0):,}\n"
+        stats_text += f"• Заблокированных: {data.get('blocked_users', 0):,}\n\n"
+        
+        stats_text += f"📅 **За текущий месяц:**\n"
+        stats_text += f"• Новых пользователей: {data.get('unique_users_month', 0):,}\n"
+        stats_text += f"• Посещений: {data.get('visits_month', 0):,}\n\n"
+        
+        stats_text += f"📆 **За сегодня:**\n"
+        stats_text += f"• Новых пользователей: {data.get('unique_users_today', 0):,}\n"
+        stats_text += f"• Посещений: {data.get('visits_today', 0):,}\n"
+        
+        await callback.message.edit_text(stats_text, parse_mode="Markdown", reply_markup=STATS_KB)
     except Exception as e:
         logger.exception("Error getting user stats")
         await callback.message.edit_text("❌ Ошибка получения статистики пользователей", reply_markup=STATS_KB)
@@ -1241,33 +1135,27 @@ async def stats_restaurant_callback(callback: types.CallbackQuery) -> None:
         return
     
     try:
-        async with httpx.AsyncClient(timeout=3) as client:
-            response = await client.get(INTERNAL_API_URL + "/api/admin/stats/restaurants", headers={"X-Telegram-User-Id": str(uid)})
-            if response.status_code == 200:
-                data = response.json()
-                restaurants = data.get("restaurants", [])
-                
-                if not restaurants:
-                    await callback.message.edit_text("❌ Нет доступных ресторанов", reply_markup=STATS_KB)
-                    return
-                
-                # Создаем клавиатуру со списком ресторанов
-                keyboard = []
-                for restaurant in restaurants:
-                    status = "✅" if restaurant.get("is_enabled") else "❌"
-                    keyboard.append([
-                        InlineKeyboardButton(
-                            text=f"{status} {restaurant['name']}", 
-                            callback_data=f"stats_rest_{restaurant['id']}"
-                        )
-                    ])
-                
-                keyboard.append([InlineKeyboardButton(text="← Назад", callback_data="admin_stats")])
-                
-                kb = InlineKeyboardMarkup(inline_keyboard=keyboard)
-                await callback.message.edit_text("🏪 Выберите ресторан для статистики:", reply_markup=kb)
-            else:
-                await callback.message.edit_text("❌ Ошибка получения списка ресторанов", reply_markup=STATS_KB)
+        restaurants = await api.stats_restaurants(uid)
+        
+        if not restaurants:
+            await callback.message.edit_text("❌ Нет доступных ресторанов", reply_markup=STATS_KB)
+            return
+        
+        # Создаем клавиатуру со списком ресторанов
+        keyboard = []
+        for restaurant in restaurants:
+            status = "✅" if restaurant.get("is_enabled") else "❌"
+            keyboard.append([
+                InlineKeyboardButton(
+                    text=f"{status} {restaurant['name']}", 
+                    callback_data=f"stats_rest_{restaurant['id']}"
+                )
+            ])
+        
+        keyboard.append([InlineKeyboardButton(text="← Назад", callback_data="admin_stats")])
+        
+        kb = InlineKeyboardMarkup(inline_keyboard=keyboard)
+        await callback.message.edit_text("🏪 Выберите ресторан для статистики:", reply_markup=kb)
     except Exception as e:
         logger.exception("Error getting restaurants list")
         await callback.message.edit_text("❌ Ошибка получения списка ресторанов", reply_markup=STATS_KB)
@@ -1286,55 +1174,42 @@ async def stats_restaurant_detail_callback(callback: types.CallbackQuery) -> Non
     restaurant_id = int(callback.data.split("_")[-1])
     
     try:
-        async with httpx.AsyncClient(timeout=3) as client:
-            # Получаем статистику ресторана
-            stats_response = await client.get(
-                INTERNAL_API_URL + f"/api/admin/stats/by-restaurant?restaurant_id={restaurant_id}", 
-                headers={"X-Telegram-User-Id": str(uid)}
-            )
-            
-            # Получаем название ресторана
-            restaurants_response = await client.get(
-                INTERNAL_API_URL + "/api/admin/stats/restaurants", 
-                headers={"X-Telegram-User-Id": str(uid)}
-            )
-            
-            if stats_response.status_code == 200 and restaurants_response.status_code == 200:
-                stats_data = stats_response.json()
-                restaurants_data = restaurants_response.json()
-                
-                # Находим название ресторана
-                restaurant_name = "Неизвестный ресторан"
-                for restaurant in restaurants_data.get("restaurants", []):
-                    if restaurant["id"] == restaurant_id:
-                        restaurant_name = restaurant["name"]
-                        break
-                
-                stats_text = f"🏪 **Статистика ресторана \"{restaurant_name}\"**\n\n"
-                
-                # Статистика за месяц
-                month_stats = stats_data.get("month", {})
-                stats_text += f"📅 **За текущий месяц:**\n"
-                stats_text += f"• Заказов: {month_stats.get('orders', 0)} на сумму {month_stats.get('sum', 0):,} ₽\n"
-                stats_text += f"• Отмен: {month_stats.get('cancelled', 0)}\n"
-                stats_text += f"• Изменений: {month_stats.get('modified', 0)}\n\n"
-                
-                # Статистика за сегодня
-                today_stats = stats_data.get("today", {})
-                stats_text += f"📆 **За сегодня:**\n"
-                stats_text += f"• Заказов: {today_stats.get('orders', 0)} на сумму {today_stats.get('sum', 0):,} ₽\n"
-                stats_text += f"• Отмен: {today_stats.get('cancelled', 0)}\n"
-                stats_text += f"• Изменений: {today_stats.get('modified', 0)}\n"
-                
-                # Кнопка назад к выбору ресторана
-                back_kb = InlineKeyboardMarkup(inline_keyboard=[
-                    [InlineKeyboardButton(text="← К списку ресторанов", callback_data="stats_restaurant")],
-                    [InlineKeyboardButton(text="← К статистике", callback_data="admin_stats")]
-                ])
-                
-                await callback.message.edit_text(stats_text, parse_mode="Markdown", reply_markup=back_kb)
-            else:
-                await callback.message.edit_text("❌ Ошибка получения статистики ресторана", reply_markup=STATS_KB)
+        # Статистика ресторана и его название — параллельно
+        stats_data, restaurants = await asyncio.gather(
+            api.stats_by_restaurant(uid, restaurant_id),
+            api.stats_restaurants(uid),
+        )
+        
+        # Находим название ресторана
+        restaurant_name = "Неизвестный ресторан"
+        for restaurant in restaurants:
+            if restaurant["id"] == restaurant_id:
+                restaurant_name = restaurant["name"]
+                break
+        
+        stats_text = f"🏪 **Статистика ресторана \"{restaurant_name}\"**\n\n"
+        
+        # Статистика за месяц
+        month_stats = stats_data.get("month", {})
+        stats_text += f"📅 **За текущий месяц:**\n"
+        stats_text += f"• Заказов: {month_stats.get('orders', 0)} на сумму {month_stats.get('sum', 0):,} ₽\n"
+        stats_text += f"• Отмен: {month_stats.get('cancelled', 0)}\n"
+        stats_text += f"• Изменений: {month_stats.get('modified', 0)}\n\n"
+        
+        # Статистика за сегодня
+        today_stats = stats_data.get("today", {})
+        stats_text += f"📆 **За сегодня:**\n"
+        stats_text += f"• Заказов: {today_stats.get('orders', 0)} на сумму {today_stats.get('sum', 0):,} ₽\n"
+        stats_text += f"• Отмен: {today_stats.get('cancelled', 0)}\n"
+        stats_text += f"• Изменений: {today_stats.get('modified', 0)}\n"
+        
+        # Кнопка назад к выбору ресторана
+        back_kb = InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="← К списку ресторанов", callback_data="stats_restaurant")],
+            [InlineKeyboardButton(text="← К статистике", callback_data="admin_stats")]
+        ])
+        
+        await callback.message.edit_text(stats_text, parse_mode="Markdown", reply_markup=back_kb)
     except Exception as e:
         logger.exception("Error getting restaurant stats")
         await callback.message.edit_text("❌ Ошибка получения статистики ресторана", reply_markup=STATS_KB)
@@ -1354,21 +1229,10 @@ async def enable_restaurant_callback(callback: types.CallbackQuery) -> None:
     restaurant_id = int(callback.data.split("_")[-1])
     
     try:
-        async with httpx.AsyncClient(timeout=3) as client:
-            response = await client.patch(
-                INTERNAL_API_URL + f"/api/admin/restaurants/{restaurant_id}",
-                headers={"X-Telegram-User-Id": str(uid), "Content-Type": "application/json"},
-                json={"is_enabled": True}
-            )
-            
-            if response.status_code == 200:
-                await callback.message.edit_text("✅ Ресторан успешно включен!", reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-                    [InlineKeyboardButton(text="← Назад", callback_data="admin_back")]
-                ]))
-            else:
-                await callback.message.edit_text("❌ Ошибка при включении ресторана", reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-                    [InlineKeyboardButton(text="← Назад", callback_data="admin_back")]
-                ]))
+        await api.update_restaurant(uid, restaurant_id, is_enabled=True)
+        await callback.message.edit_text("✅ Ресторан успешно включен!", reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="← Назад", callback_data="admin_back")]
+        ]))
     except Exception as e:
         logger.exception("Error enabling restaurant")
         await callback.message.edit_text("❌ Ошибка при включении ресторана", reply_markup=InlineKeyboardMarkup(inline_keyboard=[
@@ -1389,21 +1253,10 @@ async def disable_restaurant_callback(callback: types.CallbackQuery) -> None:
     restaurant_id = int(callback.data.split("_")[-1])
     
     try:
-        async with httpx.AsyncClient(timeout=3) as client:
-            response = await client.patch(
-                INTERNAL_API_URL + f"/api/admin/restaurants/{restaurant_id}",
-                headers={"X-Telegram-User-Id": str(uid), "Content-Type": "application/json"},
-                json={"is_enabled": False}
-            )
-            
-            if response.status_code == 200:
-                await callback.message.edit_text("❌ Ресторан успешно выключен!", reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-                    [InlineKeyboardButton(text="← Назад", callback_data="admin_back")]
-                ]))
-            else:
-                await callback.message.edit_text("❌ Ошибка при выключении ресторана", reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-                    [InlineKeyboardButton(text="← Назад", callback_data="admin_back")]
-                ]))
+        await api.update_restaurant(uid, restaurant_id, is_enabled=False)
+        await callback.message.edit_text("❌ Ресторан успешно выключен!", reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="← Назад", callback_data="admin_back")]
+        ]))
     except Exception as e:
         logger.exception("Error disabling restaurant")
         await callback.message.edit_text("❌ Ошибка при выключении ресторана", reply_markup=InlineKeyboardMarkup(inline_keyboard=[
@@ -1425,31 +1278,26 @@ async def delete_restaurant_confirm_callback(callback: types.CallbackQuery) -> N
     
     # Получаем название ресторана для отображения
     try:
-        async with httpx.AsyncClient(timeout=3) as client:
-            response = await client.get(INTERNAL_API_URL + "/api/admin/restaurants", headers={"X-Telegram-User-Id": str(uid)})
-            if response.status_code == 200:
-                restaurants = response.json()
-                restaurant_name = "Неизвестный ресторан"
-                for restaurant in restaurants:
-                    if restaurant["id"] == restaurant_id:
-                        restaurant_name = restaurant["name"]
-                        break
-                
-                # Создаем клавиатуру подтверждения
-                confirm_kb = InlineKeyboardMarkup(inline_keyboard=[
-                    [InlineKeyboardButton(text="✅ Да, удалить", callback_data=f"confirm_delete_{restaurant_id}")],
-                    [InlineKeyboardButton(text="❌ Нет, отменить", callback_data="admin_delete_restaurant")],
-                    [InlineKeyboardButton(text="← Назад", callback_data="admin_back")]
-                ])
-                
-                await callback.message.edit_text(
-                    f"🗑️ **Точно хотите удалить ресторан \"{restaurant_name}\"?**\n\n"
-                    "⚠️ Это действие нельзя отменить!",
-                    parse_mode="Markdown",
-                    reply_markup=confirm_kb
-                )
-            else:
-                await callback.message.edit_text("❌ Ошибка получения данных ресторана")
+        restaurants = await api.admin_restaurants(uid)
+        restaurant_name = "Неизвестный ресторан"
+        for restaurant in restaurants:
+            if restaurant["id"] == restaurant_id:
+                restaurant_name = restaurant["name"]
+                break
+        
+        # Создаем клавиатуру подтверждения
+        confirm_kb = InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="✅ Да, удалить", callback_data=f"confirm_delete_{restaurant_id}")],
+            [InlineKeyboardButton(text="❌ Нет, отменить", callback_data="admin_delete_restaurant")],
+            [InlineKeyboardButton(text="← Назад", callback_data="admin_back")]
+        ])
+        
+        await callback.message.edit_text(
+            f"🗑️ **Точно хотите удалить ресторан \"{restaurant_name}\"?**\n\n"
+            "⚠️ Это действие нельзя отменить!",
+            parse_mode="Markdown",
+            reply_markup=confirm_kb
+        )
     except Exception as e:
         logger.exception("Error getting restaurant data for delete confirmation")
         await callback.message.edit_text("❌ Ошибка получения данных ресторана")
@@ -1468,20 +1316,10 @@ async def confirm_delete_restaurant_callback(callback: types.CallbackQuery) -> N
     restaurant_id = int(callback.data.split("_")[-1])
     
     try:
-        async with httpx.AsyncClient(timeout=3) as client:
-            response = await client.delete(
-                INTERNAL_API_URL + f"/api/admin/restaurants/{restaurant_id}",
-                headers={"X-Telegram-User-Id": str(uid)}
-            )
-            
-            if response.status_code == 200:
-                await callback.message.edit_text("🗑️ Ресторан успешно удален!", reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-                    [InlineKeyboardButton(text="← Назад", callback_data="admin_back")]
-                ]))
-            else:
-                await callback.message.edit_text("❌ Ошибка при удалении ресторана", reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-                    [InlineKeyboardButton(text="← Назад", callback_data="admin_back")]
-                ]))
+        await api.delete_restaurant(uid, restaurant_id)
+        await callback.message.edit_text("🗑️ Ресторан успешно удален!", reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="← Назад", callback_data="admin_back")]
+        ]))
     except Exception as e:
         logger.exception("Error deleting restaurant")
         await callback.message.edit_text("❌ Ошибка при удалении ресторана", reply_markup=InlineKeyboardMarkup(inline_keyboard=[
@@ -1522,21 +1360,19 @@ async def restaurant_admin_entry(message: types.Message) -> None:
     await message.answer("Админка ресторана", reply_markup=kb)
 
 
-# === ОБРАБОТЧИКИ ДЛЯ РАССЫЛКИ ===
-
-@dp.message(lambda message: message.text and message.text.lower() == "отмена" and message.from_user.id in BROADCAST_FLOW)
-async def broadcast_cancel(message: types.Message) -> None:
-    uid = message.from_user.id
-    if uid in BROADCAST_FLOW:
-        BROADCAST_FLOW.pop(uid, None)
-    await message.answer("❌ Рассылка отменена.", reply_markup=ADMIN_INLINE_KB)
-
-
 async def main() -> None:
     if not BOT_TOKEN:
         raise RuntimeError("BOT_TOKEN is required")
-    bot = Bot(BOT_TOKEN)
-    await dp.start_polling(bot)
+    bot = create_bot(BOT_TOKEN)
+    if BOT_MODE == "webhook":
+        from bot.webhook import serve
+        await serve(dp, bot)
+        return
+    try:
+        await dp.start_polling(bot)
+    finally:
+        await api.aclose()
+        await close_telegram_http()
 
 
 if __name__ == "__main__":
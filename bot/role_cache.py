@@ -0,0 +1,82 @@
+"""
+Кэш ролей пользователей в боте: проверки "заблокирован?" и "админ ресторана?" на каждое
+нажатие кнопки не ходят в API.
+
+- запись живёт BOT_ROLE_CACHE_TTL секунд;
+- параллельные запросы ролей одного пользователя объединяются в один вызов API;
+- изменения ролей в API (блокировка, назначение/снятие админа, удаление ресторана) сбрасывают
+  запись сразу: в том же процессе — через слушатель app.services.roles, в отдельном процессе
+  бота в режиме webhook — через POST /internal/roles/invalidate (bot/webhook.py);
+- ошибки API не кэшируются: до следующей попытки пользователь считается обычным.
+"""
+
+import asyncio
+import os
+import time
+
+from app.logging_config import get_logger
+from app.services.roles import add_roles_listener
+from bot.api_client import api
+
+
+BOT_ROLE_CACHE_TTL = float(os.getenv("BOT_ROLE_CACHE_TTL", "30"))
+BOT_ROLE_CACHE_SIZE = int(os.getenv("BOT_ROLE_CACHE_SIZE", "10000"))
+
+logger = get_logger("bot-roles")
+
+_FALLBACK_ROLES = {"is_blocked": False, "is_super_admin": False, "restaurant_id": None}
+
+
+class RoleCache:
+    def __init__(self, ttl: float = BOT_ROLE_CACHE_TTL, max_size: int = BOT_ROLE_CACHE_SIZE) -> None:
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: dict[int, tuple[float, dict]] = {}
+        self._inflight: dict[int, asyncio.Future] = {}
+        # поколение: ответ API, запрошенный до сброса, не должен попасть в кэш после него
+        self._generation = 0
+
+    async def get(self, user_id: int) -> dict:
+        entry = self._entries.get(user_id)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+        future = self._inflight.get(user_id)
+        if future is None:
+            future = asyncio.ensure_future(self._load(user_id))
+            self._inflight[user_id] = future
+            future.add_done_callback(lambda _: self._inflight.pop(user_id, None))
+        return await asyncio.shield(future)
+
+    async def _load(self, user_id: int) -> dict:
+        generation = self._generation
+        try:
+            roles = await api.user_roles(user_id)
+        except Exception as exc:
+            logger.warning("roles of %s unavailable: %s", user_id, repr(exc))
+            return dict(_FALLBACK_ROLES, user_id=user_id)
+        if generation == self._generation:
+            if len(self._entries) >= self.max_size:
+                self._evict()
+            self._entries[user_id] = (time.monotonic() + self.ttl, roles)
+        return roles
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        for uid in [uid for uid, (expires, _) in self._entries.items() if expires <= now]:
+            del self._entries[uid]
+        while len(self._entries) >= self.max_size:
+            del self._entries[next(iter(self._entries))]
+
+    def invalidate(self, user_ids: list[int] | None = None) -> None:
+        """Сбрасывает роли указанных пользователей (None — всех)"""
+        self._generation += 1
+        if user_ids is None:
+            self._entries.clear()
+        else:
+            for uid in user_ids:
+                self._entries.pop(int(uid), None)
+        logger.info("roles invalidated: %s", "all" if user_ids is None else user_ids)
+
+
+roles = RoleCache()
+add_roles_listener(roles.invalidate)
@@ -0,0 +1,166 @@
+"""
+Приём апдейтов Telegram через webhook вместо long polling.
+
+- Запросы без верного X-Telegram-Bot-Api-Secret-Token отклоняются (403).
+- Апдейт обрабатывается в фоне, ответ Telegram уходит сразу; одновременно обрабатывается
+  не больше BOT_WEBHOOK_CONCURRENCY апдейтов — когда все слоты заняты, ответ на webhook ждёт
+  свободного слота, и Telegram сам притормаживает доставку.
+- Апдейты одного чата по-прежнему обрабатываются по очереди (events isolation диспетчера).
+
+Запуск:
+- отдельным процессом: BOT_MODE=webhook python bot/main.py (или python -m bot.webhook);
+- внутри API: BOT_WEBHOOK_MOUNT=1 — роут добавляется в приложение FastAPI (app/main.py).
+
+Если задан BOT_WEBHOOK_URL, при старте адрес регистрируется в Telegram (setWebhook).
+Там же принимается сброс кэша ролей от API (POST /internal/roles/invalidate, bot/role_cache.py).
+"""
+
+import asyncio
+import hmac
+import os
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from fastapi import APIRouter, FastAPI, HTTPException, Request
+
+from app.logging_config import get_logger
+from app.services.roles import INTERNAL_SECRET_HEADER, ROLES_INVALIDATE_PATH
+
+
+BOT_WEBHOOK_URL = os.getenv("BOT_WEBHOOK_URL", "").strip()  # публичный https-адрес сервиса, без пути
+BOT_WEBHOOK_PATH = os.getenv("BOT_WEBHOOK_PATH", "/telegram/webhook")
+BOT_WEBHOOK_SECRET = os.getenv("BOT_WEBHOOK_SECRET", "").strip()
+BOT_WEBHOOK_CONCURRENCY = int(os.getenv("BOT_WEBHOOK_CONCURRENCY", "32"))
+BOT_WEBHOOK_HOST = os.getenv("BOT_WEBHOOK_HOST", "0.0.0.0")
+BOT_WEBHOOK_PORT = int(os.getenv("BOT_WEBHOOK_PORT", "8081"))
+# Сколько ждём незавершённые апдейты при остановке, секунд
+BOT_WEBHOOK_DRAIN_TIMEOUT = float(os.getenv("BOT_WEBHOOK_DRAIN_TIMEOUT", "10"))
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+logger = get_logger("bot-webhook")
+
+
+class UpdateProcessor:
+    """Фоновая обработка апдейтов с ограничением числа одновременно обрабатываемых"""
+
+    def __init__(self, dp: Dispatcher, bot: Bot, concurrency: int = BOT_WEBHOOK_CONCURRENCY) -> None:
+        self.dp = dp
+        self.bot = bot
+        self.concurrency = concurrency
+        self.processed = 0
+        self.failed = 0
+        self._slots = asyncio.Semaphore(concurrency)
+        self._tasks: set[asyncio.Task] = set()
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._tasks)
+
+    async def submit(self, data: dict) -> None:
+        update = Update.model_validate(data, context={"bot": self.bot})
+        await self._slots.acquire()
+        task = asyncio.create_task(self._process(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _process(self, update: Update) -> None:
+        try:
+            await self.dp.feed_update(self.bot, update)
+            self.processed += 1
+        except Exception as exc:
+            self.failed += 1
+            logger.exception("update %s failed: %s", update.update_id, repr(exc))
+        finally:
+            self._slots.release()
+
+    async def drain(self, timeout: float = BOT_WEBHOOK_DRAIN_TIMEOUT) -> None:
+        if self._tasks:
+            logger.info("waiting for %s updates in flight", len(self._tasks))
+            await asyncio.wait(set(self._tasks), timeout=timeout)
+
+
+def create_webhook_router(processor: UpdateProcessor, secret: str, path: str = BOT_WEBHOOK_PATH) -> APIRouter:
+    router = APIRouter()
+
+    @router.post(path, include_in_schema=False)
+    async def telegram_webhook(request: Request) -> dict:
+        if not hmac.compare_digest(request.headers.get(SECRET_HEADER, "").encode(), secret.encode()):
+            raise HTTPException(status_code=403, detail="forbidden")
+        try:
+            data = await request.json()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Некорректный JSON")
+        try:
+            await processor.submit(data)
+        except ValueError as exc:
+            # повтор такого апдейта ничего не изменит — подтверждаем, чтобы Telegram не слал его снова
+            logger.warning("malformed update skipped: %s", repr(exc))
+        return {"ok": True}
+
+    @router.post(ROLES_INVALIDATE_PATH, include_in_schema=False)
+    async def invalidate_roles(request: Request) -> dict:
+        """Сброс кэша ролей по сигналу API (app/services/roles.py)"""
+        if not hmac.compare_digest(request.headers.get(INTERNAL_SECRET_HEADER, "").encode(), secret.encode()):
+            raise HTTPException(status_code=403, detail="forbidden")
+        try:
+            user_ids = (await request.json()).get("user_ids")
+        except (ValueError, AttributeError):
+            raise HTTPException(status_code=400, detail="Некорректный JSON")
+        from bot.role_cache import roles
+        roles.invalidate(user_ids)
+        return {"ok": True}
+
+    return router
+
+
+def setup_webhook(app: FastAPI, dp: Dispatcher | None = None, bot: Bot | None = None) -> UpdateProcessor:
+    """Добавляет в app роут webhook и регистрацию/остановку на старте и завершении"""
+    if not BOT_WEBHOOK_SECRET:
+        raise RuntimeError("BOT_WEBHOOK_SECRET is required for webhook mode")
+    if dp is None or bot is None:
+        from app.services.telegram import create_bot
+        from bot.main import BOT_TOKEN, dp as bot_dp
+        if not BOT_TOKEN:
+            raise RuntimeError("BOT_TOKEN is required")
+        dp = dp or bot_dp
+        bot = bot or create_bot(BOT_TOKEN)
+
+    processor = UpdateProcessor(dp, bot)
+    app.include_router(create_webhook_router(processor, BOT_WEBHOOK_SECRET))
+
+    async def _on_startup() -> None:
+        if BOT_WEBHOOK_URL:
+            await bot.set_webhook(
+                BOT_WEBHOOK_URL.rstrip("/") + BOT_WEBHOOK_PATH,
+                secret_token=BOT_WEBHOOK_SECRET,
+                allowed_updates=dp.resolve_used_update_types(),
+                max_connections=min(100, BOT_WEBHOOK_CONCURRENCY),
+            )
+            logger.info("webhook registered: %s%s", BOT_WEBHOOK_URL.rstrip("/"), BOT_WEBHOOK_PATH)
+        logger.info("webhook mode: path=%s concurrency=%s", BOT_WEBHOOK_PATH, BOT_WEBHOOK_CONCURRENCY)
+
+    async def _on_shutdown() -> None:
+        # webhook не снимаем: остальные процессы бота продолжают принимать апдейты
+        await processor.drain()
+        from bot.api_client import api
+        await api.aclose()
+        await bot.session.close()
+
+    app.add_event_handler("startup", _on_startup)
+    app.add_event_handler("shutdown", _on_shutdown)
+    return processor
+
+
+async def serve(dp: Dispatcher | None = None, bot: Bot | None = None) -> None:
+    """Отдельный процесс бота, принимающий апдейты по webhook"""
+    import uvicorn
+
+    app = FastAPI(title="Bot webhook", docs_url=None, redoc_url=None, openapi_url=None)
+    setup_webhook(app, dp, bot)
+    server = uvicorn.Server(uvicorn.Config(app, host=BOT_WEBHOOK_HOST, port=BOT_WEBHOOK_PORT, log_level="info"))
+    await server.serve()
+
+
+if __name__ == "__main__":
+    asyncio.run(serve())
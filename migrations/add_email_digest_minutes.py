@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Миграция для режима сводных писем:
+- поле email_digest_minutes в таблице restaurants (0 — письмо на каждый заказ);
+- таблица email_digest_items (очередь заказов для сводок).
+
+Работает с базой из DATABASE_URL (как приложение), запуск из корня проекта:
+    python migrations/add_email_digest_minutes.py
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import inspect, text
+
+from app.db import engine
+from app.models import EmailDigestItem
+
+
+def migrate():
+    print(f"🔄 Миграция email_digest_minutes ({engine.dialect.name})...")
+    columns = [col["name"] for col in inspect(engine).get_columns("restaurants")]
+    if "email_digest_minutes" not in columns:
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE restaurants ADD COLUMN email_digest_minutes INTEGER NOT NULL DEFAULT 0"))
+        print("✅ Поле email_digest_minutes добавлено")
+    else:
+        print("ℹ️  Поле email_digest_minutes уже существует")
+
+    EmailDigestItem.__table__.create(bind=engine, checkfirst=True)
+    print("✅ Таблица email_digest_items готова")
+
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Миграция chosen_options:
+- order_items.chosen_options и cart_items.chosen_options -> JSONB в Postgres
+  (в SQLite колонка остаётся текстовой, пустые значения приводятся к '[]');
+- новая таблица order_item_options и её заполнение по уже сделанным заказам.
+
+Работает с базой из DATABASE_URL (как приложение), запуск из корня проекта:
+    python migrations/normalize_chosen_options.py
+"""
+
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import text
+
+from app.db import engine
+from app.models import OrderItemOption
+
+
+BATCH_SIZE = 1000
+
+
+def _parse(raw):
+    if isinstance(raw, list):
+        return [int(x) for x in raw if isinstance(x, (int, str)) and str(x).lstrip('-').isdigit()]
+    try:
+        value = json.loads(raw or '[]')
+    except (ValueError, TypeError):
+        return []
+    return _parse(value) if isinstance(value, list) else []
+
+
+def migrate():
+    dialect = engine.dialect.name
+    print(f"🔄 Миграция chosen_options ({dialect})...")
+
+    with engine.begin() as conn:
+        for table in ('order_items', 'cart_items'):
+            if dialect == 'postgresql':
+                col_type = conn.execute(text(
+                    "SELECT data_type FROM information_schema.columns "
+                    "WHERE table_name = :t AND column_name = 'chosen_options'"
+                ), {"t": table}).scalar()
+                if col_type == 'jsonb':
+                    print(f"ℹ️  {table}.chosen_options уже jsonb")
+                    continue
+                print(f"📝 {table}.chosen_options -> jsonb")
+                conn.execute(text(
+                    f"ALTER TABLE {table} ALTER COLUMN chosen_options TYPE jsonb "
+                    f"USING COALESCE(NULLIF(chosen_options, ''), '[]')::jsonb"
+                ))
+                conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN chosen_options SET DEFAULT '[]'::jsonb"))
+            else:
+                fixed = conn.execute(text(
+                    f"UPDATE {table} SET chosen_options = '[]' WHERE chosen_options IS NULL OR chosen_options = ''"
+                )).rowcount
+                print(f"📝 {table}: пустых chosen_options исправлено: {fixed}")
+
+    OrderItemOption.__table__.create(bind=engine, checkfirst=True)
+    print("✅ Таблица order_item_options готова")
+
+    with engine.begin() as conn:
+        if conn.execute(text("SELECT 1 FROM order_item_options LIMIT 1")).first():
+            print("ℹ️  order_item_options уже заполнена, пропускаем")
+            return
+        options = {
+            oid: (name or '', delta or 0)
+            for oid, name, delta in conn.execute(text("SELECT id, name, price_delta FROM options"))
+        }
+        rows = conn.execute(text(
+            "SELECT id, chosen_options FROM order_items WHERE chosen_options IS NOT NULL"
+        )).all()
+        batch = []
+        total = 0
+        for item_id, raw in rows:
+            for oid in dict.fromkeys(_parse(raw)):
+                name, delta = options.get(oid, ('', 0))
+                batch.append({"order_item_id": item_id, "option_id": oid, "name": name, "price_delta": delta})
+            if len(batch) >= BATCH_SIZE:
+                conn.execute(OrderItemOption.__table__.insert(), batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            conn.execute(OrderItemOption.__table__.insert(), batch)
+            total += len(batch)
+        print(f"✅ Перенесено опций заказов: {total}")
+
+
+if __name__ == "__main__":
+    migrate()